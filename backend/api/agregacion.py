@@ -0,0 +1,122 @@
+"""
+Núcleo vectorizado de agregación mensual / trimestral.
+
+Los meses de varios indicadores se cargan en una matriz NumPy
+(filas = indicadores, columnas = ene_r … dic_r, ene_o … dic_o, NaN para
+los nulos) y los rollups se calculan sobre toda la matriz a la vez.
+
+Las sumas se acumulan en el mismo orden que ``sum()`` de Python (mes a
+mes, hijo a hijo) y el redondeo final usa ``round``, así que los
+resultados coinciden exactamente con el cálculo fila por fila.
+"""
+import numpy as np
+
+MESES = ["ene", "feb", "mar", "abr", "may", "jun",
+         "jul", "ago", "sep", "oct", "nov", "dic"]
+
+CAMPOS_MES = [f"{m}_{t}" for t in ("r", "o") for m in MESES]
+CAMPOS_Q = [f"q{q}_{t}" for t in ("r", "o") for q in range(1, 5)]
+
+
+# ============================================================
+#   C A R G A   /   D E S C A R G A
+# ============================================================
+def matriz_meses(indicadores):
+    """Matriz (n, 24) con los meses de ``indicadores``; NaN para nulos."""
+    return np.array(
+        [[getattr(i, c) for c in CAMPOS_MES] for i in indicadores],
+        dtype=float,
+    ).reshape(len(indicadores), len(CAMPOS_MES))
+
+
+def mascara_promedio(indicadores):
+    """True para las filas cuyo ``metodo_q`` es PROMEDIO (el resto suma)."""
+    return np.array([i.metodo_q == "PROMEDIO" for i in indicadores], dtype=bool)
+
+
+def a_python(valores):
+    """Convierte un array en lista de floats, con None en lugar de NaN."""
+    return [None if np.isnan(v) else float(v) for v in valores]
+
+
+# ============================================================
+#   R E D U C C I O N E S
+# ============================================================
+def _combinar(suma, cuenta, promedio):
+    promedio = promedio.reshape(promedio.shape + (1,) * (suma.ndim - 1))
+    resultado = np.where(promedio, suma / np.maximum(cuenta, 1), suma)
+    resultado[cuenta == 0] = np.nan
+    return resultado
+
+
+def _reducir_bloques(bloques, promedio):
+    """Reduce el último eje de ``bloques`` con PROMEDIO / SUMA ignorando NaN."""
+    validos = ~np.isnan(bloques)
+    suma = np.zeros(bloques.shape[:-1])
+    # Acumulación secuencial: mismo orden de sumas que sum()
+    for k in range(bloques.shape[-1]):
+        suma = suma + np.where(validos[..., k], bloques[..., k], 0.0)
+    return _combinar(suma, validos.sum(axis=-1), promedio)
+
+
+def agregar_hijos(matriz_hijos, filas_padre, n_padres, promedio):
+    """
+    Agrega las filas de ``matriz_hijos`` en ``n_padres`` filas.
+
+    ``filas_padre[k]`` es la fila destino de ``matriz_hijos[k]``; dentro de
+    cada padre los hijos se acumulan en el orden en que aparecen. Los meses
+    sin ningún valor en los hijos quedan en NaN.
+    """
+    validos = ~np.isnan(matriz_hijos)
+    suma = np.zeros((n_padres, matriz_hijos.shape[1]))
+    cuenta = np.zeros((n_padres, matriz_hijos.shape[1]), dtype=np.int64)
+    np.add.at(suma, filas_padre, np.where(validos, matriz_hijos, 0.0))
+    np.add.at(cuenta, filas_padre, validos)
+    return _combinar(suma, cuenta, promedio)
+
+
+def calcular_trimestres(matriz, promedio):
+    """Matriz (n, 8) en el orden de ``CAMPOS_Q`` (q1_r … q4_r, q1_o … q4_o)."""
+    bloques = matriz.reshape(len(matriz), 2, 4, 3)
+    return _reducir_bloques(bloques, promedio).reshape(len(matriz), len(CAMPOS_Q))
+
+
+def calcular_ano_a_la_fecha(matriz, promedio, tipo="r"):
+    """Año a la fecha de los resultados (R) u objetivos (O), redondeado a 2 decimales."""
+    inicio = 0 if tipo == "r" else len(MESES)
+    valores = _reducir_bloques(matriz[:, inicio:inicio + len(MESES)], promedio)
+    return [None if v is None else round(v, 2) for v in a_python(valores)]
+
+
+# ============================================================
+#   A P L I C A R   A   I N S T A N C I A S
+# ============================================================
+def asignar(indicadores, campos, matriz):
+    for indicador, fila in zip(indicadores, matriz):
+        for campo, valor in zip(campos, a_python(fila)):
+            setattr(indicador, campo, valor)
+
+
+def aplicar_hijos(indicador, hijos):
+    """Reemplaza los meses de ``indicador`` por el agregado de ``hijos``."""
+    agregado = agregar_hijos(
+        matriz_meses(hijos), np.zeros(len(hijos), dtype=np.int64), 1,
+        mascara_promedio([indicador]),
+    )
+    asignar([indicador], CAMPOS_MES, agregado)
+
+
+def recalcular(indicadores, matriz=None, trimestres=True):
+    """
+    Recalcula trimestres (opcional) y año a la fecha de ``indicadores``
+    a partir de ``matriz`` (por defecto, sus propios meses).
+    """
+    if not indicadores:
+        return
+    if matriz is None:
+        matriz = matriz_meses(indicadores)
+    promedio = mascara_promedio(indicadores)
+    if trimestres:
+        asignar(indicadores, CAMPOS_Q, calcular_trimestres(matriz, promedio))
+    for indicador, valor in zip(indicadores, calcular_ano_a_la_fecha(matriz, promedio)):
+        indicador.ano_a_la_fecha = valor
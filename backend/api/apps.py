@@ -7,3 +7,5 @@ class ApiConfig(AppConfig):
 
     def ready(self):
         import api.signals  # Esto conecta los signals
+        import api.metricas  # Mide las consultas de cada conexión nueva
+        import api.hashers  # Registra el system check del hasher rápido
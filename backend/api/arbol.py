@@ -0,0 +1,179 @@
+"""
+Árbol de indicadores armado en el servidor.
+
+Sale de consultas independientes (indicadores con pocas columnas,
+relaciones padre → hijo y enlaces indicador ↔ categoría) que la vista
+sync ejecuta una tras otra y ``vistas_async.py`` a la vez. El cliente ya
+no necesita la lista completa con ``hijos`` / ``padres`` para dibujarlo.
+
+Dos formatos:
+
+- ``anidado``: ``[{...campos, "categorias": [ids], "hijos": [nodos]}]``.
+  Un indicador con varios padres aparece bajo cada uno de ellos.
+- ``adyacencia``: ``{"raices": [ids], "nodos": [{...campos, "categorias":
+  [ids], "hijos": [ids]}]}``, cada indicador una sola vez.
+"""
+from collections import defaultdict
+
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+from . import jerarquia
+from .models import Indicador, IndicadorRel
+
+CAMPOS_NODO = ["id", "n", "indicador", "dueno", "unidad"]
+FORMATOS = ("anidado", "adyacencia")
+# Orden de los resultados que recibe ``componer``
+CONSULTAS = ("indicadores", "relaciones", "enlaces")
+
+
+def consultas_arbol(categoria=None, raiz=None):
+    """
+    Querysets del árbol; con ``categoria``, solo sus indicadores. Con
+    ``raiz``, solo ella y sus descendientes: las tres consultas se limitan
+    con la CTE de ``jerarquia.alcanzables`` en vez de traer la tabla entera.
+    """
+    Through = Indicador.categorias.through
+    indicadores = Indicador.objects.order_by("id")
+    relaciones = IndicadorRel.objects.order_by("id")
+    enlaces = Through.objects.order_by("categoria_id")
+    if raiz is not None:
+        descendientes = jerarquia.alcanzables(
+            connections[indicadores.db], "descendientes", raiz
+        )
+
+        def en_subarbol(campo):
+            return Q(**{campo: raiz}) | Q(**{f"{campo}__in": descendientes})
+
+        indicadores = indicadores.filter(en_subarbol("id"))
+        # El hijo de una relación que sale del subárbol también está en él
+        relaciones = relaciones.filter(en_subarbol("indicador_padre_id"))
+        enlaces = enlaces.filter(en_subarbol("indicador_id"))
+    if categoria is not None:
+        en_categoria = Through.objects.filter(categoria_id=categoria).values("indicador_id")
+        indicadores = indicadores.filter(id__in=en_categoria)
+        relaciones = relaciones.filter(
+            indicador_padre_id__in=en_categoria, indicador_hijo_id__in=en_categoria
+        )
+        enlaces = enlaces.filter(indicador_id__in=en_categoria)
+    return {
+        "indicadores": indicadores.values(*CAMPOS_NODO),
+        "relaciones": relaciones.values_list("indicador_padre_id", "indicador_hijo_id"),
+        "enlaces": enlaces.values_list("indicador_id", "categoria_id"),
+    }
+
+
+def _entero(params, nombre, minimo):
+    valor = params.get(nombre)
+    if valor in (None, ""):
+        return None
+    try:
+        numero = int(valor)
+    except ValueError:
+        numero = minimo - 1
+    if numero < minimo:
+        raise ValidationError({nombre: [f"Debe ser un entero mayor o igual a {minimo}"]})
+    return numero
+
+
+def leer_parametros(params):
+    """``?root=``, ``?depth=``, ``?categoria=`` y ``?formato=`` validados."""
+    formato = params.get("formato", "anidado").lower()
+    if formato not in FORMATOS:
+        raise ValidationError({"formato": [f"Debe ser uno de: {', '.join(FORMATOS)}"]})
+    return {
+        "raiz": _entero(params, "root", 1),
+        "profundidad": _entero(params, "depth", 0),
+        "categoria": _entero(params, "categoria", 1),
+        "formato": formato,
+    }
+
+
+def _indexar(indicadores, relaciones, enlaces):
+    nodos = {fila["id"]: {**fila, "categorias": []} for fila in indicadores}
+    for indicador_id, categoria_id in enlaces:
+        if indicador_id in nodos:
+            nodos[indicador_id]["categorias"].append(categoria_id)
+
+    hijos, con_padre = defaultdict(list), set()
+    for padre, hijo in relaciones:
+        if padre in nodos and hijo in nodos:
+            hijos[padre].append(hijo)
+            con_padre.add(hijo)
+    raices = [pk for pk in nodos if pk not in con_padre]
+    return nodos, hijos, raices
+
+
+def construir_bosque(indicadores, relaciones, enlaces, raices=None, profundidad=None):
+    """
+    Formato ``anidado``. ``raices`` son los ids de los que parte cada árbol
+    (por defecto, los indicadores sin padre) y ``profundidad`` cuántos
+    niveles de hijos se incluyen (``None``: todos).
+    """
+    nodos, hijos, sin_padre = _indexar(indicadores, relaciones, enlaces)
+    if raices is None:
+        raices = sin_padre
+
+    def armar(pk, nivel, camino):
+        nodo = {**nodos[pk], "hijos": []}
+        if profundidad is not None and nivel >= profundidad:
+            return nodo
+        camino.add(pk)
+        # Las relaciones no forman ciclos (se validan al crearlas); el
+        # camino solo evita recursión infinita con datos inconsistentes
+        nodo["hijos"] = [
+            armar(hijo, nivel + 1, camino) for hijo in hijos[pk] if hijo not in camino
+        ]
+        camino.discard(pk)
+        return nodo
+
+    return [armar(pk, 0, set()) for pk in raices if pk in nodos]
+
+
+def construir_adyacencia(indicadores, relaciones, enlaces, raices=None, profundidad=None):
+    """Formato ``adyacencia``, con los mismos ``raices`` y ``profundidad``."""
+    nodos, hijos, sin_padre = _indexar(indicadores, relaciones, enlaces)
+    if raices is None:
+        raices = sin_padre
+    raices = [pk for pk in raices if pk in nodos]
+
+    nivel = {pk: 0 for pk in raices}
+    frontera = list(raices)
+    while frontera:
+        siguiente = []
+        for pk in frontera:
+            if profundidad is not None and nivel[pk] >= profundidad:
+                continue
+            for hijo in hijos[pk]:
+                if hijo not in nivel:
+                    nivel[hijo] = nivel[pk] + 1
+                    siguiente.append(hijo)
+        frontera = siguiente
+
+    def hijos_incluidos(pk):
+        if profundidad is not None and nivel[pk] >= profundidad:
+            return []
+        return [hijo for hijo in hijos[pk] if hijo in nivel]
+
+    return {
+        "raices": raices,
+        "nodos": [
+            {**nodos[pk], "hijos": hijos_incluidos(pk)}
+            for pk in sorted(nivel)
+        ],
+    }
+
+
+def componer(indicadores, relaciones, enlaces, raiz=None, profundidad=None, formato="anidado"):
+    """
+    Árbol en ``formato`` a partir de los resultados de ``consultas_arbol``.
+    ``None`` si ``raiz`` no existe entre los indicadores consultados.
+    """
+    if raiz is not None and not any(fila["id"] == raiz for fila in indicadores):
+        return None
+    construir = construir_adyacencia if formato == "adyacencia" else construir_bosque
+    return construir(
+        indicadores, relaciones, enlaces,
+        raices=None if raiz is None else [raiz], profundidad=profundidad,
+    )
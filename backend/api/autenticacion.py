@@ -0,0 +1,93 @@
+"""
+Autenticación JWT con el usuario en caché.
+
+``JWTAuthentication`` valida la firma del token sin tocar la BD, pero
+después busca el ``User`` en cada request. ``CachedJWTAuthentication``
+guarda en ``CACHES["default"]`` durante ``AUTH_CACHE_TIMEOUT`` segundos
+solo ``CAMPOS_EN_CACHE`` (id, usuario y banderas), nunca el hash de la
+contraseña: la caché puede ser un archivo en disco. Con esos valores arma
+un ``User`` con el resto de los campos diferidos (se leen de la BD solo
+si alguien los usa).
+
+Guardar o borrar un ``User`` o su ``PerfilUsuario`` borra la entrada
+(ver ``signals.py``): desactivar al usuario o cambiar su contraseña con
+``save()`` tiene efecto en el request siguiente. Los cambios masivos
+(``update``, ``bulk_update``) no envían señales y deben llamar a
+``invalidar_usuarios``.
+
+Con caché ``locmem`` cada proceso tiene la suya y solo se invalida la del
+proceso que hizo el cambio; por eso ``settings`` la apaga en ese caso
+(salvo ``CACHE_LOCMEM_PERMITIDO``).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+# Lo único que se guarda de cada usuario
+CAMPOS_EN_CACHE = ["username", "is_active", "is_staff", "is_superuser"]
+
+
+def _clave_usuario(user_id):
+    return f"auth:usuario:{user_id}"
+
+
+def invalidar_usuarios(*user_ids):
+    """Saca de la caché a los usuarios ``user_ids``."""
+    cache.delete_many([_clave_usuario(pk) for pk in user_ids])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        timeout = settings.AUTH_CACHE_TIMEOUT
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if not timeout or user_id is None:
+            return super().get_user(validated_token)
+
+        clave = _clave_usuario(user_id)
+        entrada = cache.get(clave)
+        if entrada is None:
+            # Si falla (no existe, inactivo, token revocado) no se guarda nada
+            user = super().get_user(validated_token)
+            cache.set(clave, self._entrada(user), timeout)
+            return user
+
+        user = self._usuario(entrada)
+        # Las mismas comprobaciones que JWTAuthentication, sobre la entrada
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            cache.delete(clave)
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != entrada["revocacion"]:
+            raise AuthenticationFailed(
+                _("The user's password has been changed."), code="password_changed"
+            )
+        return user
+
+    def _entrada(self, user):
+        return {
+            "pk": user.pk,
+            "valores": [getattr(user, campo) for campo in CAMPOS_EN_CACHE],
+            # El mismo valor que ya viaja en cada token (REVOKE_TOKEN_CLAIM)
+            "revocacion": (
+                get_md5_hash_password(user.password)
+                if api_settings.CHECK_REVOKE_TOKEN else None
+            ),
+        }
+
+    def _usuario(self, entrada):
+        """``User`` con ``CAMPOS_EN_CACHE`` cargados y el resto diferidos."""
+        modelo = self.user_model
+        valores = dict(zip(CAMPOS_EN_CACHE, entrada["valores"]))
+        valores[modelo._meta.pk.attname] = entrada["pk"]
+        # from_db espera los valores en el orden de los campos del modelo
+        campos = [f.attname for f in modelo._meta.concrete_fields if f.attname in valores]
+        return modelo.from_db(
+            router.db_for_read(modelo), campos, [valores[c] for c in campos]
+        )
@@ -0,0 +1,7 @@
+"""
+Benchmarks reproducibles de la API (``manage.py bench``).
+
+``datos`` genera árboles sintéticos de indicadores, categorías y BSC, y
+``escenarios`` mide las operaciones principales (latencia p50 / p95 y
+consultas SQL) con el cliente de pruebas de DRF.
+"""
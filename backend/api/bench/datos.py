@@ -0,0 +1,135 @@
+"""
+Datos sintéticos para los benchmarks.
+"""
+import io
+import random
+from collections import deque
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from .. import cache, jerarquia
+from ..agregacion import CAMPOS_MES
+from ..models import BSC, Categoria, CodigoRegistro, Indicador, IndicadorRel, Persona
+
+DUENOS = [f"Dueño {k}" for k in range(10)]
+
+
+def _forma_arbol(total, profundidad, ramificacion):
+    """
+    Lista de (padre, nivel) por índice: bosques de árboles completos de
+    ``profundidad`` niveles y ``ramificacion`` hijos, hasta ``total`` nodos.
+    """
+    nodos = []
+    while len(nodos) < total:
+        nodos.append((None, 0))
+        cola = deque([(len(nodos) - 1, 0)])
+        while cola and len(nodos) < total:
+            padre, nivel = cola.popleft()
+            if nivel + 1 >= profundidad:
+                continue
+            for _ in range(ramificacion):
+                if len(nodos) >= total:
+                    break
+                nodos.append((padre, nivel + 1))
+                cola.append((len(nodos) - 1, nivel + 1))
+    return nodos
+
+
+def _valores(rnd):
+    valores = {
+        campo: None if rnd.random() < 0.15 else round(rnd.uniform(0, 100), 2)
+        for campo in CAMPOS_MES
+    }
+    valores.update(
+        metodo_q=rnd.choice(["PROMEDIO", "SUMA"]),
+        condicion=rnd.choice(["MAYOR", "MENOR"]),
+        dueno=rnd.choice(DUENOS),
+    )
+    return valores
+
+
+def generar(indicadores=1000, profundidad=5, ramificacion=4, bscs=2,
+            categorias_por_bsc=3, semilla=0):
+    """
+    Crea el árbol sintético y deja rollups, series y resúmenes calculados.
+
+    Devuelve un dict con ``ids``, ``nivel`` ({id: nivel}), ``hojas``
+    (las más profundas primero), ``bscs`` y ``categorias``.
+    """
+    rnd = random.Random(semilla)
+    forma = _forma_arbol(indicadores, profundidad, ramificacion)
+
+    categorias = Categoria.objects.bulk_create(
+        Categoria(nombre=f"Categoría {k}") for k in range(max(bscs * categorias_por_bsc, 1))
+    )
+    lista_bscs = BSC.objects.bulk_create(BSC(nombre=f"BSC {k}") for k in range(bscs))
+    for k, bsc in enumerate(lista_bscs):
+        bsc.categorias.set(categorias[k * categorias_por_bsc:(k + 1) * categorias_por_bsc])
+
+    creados = Indicador.objects.bulk_create(
+        (
+            Indicador(n=f"B{k + 1}", indicador=f"Indicador {k + 1}", **_valores(rnd))
+            for k in range(len(forma))
+        ),
+        batch_size=1000,
+    )
+    ids = [i.pk for i in creados]
+
+    IndicadorRel.objects.bulk_create(
+        (
+            IndicadorRel(indicador_padre_id=ids[padre], indicador_hijo_id=ids[k])
+            for k, (padre, _) in enumerate(forma) if padre is not None
+        ),
+        batch_size=1000,
+    )
+
+    # Cada árbol completo va a una categoría (en orden)
+    Through = Indicador.categorias.through
+    arbol = -1
+    enlaces = []
+    for k, (padre, _) in enumerate(forma):
+        if padre is None:
+            arbol += 1
+        enlaces.append(Through(indicador_id=ids[k], categoria_id=categorias[arbol % len(categorias)].pk))
+    Through.objects.bulk_create(enlaces, batch_size=1000)
+
+    # bulk_create no emite signals: se recalcula todo como tras una carga
+    jerarquia.invalidar()
+    call_command("recalcular_indicadores", stdout=io.StringIO())
+    cache.invalidar(*cache.MODELOS)
+
+    nivel = {ids[k]: n for k, (_, n) in enumerate(forma)}
+    con_hijos = {ids[padre] for padre, _ in forma if padre is not None}
+    hojas = sorted((pk for pk in ids if pk not in con_hijos), key=lambda pk: (-nivel[pk], pk))
+    return {
+        "ids": ids,
+        "nivel": nivel,
+        "hojas": hojas,
+        "bscs": [b.pk for b in lista_bscs],
+        "categorias": [c.pk for c in categorias],
+    }
+
+
+def indicadores_sueltos(cantidad, semilla=0):
+    """Indicadores sin relaciones (p. ej. para crear relaciones nuevas)."""
+    rnd = random.Random(semilla)
+    creados = Indicador.objects.bulk_create(
+        Indicador(n=f"S{k + 1}", indicador=f"Suelto {k + 1}", **_valores(rnd))
+        for k in range(cantidad)
+    )
+    return [i.pk for i in creados]
+
+
+def codigos_registro(cantidad, prefijo="bench"):
+    """Personas con código de registro vigente; devuelve los códigos."""
+    personas = Persona.objects.bulk_create(
+        Persona(nombres="Persona", apellidos=str(k), email=f"{prefijo}{k}@example.com")
+        for k in range(cantidad)
+    )
+    expira = timezone.now() + timedelta(days=3)
+    codigos = CodigoRegistro.objects.bulk_create(
+        CodigoRegistro(persona=persona, expira_en=expira) for persona in personas
+    )
+    return [str(c.codigo) for c in codigos]
@@ -0,0 +1,239 @@
+"""
+Escenarios de benchmark.
+
+Cada escenario recibe el cliente, los datos generados, la cantidad de
+repeticiones y un ``random.Random``; prepara lo que necesite (fuera de la
+medición) y devuelve la lista de operaciones a medir, una por repetición.
+"""
+import math
+import random
+import time
+
+from django.db import close_old_connections, connection
+from django.test.utils import CaptureQueriesContext
+
+from . import datos as datos_bench
+
+
+class ErrorBench(Exception):
+    pass
+
+
+def _esperar(response, estado):
+    if response.status_code != estado:
+        raise ErrorBench(
+            f"{response.request['REQUEST_METHOD']} {response.request['PATH_INFO']}: "
+            f"se esperaba {estado} y llegó {response.status_code}"
+        )
+
+
+def _get(cliente, url):
+    def operacion():
+        _esperar(cliente.get(url), 200)
+    return operacion
+
+
+# ============================================================
+#   E S C E N A R I O S
+# ============================================================
+def indicadores_list(cliente, datos, repeticiones, rnd):
+    return [_get(cliente, "/api/indicadores/")] * repeticiones
+
+
+def indicadores_pagina(cliente, datos, repeticiones, rnd):
+    return [_get(cliente, "/api/indicadores/?page_size=100")] * repeticiones
+
+
+def indicadores_retrieve(cliente, datos, repeticiones, rnd):
+    return [
+        _get(cliente, f"/api/indicadores/{rnd.choice(datos['ids'])}/")
+        for _ in range(repeticiones)
+    ]
+
+
+def indicadores_tree(cliente, datos, repeticiones, rnd):
+    return [_get(cliente, "/api/indicadores/tree/")] * repeticiones
+
+
+def _ciclo_request(cliente, url, cerrar):
+    # El cliente de pruebas no emite request_started / request_finished a
+    # close_old_connections: se hace aquí como en el handler WSGI
+    def operacion():
+        close_old_connections()
+        _esperar(cliente.get(url), 200)
+        if cerrar:
+            connection.close()
+        close_old_connections()
+    return operacion
+
+
+def conexion_por_request(cliente, datos, repeticiones, rnd):
+    """Endpoint mínimo con la política de conexión configurada."""
+    url = f"/api/bsc/{datos['bscs'][0]}/" if datos["bscs"] else "/api/bsc/"
+    return [_ciclo_request(cliente, url, cerrar=False)] * repeticiones
+
+
+def conexion_sin_reutilizar(cliente, datos, repeticiones, rnd):
+    """
+    Igual que ``conexion_por_request`` pero cerrando la conexión en cada
+    request (CONN_MAX_AGE=0 sin pool). La diferencia entre ambos es el
+    costo de abrir una conexión; con pool, cerrar solo la devuelve.
+    """
+    url = f"/api/bsc/{datos['bscs'][0]}/" if datos["bscs"] else "/api/bsc/"
+    return [_ciclo_request(cliente, url, cerrar=True)] * repeticiones
+
+
+def patch_hoja_profunda(cliente, datos, repeticiones, rnd):
+    hojas = datos["hojas"][:max(repeticiones, 1)]
+
+    def patch(pk, valor):
+        def operacion():
+            response = cliente.patch(f"/api/indicadores/{pk}/", {"ene_r": valor}, format="json")
+            _esperar(response, 200)
+        return operacion
+
+    return [patch(hojas[k % len(hojas)], round(rnd.uniform(0, 100), 2)) for k in range(repeticiones)]
+
+
+def crear_relacion(cliente, datos, repeticiones, rnd):
+    hijos = datos_bench.indicadores_sueltos(repeticiones, semilla=rnd.random())
+    padres = [pk for pk in datos["ids"] if pk not in set(datos["hojas"])] or datos["ids"]
+
+    def crear(padre, hijo):
+        def operacion():
+            response = cliente.post("/api/indicadores-rel/", {
+                "indicador_padre": padre, "indicador_hijo": hijo,
+            }, format="json")
+            _esperar(response, 201)
+        return operacion
+
+    return [crear(rnd.choice(padres), hijo) for hijo in hijos]
+
+
+def bsc_retrieve(cliente, datos, repeticiones, rnd):
+    return [
+        _get(cliente, f"/api/bsc/{rnd.choice(datos['bscs'])}/")
+        for _ in range(repeticiones)
+    ] if datos["bscs"] else []
+
+
+def bsc_dashboard(cliente, datos, repeticiones, rnd):
+    return [
+        _get(cliente, f"/api/bsc/{rnd.choice(datos['bscs'])}/dashboard/")
+        for _ in range(repeticiones)
+    ] if datos["bscs"] else []
+
+
+def bsc_dashboard_async(cliente, datos, repeticiones, rnd):
+    """
+    El mismo tablero por la vista async. Sus consultas van en otros hilos:
+    las consultas medidas quedan en 0 (ver el header ``Server-Timing``).
+    """
+    return [
+        _get(cliente, f"/api/async/bsc/{rnd.choice(datos['bscs'])}/dashboard/")
+        for _ in range(repeticiones)
+    ] if datos["bscs"] else []
+
+
+def registro(cliente, datos, repeticiones, rnd):
+    prefijo = f"bench{rnd.randrange(10**9)}-"
+    codigos = datos_bench.codigos_registro(repeticiones, prefijo=prefijo)
+
+    def registrar(k, codigo):
+        def operacion():
+            response = cliente.post("/registro/", {
+                "codigo": codigo, "username": f"{prefijo}{k}", "password": "Clave-bench-123",
+            }, format="json")
+            _esperar(response, 201)
+        return operacion
+
+    return [registrar(k, codigo) for k, codigo in enumerate(codigos)]
+
+
+# Lecturas primero: las escrituras cambian los datos
+ESCENARIOS = {
+    "indicadores_list": indicadores_list,
+    "indicadores_pagina": indicadores_pagina,
+    "indicadores_retrieve": indicadores_retrieve,
+    "indicadores_tree": indicadores_tree,
+    "bsc_retrieve": bsc_retrieve,
+    "bsc_dashboard": bsc_dashboard,
+    "bsc_dashboard_async": bsc_dashboard_async,
+    "conexion_por_request": conexion_por_request,
+    "conexion_sin_reutilizar": conexion_sin_reutilizar,
+    "patch_hoja_profunda": patch_hoja_profunda,
+    "crear_relacion": crear_relacion,
+    "registro": registro,
+}
+
+
+# ============================================================
+#   M E D I C I Ó N
+# ============================================================
+def percentil(valores, p):
+    """Percentil por rango más cercano."""
+    ordenados = sorted(valores)
+    k = max(math.ceil(p / 100 * len(ordenados)) - 1, 0)
+    return ordenados[k]
+
+
+def medir(operaciones, calentamiento=1):
+    """
+    Ejecuta ``operaciones`` y devuelve las estadísticas. Las primeras
+    ``calentamiento`` se ejecutan pero no se cuentan.
+    """
+    tiempos, consultas = [], []
+    for k, operacion in enumerate(operaciones):
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            operacion()
+            duracion = time.perf_counter() - inicio
+        if k >= calentamiento:
+            tiempos.append(duracion * 1000)
+            consultas.append(len(capturadas))
+
+    if not tiempos:
+        return None
+    return {
+        "repeticiones": len(tiempos),
+        "p50_ms": round(percentil(tiempos, 50), 3),
+        "p95_ms": round(percentil(tiempos, 95), 3),
+        "media_ms": round(sum(tiempos) / len(tiempos), 3),
+        "min_ms": round(min(tiempos), 3),
+        "max_ms": round(max(tiempos), 3),
+        "consultas_p50": percentil(consultas, 50),
+        "consultas_max": max(consultas),
+    }
+
+
+def ejecutar(cliente, datos, nombres=None, repeticiones=20, semilla=0, calentamiento=1):
+    """Corre los escenarios ``nombres`` (todos por defecto) en orden."""
+    resultados = {}
+    for nombre, escenario in ESCENARIOS.items():
+        if nombres and nombre not in nombres:
+            continue
+        rnd = random.Random(f"{semilla}:{nombre}")
+        operaciones = escenario(cliente, datos, repeticiones + calentamiento, rnd)
+        resultados[nombre] = medir(operaciones, calentamiento)
+    return resultados
+
+
+def comparar(actual, base, tolerancia=0.2):
+    """
+    Regresiones de ``actual`` respecto de ``base`` (ambos con la forma de
+    ``ejecutar``): p95 más de ``tolerancia`` por encima o más consultas.
+    """
+    regresiones = []
+    for nombre, medida in actual.items():
+        previa = base.get(nombre)
+        if not medida or not previa:
+            continue
+        if medida["p95_ms"] > previa["p95_ms"] * (1 + tolerancia):
+            regresiones.append(
+                f"{nombre}: p95 {previa['p95_ms']:.1f} → {medida['p95_ms']:.1f} ms"
+            )
+        if medida["consultas_max"] > previa["consultas_max"]:
+            regresiones.append(
+                f"{nombre}: consultas {previa['consultas_max']} → {medida['consultas_max']}"
+            )
+    return regresiones
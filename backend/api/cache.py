@@ -0,0 +1,179 @@
+"""
+Caché de respuestas para los endpoints de lectura.
+
+La clave de cada respuesta combina el endpoint, la URL completa (con
+parámetros) y un contador de versión por modelo. Guardar o borrar un
+``Indicador``, ``IndicadorRel``, ``Categoria`` o ``BSC`` incrementa su
+contador al confirmarse la transacción (ver ``signals.py``), así que las
+entradas viejas simplemente dejan de usarse y expiran solas.
+
+Los contadores son filas de ``Secuencia`` (``secuencias.incrementar``):
+el incremento es atómico en la BD, así que dos procesos que invalidan a
+la vez nunca quedan con la misma versión, sea cual sea el backend de
+caché. Las respuestas se guardan en ``CACHES["default"]`` (archivo, Redis
+o locmem según ``settings``; ver el system check ``api.W002``) y llevan
+``ETag`` y ``Last-Modified`` para que los clientes puedan revalidar y
+recibir 304.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.checks import Tags, Warning, register
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import secuencias
+
+MODELOS = ("indicador", "indicadorrel", "categoria", "bsc")
+
+
+@register(Tags.caches)
+def revisar_cache_compartida(app_configs, **kwargs):
+    backend = settings.CACHES["default"]["BACKEND"]
+    if backend.endswith("LocMemCache") and not settings.CACHE_LOCMEM_PERMITIDO:
+        return [Warning(
+            "La caché por defecto es locmem: cada worker guarda sus propias respuestas "
+            "y los usuarios del JWT invalidados en un worker siguen en caché en los demás.",
+            hint="Use CACHE_BACKEND=file o redis; con un solo proceso, "
+                 "CACHE_LOCMEM_PERMITIDO=True.",
+            id="api.W002",
+        )]
+    return []
+
+
+def _clave_version(modelo):
+    return f"{secuencias.PREFIJO_VERSION}respuestas:{modelo}"
+
+
+def _clave_cambio(modelo):
+    return f"respuestas:cambio:{modelo}"
+
+
+def versiones(modelos):
+    nombres = [_clave_version(m) for m in modelos]
+    actuales = secuencias.valores(nombres)
+    for nombre in nombres:
+        if nombre not in actuales:
+            actuales[nombre] = secuencias.incrementar(nombre)
+    return tuple(actuales[n] for n in nombres)
+
+
+def _incrementar(modelos):
+    ahora = time.time()
+    for modelo in modelos:
+        secuencias.incrementar(_clave_version(modelo))
+    cache.set_many({_clave_cambio(m): ahora for m in modelos}, None)
+
+
+def invalidar(*modelos):
+    """
+    Incrementa la versión de ``modelos`` al confirmarse la transacción; las
+    respuestas cacheadas caducan. Antes de confirmar, los demás procesos
+    todavía no ven los cambios: seguir sirviendo la versión anterior es
+    correcto, y la fila del contador no queda bloqueada.
+    """
+    transaction.on_commit(lambda: _incrementar(modelos))
+
+
+def _ultima_modificacion(data, modelos):
+    """Mayor ``actualizado_en`` de la respuesta o del último cambio registrado."""
+    if isinstance(data, dict) and isinstance(data.get("results"), list):
+        filas = data["results"]
+    elif isinstance(data, list):
+        filas = data
+    else:
+        filas = [data]
+
+    fechas = [
+        parse_datetime(f["actualizado_en"])
+        for f in filas
+        if isinstance(f, dict) and isinstance(f.get("actualizado_en"), str)
+    ]
+    cambios = cache.get_many([_clave_cambio(m) for m in modelos]).values()
+    fechas += [datetime.fromtimestamp(c, tz=dt_timezone.utc) for c in cambios]
+    fechas = [f for f in fechas if f is not None]
+    return max(fechas).timestamp() if fechas else None
+
+
+def clave_respuesta(nombre, request, modelos):
+    """``(etag, clave)`` de la respuesta del endpoint ``nombre`` a ``request``."""
+    base = f"{nombre}:{request.get_full_path()}:{versiones(modelos)}"
+    huella = hashlib.md5(base.encode()).hexdigest()
+    return quote_etag(huella), f"respuestas:{huella}"
+
+
+def entrada_respuesta(data, modelos):
+    return {"data": data, "modificado": _ultima_modificacion(data, modelos)}
+
+
+def no_modificado(request, etag, modificado=None):
+    """True si el cliente ya tiene esta versión (``If-None-Match`` / ``If-Modified-Since``)."""
+    # Mismas versiones y misma URL => mismo contenido
+    if etag in request.headers.get("If-None-Match", ""):
+        return True
+    desde = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+    return (
+        "If-None-Match" not in request.headers
+        and desde is not None and modificado is not None
+        and int(modificado) <= desde
+    )
+
+
+def encabezados(etag, modificado):
+    valores = {"ETag": etag, "Cache-Control": "no-cache"}
+    if modificado is not None:
+        valores["Last-Modified"] = http_date(modificado)
+    return valores
+
+
+class CacheRespuestaMixin:
+    """
+    Cachea ``list`` / ``retrieve`` (y las acciones que usen
+    ``respuesta_cacheada``) de un ViewSet de solo lectura pública.
+    """
+    cache_modelos = MODELOS
+
+    def list(self, request, *args, **kwargs):
+        return self.respuesta_cacheada(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.respuesta_cacheada(request, super().retrieve, *args, **kwargs)
+
+    def respuesta_cacheada(self, request, vista, *args, modelos=None, **kwargs):
+        """``modelos`` reemplaza a ``cache_modelos`` para una acción concreta."""
+        timeout = settings.API_CACHE_TIMEOUT
+        if not timeout:
+            return vista(request, *args, **kwargs)
+
+        modelos = modelos or self.cache_modelos
+        etag, clave = clave_respuesta(self.basename, request, modelos)
+        if no_modificado(request, etag):
+            return self._no_modificado(etag)
+
+        entrada = cache.get(clave)
+        if entrada is None:
+            response = vista(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entrada = entrada_respuesta(response.data, modelos)
+            cache.set(clave, entrada, timeout)
+
+        if no_modificado(request, etag, entrada["modificado"]):
+            return self._no_modificado(etag)
+
+        response = Response(entrada["data"])
+        for encabezado, valor in encabezados(etag, entrada["modificado"]).items():
+            response[encabezado] = valor
+        return response
+
+    @staticmethod
+    def _no_modificado(etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        response["ETag"] = etag
+        return response
@@ -0,0 +1,36 @@
+"""
+Arranque de las conexiones a la base de datos (``DB_WARMUP``).
+
+``calentar`` se llama desde ``backend/wsgi.py`` en cada worker: abre la
+conexión (o el pool de psycopg 3 y sus ``min_size`` conexiones) antes del
+primer request y falla pronto si la base de datos no responde.
+"""
+import logging
+import time
+
+from django.db import connections
+
+logger = logging.getLogger("api.conexiones")
+
+
+def calentar(alias="default", timeout=None):
+    """Abre la conexión ``alias``, ejecuta ``SELECT 1`` y devuelve los ms."""
+    conexion = connections[alias]
+    inicio = time.perf_counter()
+
+    with conexion.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+    pool = getattr(conexion, "pool", None)  # solo PostgreSQL con OPTIONS["pool"]
+    if pool is not None:
+        pool.wait(timeout=timeout or pool.timeout)
+        # Devuelve la conexión al pool
+        conexion.close()
+
+    duracion = (time.perf_counter() - inicio) * 1000
+    logger.info(
+        "Conexión %s lista en %.1f ms (%s)", alias, duracion,
+        f"pool {pool.min_size}-{pool.max_size}" if pool is not None
+        else f"CONN_MAX_AGE={conexion.settings_dict['CONN_MAX_AGE']}",
+    )
+    return duracion
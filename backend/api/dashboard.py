@@ -0,0 +1,186 @@
+"""
+Tablero de un BSC calculado en el servidor.
+
+Se arma con pocas consultas (categorías del BSC, enlaces categoría ↔
+indicador, indicadores y resúmenes), sin cargar el catálogo completo.
+Las consultas de ``consultas_dashboard`` son independientes entre sí: la
+vista sync las ejecuta una tras otra y la async (``vistas_async.py``) a
+la vez; ambas arman la respuesta con ``componer``. El
+cumplimiento de cada indicador compara el año a la fecha de resultados
+(R) contra el de objetivos (O) según su ``condicion``; normalmente se lee
+ya calculado de la tabla ``Resumen`` (ver ``resumenes.py``).
+"""
+from collections import defaultdict
+
+from django.db.models import CharField, Q
+from django.db.models.functions import Cast
+
+from .agregacion import (
+    CAMPOS_MES, calcular_ano_a_la_fecha, mascara_promedio, matriz_meses,
+)
+from .models import Categoria, Indicador, Resumen
+
+CAMPOS_INDICADOR = ["id", "n", "indicador", "dueno", "unidad", "condicion", "metodo_q"]
+
+
+def cumple(resultado, objetivo, condicion):
+    """True / False según la condición; None si falta R u O."""
+    if resultado is None or objetivo is None:
+        return None
+    if condicion == "MENOR":
+        return resultado <= objetivo
+    return resultado >= objetivo
+
+
+def evaluar(indicadores):
+    """Lista de dicts con los datos del indicador, R, O y cumplimiento."""
+    if not indicadores:
+        return []
+    matriz = matriz_meses(indicadores)
+    promedio = mascara_promedio(indicadores)
+    resultados = calcular_ano_a_la_fecha(matriz, promedio, "r")
+    objetivos = calcular_ano_a_la_fecha(matriz, promedio, "o")
+    return [
+        {
+            **{campo: getattr(ind, campo) for campo in CAMPOS_INDICADOR},
+            "resultado": r,
+            "objetivo": o,
+            "cumple": cumple(r, o, ind.condicion),
+        }
+        for ind, r, o in zip(indicadores, resultados, objetivos)
+    ]
+
+
+def resumir(evaluados):
+    resumen = {"total": len(evaluados), "cumplen": 0, "no_cumplen": 0, "sin_datos": 0}
+    for item in evaluados:
+        if item["cumple"] is None:
+            resumen["sin_datos"] += 1
+        elif item["cumple"]:
+            resumen["cumplen"] += 1
+        else:
+            resumen["no_cumplen"] += 1
+    con_datos = resumen["cumplen"] + resumen["no_cumplen"]
+    resumen["porcentaje_cumplimiento"] = (
+        round(100 * resumen["cumplen"] / con_datos, 2) if con_datos else None
+    )
+    return resumen
+
+
+def resumen_de(fila):
+    """Resumen de la tabla materializada con el mismo formato que ``resumir``."""
+    return {
+        "total": fila.total,
+        "cumplen": fila.cumplen,
+        "no_cumplen": fila.no_cumplen,
+        "sin_datos": fila.sin_datos,
+        "porcentaje_cumplimiento": fila.porcentaje_cumplimiento,
+    }
+
+
+def construir_dashboard(bsc, categorias, enlaces, evaluados, resumenes=None):
+    """
+    Compone la respuesta a partir de datos ya cargados:
+    ``categorias`` (dicts id/nombre/descripcion), ``enlaces`` (pares
+    categoria_id, indicador_id) y ``evaluados`` (salida de ``evaluar``).
+    ``resumenes`` ({(alcance, id): resumen}) evita recalcular los totales.
+    """
+    resumenes = resumenes or {}
+    evaluados = {item["id"]: item for item in evaluados}
+    por_categoria = defaultdict(list)
+    for categoria_id, indicador_id in enlaces:
+        if indicador_id in evaluados:
+            por_categoria[categoria_id].append(evaluados[indicador_id])
+
+    def resumen(alcance, pk, items):
+        return resumenes.get((alcance, pk)) or resumir(items)
+
+    return {
+        "id": bsc.id,
+        "nombre": bsc.nombre,
+        "resumen": resumen(Resumen.BSC, bsc.id, list(evaluados.values())),
+        "categorias": [
+            {
+                **categoria,
+                "resumen": resumen(Resumen.CATEGORIA, categoria["id"], por_categoria[categoria["id"]]),
+                "indicadores": por_categoria[categoria["id"]],
+            }
+            for categoria in categorias
+        ],
+    }
+
+
+def _evaluados_materializados(indicadores, filas):
+    evaluados = []
+    for ind in indicadores:
+        fila = filas[ind.pk]
+        evaluados.append({
+            **{campo: getattr(ind, campo) for campo in CAMPOS_INDICADOR},
+            "resultado": fila.resultado,
+            "objetivo": fila.objetivo,
+            "cumple": bool(fila.cumplen) if fila.cumplen or fila.no_cumplen else None,
+        })
+    return evaluados
+
+
+def consultas_dashboard(bsc_id):
+    """
+    Querysets del tablero del BSC ``bsc_id``. Cada uno filtra por el BSC
+    con sus propios joins / subconsultas, así que no dependen de los
+    resultados de los otros.
+    """
+    Through = Indicador.categorias.through
+    ids_indicadores = Through.objects.filter(categoria__bscs=bsc_id).values("indicador_id")
+    # alcance_id es texto
+    ids_categorias = (
+        Categoria.objects.filter(bscs=bsc_id)
+        .annotate(clave=Cast("id", CharField())).values("clave")
+    )
+    return {
+        "categorias": (
+            Categoria.objects.filter(bscs=bsc_id).order_by("nombre")
+            .values("id", "nombre", "descripcion")
+        ),
+        "enlaces": (
+            Through.objects.filter(categoria__bscs=bsc_id)
+            .order_by("indicador_id").values_list("categoria_id", "indicador_id")
+        ),
+        # Con los meses: si faltan resúmenes se evalúa sin otra consulta
+        "indicadores": (
+            Indicador.objects.filter(id__in=ids_indicadores)
+            .only(*CAMPOS_INDICADOR, *CAMPOS_MES).order_by("id")
+        ),
+        "resumenes": Resumen.objects.filter(periodo="ANO").filter(
+            Q(alcance=Resumen.BSC, alcance_id=str(bsc_id))
+            | Q(alcance=Resumen.CATEGORIA, alcance_id__in=ids_categorias)
+            | Q(alcance=Resumen.INDICADOR, indicador_id__in=ids_indicadores)
+        ),
+    }
+
+
+def componer(bsc, categorias, enlaces, indicadores, filas):
+    """
+    Tablero a partir de los resultados de ``consultas_dashboard``. R, O,
+    cumplimiento y totales salen de ``Resumen`` (periodo ANO); si faltan
+    filas, p. ej. antes de reconstruir los resúmenes, se calculan con los
+    meses.
+    """
+    por_indicador, resumenes = {}, {}
+    for fila in filas:
+        if fila.alcance == Resumen.INDICADOR:
+            por_indicador[fila.indicador_id] = fila
+        else:
+            resumenes[(fila.alcance, int(fila.alcance_id))] = resumen_de(fila)
+
+    if len(por_indicador) == len(indicadores) and len(resumenes) == len(categorias) + 1:
+        evaluados = _evaluados_materializados(indicadores, por_indicador)
+        return construir_dashboard(bsc, categorias, enlaces, evaluados, resumenes)
+    return construir_dashboard(bsc, categorias, enlaces, evaluar(indicadores))
+
+
+def dashboard_bsc(bsc):
+    """Tablero del BSC en cinco consultas (incluida la del propio BSC)."""
+    consultas = consultas_dashboard(bsc.id)
+    return componer(bsc, *(list(consultas[k]) for k in (
+        "categorias", "enlaces", "indicadores", "resumenes",
+    )))
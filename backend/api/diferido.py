@@ -0,0 +1,68 @@
+"""
+Rollup diferido (``settings.ROLLUP_DIFERIDO``).
+
+``Indicador.save`` guarda solo la fila y encola su id en
+``RollupPendiente``. El worker (``manage.py run_rollup_worker``) toma lotes
+de la cola y los procesa juntos: todas las hojas modificadas bajo un mismo
+padre generan un solo recálculo de ese padre, porque ``propagar`` trabaja
+sobre la unión de ancestros del lote.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import resumenes
+from .models import RollupPendiente
+from .rollup import propagar
+
+
+def encolar(ids):
+    """Marca ``ids`` como pendientes (o renueva ``encolado_en`` si ya lo están)."""
+    ahora = timezone.now()
+    RollupPendiente.objects.bulk_create(
+        [RollupPendiente(indicador_id=pk, encolado_en=ahora) for pk in set(ids)],
+        update_conflicts=True,
+        unique_fields=["indicador"],
+        update_fields=["encolado_en"],
+    )
+
+
+def procesar_lote(limite=500):
+    """
+    Procesa hasta ``limite`` indicadores pendientes y devuelve cuántos.
+
+    Con PostgreSQL las filas se toman con ``SKIP LOCKED``, así que varios
+    workers (o hilos) no procesan el mismo indicador. Los ancestros que
+    comparten dos lotes se bloquean (``propagar(bloquear=True)``) y se
+    recalculan de a uno, cada vez con los hijos ya confirmados. Un
+    indicador que se vuelve a encolar mientras se procesa conserva su
+    fila (su ``encolado_en`` es posterior al corte) y entra en el
+    siguiente lote.
+    """
+    with transaction.atomic():
+        qs = RollupPendiente.objects.order_by("encolado_en")
+        if connection.features.has_select_for_update_skip_locked:
+            qs = qs.select_for_update(skip_locked=True)
+        pendientes = list(qs.values_list("indicador_id", "encolado_en")[:limite])
+        if not pendientes:
+            return 0
+
+        ids = {pk for pk, _ in pendientes}
+        corte = max(encolado for _, encolado in pendientes)
+
+        propagados = propagar(ids, incluir_modificados=True, bloquear=True)
+        resumenes.actualizar(ids | set(propagados))
+
+        RollupPendiente.objects.filter(
+            indicador_id__in=ids, encolado_en__lte=corte
+        ).delete()
+    return len(ids)
+
+
+def drenar(limite=500):
+    """Procesa la cola hasta vaciarla; devuelve el total de indicadores."""
+    total = 0
+    while True:
+        procesados = procesar_lote(limite)
+        if not procesados:
+            return total
+        total += procesados
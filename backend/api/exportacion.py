@@ -0,0 +1,180 @@
+"""
+Exportación de indicadores a CSV, XLSX y Parquet.
+
+Las filas se leen con ``.iterator(chunk_size=...)`` y se escriben a
+medida que llegan, así que la memoria no depende del tamaño del
+catálogo. CSV se transmite directamente en la respuesta; XLSX (modo
+``write_only``) y Parquet (por lotes, requiere ``pyarrow``) se escriben
+en un archivo temporal.
+
+``categorias`` se exporta con los nombres y ``padres`` con los códigos
+``n``, separados por ``;``: el archivo se puede volver a importar con
+``import_indicadores``.
+"""
+import csv
+import tempfile
+
+from django.db.models import Prefetch
+
+from .models import Indicador, IndicadorRel
+from .serializers import IndicadorSerializer, campos_solicitados
+
+FORMATOS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+CHUNK_SIZE = 2000
+
+
+class FormatoNoDisponible(Exception):
+    pass
+
+
+def columnas_exportables():
+    """Columnas del modelo en el orden del serializer, más categorías y padres."""
+    concretas = {f.name for f in Indicador._meta.concrete_fields}
+    return [
+        c for c in IndicadorSerializer.Meta.fields
+        if c in concretas or c in ("categorias", "padres")
+    ]
+
+
+def resolver_columnas(request=None, fields=None, omit=None):
+    disponibles = columnas_exportables()
+    if request is not None:
+        campos = campos_solicitados(request, disponibles)
+        return campos if campos is not None else disponibles
+    if fields:
+        pedidos = set(fields)
+        disponibles = [c for c in disponibles if c in pedidos]
+    if omit:
+        disponibles = [c for c in disponibles if c not in set(omit)]
+    return disponibles
+
+
+def queryset_exportacion(columnas, categoria=None):
+    concretas = [c for c in columnas if c not in ("categorias", "padres")]
+    qs = Indicador.objects.only("id", *concretas).order_by("id")
+    if categoria:
+        qs = qs.filter(categorias__id=categoria)
+    if "categorias" in columnas:
+        qs = qs.prefetch_related("categorias")
+    if "padres" in columnas:
+        qs = qs.prefetch_related(Prefetch(
+            "padres",
+            queryset=IndicadorRel.objects.select_related("indicador_padre").only(
+                "indicador_hijo_id", "indicador_padre__n"
+            ).order_by("id"),
+        ))
+    return qs
+
+
+def iterar_filas(qs, columnas, chunk_size=CHUNK_SIZE):
+    """Genera una lista de valores por indicador, en el orden de ``columnas``."""
+    for indicador in qs.iterator(chunk_size=chunk_size):
+        fila = []
+        for columna in columnas:
+            if columna == "categorias":
+                fila.append(";".join(c.nombre for c in indicador.categorias.all()))
+            elif columna == "padres":
+                fila.append(";".join(
+                    rel.indicador_padre.n or "" for rel in indicador.padres.all()
+                ))
+            else:
+                fila.append(getattr(indicador, columna))
+        yield fila
+
+
+# ============================================================
+#   E S C R I T O R E S
+# ============================================================
+class _Eco:
+    """Pseudo-buffer: csv.writer escribe y la línea se devuelve tal cual."""
+
+    def write(self, valor):
+        return valor
+
+
+def generar_csv(columnas, filas):
+    escritor = csv.writer(_Eco())
+    yield "\ufeff" + escritor.writerow(columnas)
+    for fila in filas:
+        yield escritor.writerow(
+            [v.isoformat() if hasattr(v, "isoformat") else v for v in fila]
+        )
+
+
+def escribir_xlsx(columnas, filas, destino):
+    import openpyxl
+
+    libro = openpyxl.Workbook(write_only=True)
+    hoja = libro.create_sheet("Indicadores")
+    hoja.append(columnas)
+    for fila in filas:
+        # Excel no admite fechas con zona horaria
+        hoja.append([
+            v.replace(tzinfo=None) if getattr(v, "tzinfo", None) else v for v in fila
+        ])
+    libro.save(destino)
+
+
+def escribir_parquet(columnas, filas, destino, chunk_size=CHUNK_SIZE):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise FormatoNoDisponible("La exportación a Parquet requiere pyarrow")
+
+    esquema = pa.schema([(c, _tipo_arrow(pa, c)) for c in columnas])
+    escritor = pq.ParquetWriter(destino, esquema)
+    try:
+        lote = []
+        for fila in filas:
+            lote.append(fila)
+            if len(lote) >= chunk_size:
+                _escribir_lote(pa, escritor, columnas, lote)
+                lote = []
+        if lote:
+            _escribir_lote(pa, escritor, columnas, lote)
+    finally:
+        escritor.close()
+
+
+TIPOS_ENTEROS = {
+    "AutoField", "BigAutoField", "SmallAutoField",
+    "IntegerField", "SmallIntegerField", "BigIntegerField",
+    "PositiveIntegerField", "PositiveSmallIntegerField", "PositiveBigIntegerField",
+}
+
+
+def _tipo_arrow(pa, columna):
+    if columna in ("categorias", "padres"):
+        return pa.string()
+    tipo = Indicador._meta.get_field(columna).get_internal_type()
+    if tipo == "FloatField":
+        return pa.float64()
+    if tipo in TIPOS_ENTEROS:
+        return pa.int64()
+    if tipo == "BooleanField":
+        return pa.bool_()
+    if tipo == "DateTimeField":
+        return pa.timestamp("us", tz="UTC")
+    return pa.string()
+
+
+def _escribir_lote(pa, escritor, columnas, lote):
+    datos = {c: [fila[k] for fila in lote] for k, c in enumerate(columnas)}
+    escritor.write_table(pa.Table.from_pydict(datos, schema=escritor.schema))
+
+
+def exportar_a_archivo(formato, columnas, filas):
+    """Escribe XLSX / Parquet en un archivo temporal y lo devuelve abierto."""
+    temporal = tempfile.TemporaryFile()
+    if formato == "xlsx":
+        escribir_xlsx(columnas, filas, temporal)
+    else:
+        escribir_parquet(columnas, filas, temporal)
+    temporal.seek(0)
+    return temporal
@@ -0,0 +1,94 @@
+"""
+Hashers de contraseñas configurables desde ``settings`` (ver el bloque
+``PASSWORD_HASHER`` en ``backend/settings.py``).
+
+- ``Argon2PasswordHasher`` / ``BCryptSHA256PasswordHasher``: los de Django
+  con los parámetros de ``ARGON2_*`` / ``BCRYPT_ROUNDS``. Si cambian, los
+  hashes existentes se actualizan al iniciar sesión (``must_update``).
+- ``MD5RapidoPasswordHasher``: sin costo de CPU, para tests y benchmarks.
+  Se niega a hashear si ``HASHER_RAPIDO_PERMITIDO`` es False y el system
+  check ``api.E001`` impide arrancar con él en ``PASSWORD_HASHERS``.
+- ``hashear_en_paralelo``: hashes de muchas contraseñas repartidos en un
+  pool de procesos (el costo es CPU y el GIL no lo reparte entre hilos).
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.checks import Error, Tags, register
+from django.core.exceptions import ImproperlyConfigured
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return settings.ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.ARGON2_PARALLELISM
+
+
+class BCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+    @property
+    def rounds(self):
+        return settings.BCRYPT_ROUNDS
+
+
+class MD5RapidoPasswordHasher(hashers.MD5PasswordHasher):
+    def encode(self, password, salt):
+        if not settings.HASHER_RAPIDO_PERMITIDO:
+            raise ImproperlyConfigured(
+                "MD5RapidoPasswordHasher solo se puede usar en tests y benchmarks"
+            )
+        return super().encode(password, salt)
+
+
+@register(Tags.security)
+def revisar_hasher_rapido(app_configs, **kwargs):
+    if settings.HASHER_RAPIDO in settings.PASSWORD_HASHERS and not settings.HASHER_RAPIDO_PERMITIDO:
+        return [Error(
+            "PASSWORD_HASHERS incluye el hasher rápido (MD5) fuera de tests y benchmarks.",
+            hint="Quítelo de PASSWORD_HASHERS; se activa solo en `manage.py test` "
+                 "y `manage.py bench --hasher-rapido`.",
+            id="api.E001",
+        )]
+    return []
+
+
+# ============================================================
+#   H A S H E O   E N   P A R A L E L O
+# ============================================================
+def _iniciar_proceso(modulo_settings):
+    # Con "spawn" / "forkserver" el proceso arranca sin Django configurado
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", modulo_settings)
+    import django
+
+    django.setup()
+
+
+def hashear_en_paralelo(contrasenas, procesos=None, minimo=8):
+    """
+    ``make_password`` de cada contraseña, en el mismo orden. Con menos de
+    ``minimo`` contraseñas (o un solo proceso) no vale la pena levantar el
+    pool y se hashea aquí.
+    """
+    contrasenas = list(contrasenas)
+    procesos = procesos or os.cpu_count() or 1
+    if procesos <= 1 or len(contrasenas) < minimo:
+        return [hashers.make_password(c) for c in contrasenas]
+
+    with ProcessPoolExecutor(
+        max_workers=procesos,
+        initializer=_iniciar_proceso,
+        initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", "backend.settings"),),
+    ) as pool:
+        return list(pool.map(
+            hashers.make_password, contrasenas,
+            chunksize=max(len(contrasenas) // (procesos * 4), 1),
+        ))
@@ -0,0 +1,226 @@
+"""
+Importación de indicadores desde CSV / XLSX.
+
+El archivo se lee fila por fila (``csv`` o ``openpyxl`` en modo
+``read_only``) y cada celda se valida con el campo correspondiente de
+``IndicadorSerializer``. Las filas válidas se juntan en lotes de
+``batch_size``: por cada lote se reservan sus códigos ``n`` (transacción
+corta propia, sin dejar bloqueada la secuencia) y se insertan con
+``bulk_create`` en su propia transacción; luego el lote se descarta, así
+que la memoria no crece con el archivo. Las categorías y relaciones
+padre → hijo se resuelven al final con operaciones de conjunto.
+
+Las filas con errores se informan y no detienen la importación. Si un
+lote falla, los lotes anteriores ya quedaron guardados.
+
+Columnas reconocidas: los campos editables de ``Indicador`` (ene_r …
+dic_o, metodo_q, condicion, dueno, …) más ``categorias`` (nombres o ids)
+y ``padres`` (códigos ``n``), separados por ``;`` o ``,``.
+"""
+import codecs
+import csv
+import re
+
+from django.db import transaction
+from django.db.models import Q
+from rest_framework import serializers
+
+from . import cache, jerarquia, resumenes
+from .agregacion import recalcular
+from .masivo import CAMPOS_NO_EDITABLES
+from .models import Categoria, Indicador, IndicadorRel
+from .rollup import propagar
+from .secuencias import asignar_codigos
+from .serializers import IndicadorSerializer
+from .series import sincronizar
+
+COLUMNAS_ENLACE = {"categorias", "padres"}
+MAX_ERRORES = 1000
+
+
+# ============================================================
+#   L E C T U R A
+# ============================================================
+def leer_filas(archivo, nombre):
+    """Genera un dict por fila a partir de un archivo binario CSV o XLSX."""
+    if nombre.lower().endswith((".xlsx", ".xlsm")):
+        import openpyxl
+
+        libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+        try:
+            filas = libro.active.iter_rows(values_only=True)
+            cabecera = [str(c).strip() if c is not None else "" for c in next(filas, ())]
+            for fila in filas:
+                if any(v is not None for v in fila):
+                    yield dict(zip(cabecera, fila))
+        finally:
+            libro.close()
+    else:
+        texto = codecs.getreader("utf-8-sig")(archivo)
+        for fila in csv.DictReader(texto):
+            yield {(k or "").strip(): v for k, v in fila.items()}
+
+
+def _separar(valor):
+    if valor is None:
+        return []
+    return [v.strip() for v in re.split(r"[;,]", str(valor)) if v.strip()]
+
+
+# ============================================================
+#   I M P O R T A C I Ó N
+# ============================================================
+class Importador:
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.campos = {
+            nombre: campo
+            for nombre, campo in IndicadorSerializer().fields.items()
+            if not campo.read_only and nombre not in CAMPOS_NO_EDITABLES
+        }
+        self.creados = 0
+        self.errores = []
+        self.total_errores = 0
+        self.columnas_ignoradas = set()
+        # (id del indicador creado, [categorías], [códigos padre])
+        self._enlaces = []
+        # Alcances de resumen afectados por la importación
+        self.duenos = set()
+        self.categorias = set()
+
+    def _registrar_error(self, fila, errores):
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append({"fila": fila, "errores": errores})
+
+    def _validar(self, datos):
+        valores, errores = {}, {}
+        for columna, valor in datos.items():
+            if columna in COLUMNAS_ENLACE:
+                continue
+            campo = self.campos.get(columna)
+            if campo is None:
+                if columna:
+                    self.columnas_ignoradas.add(columna)
+                continue
+            if isinstance(valor, str):
+                valor = valor.strip()
+            if valor == "":
+                valor = None
+            if valor is None and not campo.allow_null:
+                continue
+            try:
+                valores[campo.source] = campo.run_validation(valor)
+            except serializers.ValidationError as exc:
+                errores[columna] = exc.detail
+        return valores, errores
+
+    def _insertar(self, lote, enlaces):
+        # Reserva fuera de la transacción del lote: la fila de la secuencia
+        # no queda bloqueada mientras se inserta. Si el lote falla, sus
+        # códigos quedan como hueco.
+        asignar_codigos(lote)
+        with transaction.atomic():
+            recalcular(lote)
+            Indicador.objects.bulk_create(lote)
+            sincronizar(lote, batch_size=self.batch_size)
+            resumenes.guardar(resumenes.filas_indicador(lote), self.batch_size)
+        self.duenos.update(indicador.dueno for indicador in lote)
+        self.creados += len(lote)
+        for indicador, (categorias, padres) in zip(lote, enlaces):
+            if categorias or padres:
+                self._enlaces.append((indicador.pk, categorias, padres))
+
+    def importar(self, filas):
+        lote, enlaces = [], []
+        for numero, datos in enumerate(filas, start=2):  # fila 1 = cabecera
+            valores, errores = self._validar(datos)
+            if errores:
+                self._registrar_error(numero, errores)
+                continue
+            lote.append(Indicador(**valores))
+            enlaces.append((_separar(datos.get("categorias")), _separar(datos.get("padres"))))
+            if len(lote) >= self.batch_size:
+                self._insertar(lote, enlaces)
+                lote, enlaces = [], []
+        if lote:
+            self._insertar(lote, enlaces)
+
+        with transaction.atomic():
+            self._resolver_categorias()
+            propagados = self._resolver_padres()
+            resumenes.actualizar_alcances(categorias=self.categorias, duenos=self.duenos)
+            resumenes.actualizar(propagados)
+        # bulk_create no emite signals
+        cache.invalidar(*cache.MODELOS)
+        return self.resumen()
+
+    def _resolver_categorias(self):
+        nombres = {c for _, categorias, _ in self._enlaces for c in categorias}
+        if not nombres:
+            return
+        ids = {int(c) for c in nombres if c.isdigit()}
+        por_clave = {}
+        for pk, nombre in Categoria.objects.filter(
+            Q(id__in=ids) | Q(nombre__in=nombres)
+        ).order_by("id").values_list("id", "nombre"):
+            por_clave[str(pk)] = pk
+            por_clave.setdefault(nombre, pk)
+
+        Through = Indicador.categorias.through
+        nuevos, faltantes = [], set()
+        for indicador_id, categorias, _ in self._enlaces:
+            for categoria in set(categorias):
+                if categoria in por_clave:
+                    nuevos.append(Through(indicador_id=indicador_id, categoria_id=por_clave[categoria]))
+                else:
+                    faltantes.add(categoria)
+        Through.objects.bulk_create(nuevos, batch_size=self.batch_size, ignore_conflicts=True)
+        self.categorias.update(enlace.categoria_id for enlace in nuevos)
+        for categoria in sorted(faltantes):
+            self._registrar_error(None, {"categorias": [f"Categoría no encontrada: {categoria}"]})
+
+    def _resolver_padres(self):
+        codigos = {c for _, _, padres in self._enlaces for c in padres}
+        if not codigos:
+            return []
+        # Si varios indicadores comparten código se usa el más reciente
+        por_codigo = dict(
+            Indicador.objects.filter(n__in=codigos).order_by("id").values_list("n", "id")
+        )
+
+        indice = jerarquia.IndiceJerarquia(
+            IndicadorRel.objects.values_list("id", "indicador_padre_id", "indicador_hijo_id")
+        )
+        nuevas, provisional = [], -1
+        for hijo_id, _, padres in self._enlaces:
+            for codigo in dict.fromkeys(padres):
+                padre_id = por_codigo.get(codigo)
+                if padre_id is None:
+                    self._registrar_error(None, {"padres": [f"Indicador padre no encontrado: {codigo}"]})
+                elif indice.crearia_ciclo(padre_id, hijo_id):
+                    self._registrar_error(None, {"padres": [f"La relación {codigo} → {hijo_id} crearía un ciclo"]})
+                else:
+                    indice.agregar(provisional, padre_id, hijo_id)
+                    provisional -= 1
+                    nuevas.append(IndicadorRel(indicador_padre_id=padre_id, indicador_hijo_id=hijo_id))
+
+        if nuevas:
+            IndicadorRel.objects.bulk_create(nuevas, batch_size=self.batch_size, ignore_conflicts=True)
+            jerarquia.invalidar()
+            # El índice del proceso recién se actualiza al confirmar: aquí
+            # se usa el local, que ya tiene las relaciones nuevas
+            return propagar({rel.indicador_hijo_id for rel in nuevas}, indice=indice)
+        return []
+
+    def resumen(self):
+        return {
+            "creados": self.creados,
+            "total_errores": self.total_errores,
+            "errores": self.errores,
+            "columnas_ignoradas": sorted(self.columnas_ignoradas),
+        }
+
+
+def importar_indicadores(archivo, nombre, batch_size=1000):
+    return Importador(batch_size=batch_size).importar(leer_filas(archivo, nombre))
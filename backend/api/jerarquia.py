@@ -0,0 +1,332 @@
+"""
+Índice en memoria de la jerarquía ``IndicadorRel``.
+
+Mantiene los mapas padre → hijos e hijo → padres, un orden topológico y
+los conjuntos de ancestros / descendientes de cada nodo (memorizados).
+Se carga una vez por proceso con una sola consulta y luego se actualiza
+de forma incremental desde los signals de ``IndicadorRel``.
+
+Los cambios se aplican al confirmarse la transacción
+(``transaction.on_commit``): una relación que se revierte nunca llega al
+índice. Cada cambio incrementa un contador de versión en la BD
+(``secuencias.incrementar``, atómico); los demás procesos detectan el
+cambio y recargan su índice en el siguiente acceso. Si al incrementar el
+contador no queda justo después de la versión del índice, otro proceso
+cambió la jerarquía entretanto y el índice se descarta.
+
+Para validar ciclos, ``indice_vigente`` devuelve el índice solo si está
+al día y la transacción en curso no tiene cambios sin publicar; si no,
+se consulta la BD (ver ``IndicadorRelSerializer.validate``).
+
+El índice publicado no se modifica: cada cambio se aplica a una copia que
+reemplaza a la anterior (copy-on-write). Los lectores de otros hilos
+siguen usando la versión que obtuvieron con ``indice()`` sin tomar el
+lock; solo los conjuntos memorizados se agregan sobre la marcha.
+"""
+import bisect
+import threading
+from collections import defaultdict, deque
+
+from django.db import transaction
+
+from . import secuencias
+
+CLAVE_VERSION = f"{secuencias.PREFIJO_VERSION}jerarquia"
+
+
+class IndiceJerarquia:
+    def __init__(self, aristas=()):
+        """``aristas``: iterable de (rel_id, padre_id, hijo_id)."""
+        self._rels = {}
+        self._hijos = defaultdict(list)   # padre -> [(rel_id, hijo)] ordenado por rel_id
+        self._padres = defaultdict(list)  # hijo -> [(rel_id, padre)] ordenado por rel_id
+        self._ancestros = {}
+        self._descendientes = {}
+        self._orden = None
+        for rel_id, padre, hijo in aristas:
+            self._insertar(rel_id, padre, hijo)
+
+    # --------------------------------------------------------
+    #   Consultas
+    # --------------------------------------------------------
+    def hijos(self, nodo):
+        return [h for _, h in self._hijos.get(nodo, ())]
+
+    def padres(self, nodo):
+        return [p for _, p in self._padres.get(nodo, ())]
+
+    def mapa_hijos(self):
+        """{padre: [hijos]} con los hijos en el orden de creación de la relación."""
+        return {p: [h for _, h in rels] for p, rels in self._hijos.items()}
+
+    def ancestros(self, nodo):
+        if nodo not in self._ancestros:
+            self._ancestros[nodo] = frozenset(self._recorrer(nodo, self._padres))
+        return self._ancestros[nodo]
+
+    def descendientes(self, nodo):
+        if nodo not in self._descendientes:
+            self._descendientes[nodo] = frozenset(self._recorrer(nodo, self._hijos))
+        return self._descendientes[nodo]
+
+    def crearia_ciclo(self, padre, hijo, excluir_rel=None):
+        """
+        True si agregar la relación ``padre`` → ``hijo`` cerraría un ciclo.
+
+        ``excluir_rel`` ignora una relación existente (al editarla); en ese
+        caso el recorrido no usa los conjuntos memorizados.
+        """
+        if padre == hijo:
+            return True
+        if excluir_rel is None:
+            return padre in self.descendientes(hijo)
+        return padre in self._recorrer(hijo, self._hijos, excluir_rel)
+
+    def orden_topologico(self):
+        """Todos los nodos con relaciones, cada hijo antes que sus padres."""
+        if self._orden is None:
+            nodos = set(self._hijos) | set(self._padres)
+            pendientes = {n: len(self._hijos.get(n, ())) for n in nodos}
+            cola = deque(sorted(n for n, c in pendientes.items() if c == 0))
+            orden = []
+            while cola:
+                nodo = cola.popleft()
+                orden.append(nodo)
+                for _, padre in self._padres.get(nodo, ()):
+                    pendientes[padre] -= 1
+                    if pendientes[padre] == 0:
+                        cola.append(padre)
+            self._orden = orden
+        return self._orden
+
+    # --------------------------------------------------------
+    #   Actualización incremental
+    # --------------------------------------------------------
+    def copia(self):
+        """Copia independiente; conserva los conjuntos memorizados."""
+        nuevo = IndiceJerarquia()
+        nuevo._rels = dict(self._rels)
+        nuevo._hijos = defaultdict(list, {p: list(r) for p, r in self._hijos.items()})
+        nuevo._padres = defaultdict(list, {h: list(r) for h, r in self._padres.items()})
+        nuevo._ancestros = dict(self._ancestros)
+        nuevo._descendientes = dict(self._descendientes)
+        return nuevo
+
+    def agregar(self, rel_id, padre, hijo):
+        if rel_id in self._rels:
+            self.quitar(rel_id)
+        self._invalidar(padre, hijo)
+        self._insertar(rel_id, padre, hijo)
+
+    def quitar(self, rel_id):
+        arista = self._rels.pop(rel_id, None)
+        if arista is None:
+            return
+        padre, hijo = arista
+        self._invalidar(padre, hijo)
+        self._hijos[padre].remove((rel_id, hijo))
+        self._padres[hijo].remove((rel_id, padre))
+        if not self._hijos[padre]:
+            del self._hijos[padre]
+        if not self._padres[hijo]:
+            del self._padres[hijo]
+
+    # --------------------------------------------------------
+    #   Internos
+    # --------------------------------------------------------
+    def _insertar(self, rel_id, padre, hijo):
+        self._rels[rel_id] = (padre, hijo)
+        bisect.insort(self._hijos[padre], (rel_id, hijo))
+        bisect.insort(self._padres[hijo], (rel_id, padre))
+
+    def _invalidar(self, padre, hijo):
+        # Cambian los descendientes de padre y sus ancestros,
+        # y los ancestros de hijo y sus descendientes.
+        for nodo in self.ancestros(padre) | {padre}:
+            self._descendientes.pop(nodo, None)
+        for nodo in self.descendientes(hijo) | {hijo}:
+            self._ancestros.pop(nodo, None)
+        self._orden = None
+
+    @staticmethod
+    def _recorrer(nodo, vecinos, excluir_rel=None):
+        vistos = set()
+        pila = [nodo]
+        while pila:
+            actual = pila.pop()
+            for rel_id, siguiente in vecinos.get(actual, ()):
+                if rel_id != excluir_rel and siguiente not in vistos:
+                    vistos.add(siguiente)
+                    pila.append(siguiente)
+        return vistos
+
+
+# ============================================================
+#   Í N D I C E   D E L   P R O C E S O
+# ============================================================
+_lock = threading.Lock()
+_indice = None
+_version = None
+
+
+def indice():
+    """Índice del proceso; se (re)carga si cambió la versión compartida."""
+    global _indice, _version
+    version = version_compartida()
+    with _lock:
+        if _indice is None or version != _version:
+            from .models import IndicadorRel
+
+            _indice = IndiceJerarquia(
+                IndicadorRel.objects.values_list(
+                    "id", "indicador_padre_id", "indicador_hijo_id"
+                )
+            )
+            _version = version
+        return _indice
+
+
+def indice_vigente(using=None):
+    """
+    El índice del proceso si refleja la BD tal como la ve esta transacción:
+    su versión es la compartida y no hay cambios de la jerarquía esperando
+    el commit. Si no, ``None``; no lo recarga (una sola validación no
+    justifica leer todas las relaciones).
+    """
+    if _cambios_pendientes(using):
+        return None
+    version = version_compartida()
+    with _lock:
+        if _indice is not None and version == _version:
+            return _indice
+    return None
+
+
+def _cambios_pendientes(using=None):
+    """True si la transacción en curso cambió la jerarquía (aún sin commit)."""
+    conexion = transaction.get_connection(using)
+    return any(
+        getattr(funcion, "cambia_jerarquia", False)
+        for _, funcion, _ in conexion.run_on_commit
+    )
+
+
+def _al_confirmar(funcion):
+    # Marcada para ``_cambios_pendientes``; deja de contar al ejecutarse
+    # aunque siga en la lista (``captureOnCommitCallbacks`` en los tests)
+    def publicar():
+        publicar.cambia_jerarquia = False
+        funcion()
+
+    publicar.cambia_jerarquia = True
+    transaction.on_commit(publicar)
+
+
+def version_compartida():
+    return secuencias.valores([CLAVE_VERSION]).get(CLAVE_VERSION, 0)
+
+
+def _incrementar_version():
+    global _indice, _version
+    version = secuencias.incrementar(CLAVE_VERSION)
+    if _version is None or version != _version + 1:
+        # Otro proceso cambió la jerarquía: este índice ya no sirve
+        _indice = None
+    _version = version
+
+
+def _publicar(cambio):
+    """Aplica ``cambio`` a una copia del índice y la publica."""
+    global _indice
+    with _lock:
+        if _indice is not None:
+            nuevo = _indice.copia()
+            cambio(nuevo)
+            _indice = nuevo
+        _incrementar_version()
+
+
+def relacion_guardada(rel_id, padre, hijo):
+    _al_confirmar(lambda: _publicar(lambda ix: ix.agregar(rel_id, padre, hijo)))
+
+
+def relacion_eliminada(rel_id):
+    _al_confirmar(lambda: _publicar(lambda ix: ix.quitar(rel_id)))
+
+
+def _invalidar_ahora():
+    global _indice
+    with _lock:
+        _indice = None
+        _incrementar_version()
+
+
+def invalidar():
+    """
+    Descarta el índice (p. ej. tras un ``bulk_create`` sin signals) cuando
+    se confirma la transacción. Hasta entonces el índice no incluye los
+    cambios: quien los necesite dentro de la transacción arma el suyo
+    (ver ``importacion.py``).
+    """
+    _al_confirmar(_invalidar_ahora)
+
+
+def descartar():
+    """Descarta solo el índice de este proceso; se recarga al volver a usarlo."""
+    global _indice
+    with _lock:
+        _indice = None
+
+
+# ============================================================
+#   C O N S U L T A S   R E C U R S I V A S   ( B D )
+# ============================================================
+# Motores con WITH RECURSIVE (SQLite desde 3.8.3, MySQL desde 8.0). En
+# los demás se usa el índice en memoria.
+MOTORES_CTE = {"postgresql", "sqlite", "mysql"}
+
+# dirección -> (columna de partida, columna a la que se llega)
+DIRECCIONES = {
+    "descendientes": ("indicador_padre", "indicador_hijo"),
+    "ancestros": ("indicador_hijo", "indicador_padre"),
+}
+
+
+def sql_alcanzables(conexion, direccion, nodo, excluir_rel=None):
+    """
+    ``(sql, params)`` de una CTE recursiva con los ids alcanzables desde
+    ``nodo`` siguiendo ``IndicadorRel`` en ``direccion``. ``UNION`` (no
+    ``UNION ALL``) descarta repetidos y corta aun si los datos tuvieran
+    un ciclo.
+    """
+    from .models import IndicadorRel
+
+    meta, q = IndicadorRel._meta, conexion.ops.quote_name
+    desde, hasta = (q(meta.get_field(c).column) for c in DIRECCIONES[direccion])
+    tabla, pk = q(meta.db_table), q(meta.pk.column)
+    filtro, params = "", []
+    if excluir_rel is not None:
+        filtro, params = f" AND r.{pk} <> %s", [excluir_rel]
+
+    sql = (
+        f"WITH RECURSIVE alcanzables(id) AS ("
+        f"SELECT r.{hasta} FROM {tabla} r WHERE r.{desde} = %s{filtro} UNION "
+        f"SELECT r.{hasta} FROM {tabla} r JOIN alcanzables a ON r.{desde} = a.id{filtro}"
+        f") SELECT id FROM alcanzables"
+    )
+    return sql, [nodo, *params, *params]
+
+
+def alcanzables(conexion, direccion, nodo, excluir_rel=None):
+    """
+    Valor para ``id__in``: subconsulta recursiva (una sola consulta sea
+    cual sea la profundidad) o, sin soporte de CTE, los ids del índice.
+    """
+    from django.db.models.expressions import RawSQL
+
+    if conexion.vendor in MOTORES_CTE:
+        return RawSQL(*sql_alcanzables(conexion, direccion, nodo, excluir_rel))
+
+    ix = indice()
+    vecinos = ix._hijos if direccion == "descendientes" else ix._padres
+    return list(ix._recorrer(nodo, vecinos, excluir_rel))
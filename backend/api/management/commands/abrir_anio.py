@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api import cache, resumenes
+from api.series import abrir_anio
+
+
+class Command(BaseCommand):
+    help = (
+        "Pasa las columnas ene_r … q4_o de todos los indicadores a otro año "
+        "(el nuevo cada enero, o uno anterior para corregirlo). El año que se "
+        "deja queda en la serie IndicadorValor."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("anio", type=int, help="Año a abrir, p. ej. 2027")
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Filas por sentencia de bulk_update (por defecto 1000)",
+        )
+
+    def handle(self, *args, **options):
+        anio = options["anio"]
+        if not 1 <= anio <= 9999:
+            raise CommandError("Año inválido")
+        batch_size = max(options["batch_size"], 1)
+
+        with transaction.atomic():
+            cambiados = abrir_anio(anio, batch_size=batch_size)
+            resumenes.reconstruir(batch_size=batch_size)
+        cache.invalidar(*cache.MODELOS)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(cambiados)} indicadores pasados a {anio}"
+        ))
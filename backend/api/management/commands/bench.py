@@ -0,0 +1,158 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone as dt_timezone
+
+import django
+from django.conf import settings
+from django.core.cache import cache as django_cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings, setup_test_environment, teardown_test_environment,
+)
+from rest_framework.test import APIClient
+
+from api.bench import datos as datos_bench
+from api.bench.escenarios import ESCENARIOS, comparar, ejecutar
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide latencia (p50 / p95) y consultas de las operaciones principales "
+        "sobre un árbol sintético, en una base de datos de pruebas. Imprime JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--indicadores", type=int, default=1000)
+        parser.add_argument("--profundidad", type=int, default=5, help="Niveles de cada árbol")
+        parser.add_argument("--ramificacion", type=int, default=4, help="Hijos por nodo")
+        parser.add_argument("--bscs", type=int, default=2)
+        parser.add_argument("--categorias-por-bsc", type=int, default=3)
+        parser.add_argument("--repeticiones", type=int, default=20)
+        parser.add_argument("--semilla", type=int, default=0)
+        parser.add_argument(
+            "--escenarios",
+            help=f"Separados por comas (por defecto todos): {', '.join(ESCENARIOS)}",
+        )
+        parser.add_argument(
+            "--con-cache", action="store_true",
+            help="Deja activa la caché de respuestas (por defecto se mide sin caché)",
+        )
+        parser.add_argument(
+            "--hasher-rapido", action="store_true",
+            help="Hashea contraseñas con el hasher rápido de tests (por defecto, el de producción)",
+        )
+        parser.add_argument("--salida", help="Guarda el JSON en este archivo")
+        parser.add_argument(
+            "--comparar", metavar="BASE",
+            help="JSON de una corrida anterior; falla si hay regresiones",
+        )
+        parser.add_argument(
+            "--tolerancia", type=float, default=0.2,
+            help="Aumento de p95 tolerado al comparar (por defecto 0.2 = 20%%)",
+        )
+
+    def handle(self, *args, **options):
+        nombres = None
+        if options["escenarios"]:
+            nombres = {n.strip() for n in options["escenarios"].split(",") if n.strip()}
+            desconocidos = nombres - set(ESCENARIOS)
+            if desconocidos:
+                raise CommandError(f"Escenarios desconocidos: {', '.join(sorted(desconocidos))}")
+
+        base = None
+        if options["comparar"]:
+            try:
+                with open(options["comparar"], encoding="utf-8") as archivo:
+                    base = json.load(archivo)["escenarios"]
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"No se pudo leer {options['comparar']}: {e}")
+
+        parametros = {
+            clave: options[clave]
+            for clave in ("indicadores", "profundidad", "ramificacion", "bscs",
+                          "categorias_por_bsc", "repeticiones", "semilla", "con_cache",
+                          "hasher_rapido")
+        }
+
+        resultados = self._correr(nombres, parametros)
+        informe = {
+            "commit": _commit(),
+            "fecha": datetime.now(dt_timezone.utc).isoformat(timespec="seconds"),
+            "entorno": {
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "bd": connection.vendor,
+                "rollup_diferido": settings.ROLLUP_DIFERIDO,
+                "conn_max_age": connection.settings_dict["CONN_MAX_AGE"],
+                "pool": bool(connection.settings_dict.get("OPTIONS", {}).get("pool")),
+                "hasher": (
+                    settings.HASHER_RAPIDO if parametros["hasher_rapido"]
+                    else settings.PASSWORD_HASHERS[0]
+                ),
+            },
+            "parametros": parametros,
+            "escenarios": resultados,
+        }
+
+        texto = json.dumps(informe, indent=2, ensure_ascii=False)
+        if options["salida"]:
+            with open(options["salida"], "w", encoding="utf-8") as archivo:
+                archivo.write(texto + "\n")
+        self.stdout.write(texto)
+
+        if base is not None:
+            regresiones = comparar(resultados, base, options["tolerancia"])
+            if regresiones:
+                raise CommandError("Regresiones:\n" + "\n".join(regresiones))
+            self.stderr.write(self.style.SUCCESS("✅ Sin regresiones"))
+
+    def _correr(self, nombres, parametros):
+        """Crea una BD de pruebas, genera los datos y mide."""
+        setup_test_environment()
+        nombre_original = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            ajustes = {
+                "METRICAS_LENTO_MS": float("inf"),
+                # Caché propia del bench: limpiarla no toca la compartida
+                # (respuestas y usuarios del JWT)
+                "CACHES": {"default": {
+                    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                    "LOCATION": "bench",
+                }},
+                "CACHE_LOCMEM_PERMITIDO": True,
+                "API_CACHE_TIMEOUT": 300 if parametros["con_cache"] else 0,
+            }
+            if parametros["hasher_rapido"]:
+                ajustes["PASSWORD_HASHERS"] = [settings.HASHER_RAPIDO, *settings.PASSWORD_HASHERS]
+                ajustes["HASHER_RAPIDO_PERMITIDO"] = True
+            with override_settings(**ajustes):
+                django_cache.clear()
+                datos = datos_bench.generar(
+                    indicadores=parametros["indicadores"],
+                    profundidad=parametros["profundidad"],
+                    ramificacion=parametros["ramificacion"],
+                    bscs=parametros["bscs"],
+                    categorias_por_bsc=parametros["categorias_por_bsc"],
+                    semilla=parametros["semilla"],
+                )
+                return ejecutar(
+                    APIClient(), datos, nombres,
+                    repeticiones=parametros["repeticiones"],
+                    semilla=parametros["semilla"],
+                )
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
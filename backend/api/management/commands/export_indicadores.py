@@ -0,0 +1,59 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.exportacion import (
+    CHUNK_SIZE,
+    FORMATOS,
+    FormatoNoDisponible,
+    escribir_parquet,
+    escribir_xlsx,
+    generar_csv,
+    iterar_filas,
+    queryset_exportacion,
+    resolver_columnas,
+)
+
+
+class Command(BaseCommand):
+    help = "Exporta los indicadores a CSV, XLSX o Parquet leyendo la BD por bloques"
+
+    def add_arguments(self, parser):
+        parser.add_argument("salida", help="Archivo de salida (.csv, .xlsx o .parquet)")
+        parser.add_argument(
+            "--formato", choices=sorted(FORMATOS),
+            help="Formato de salida (por defecto, según la extensión)",
+        )
+        parser.add_argument("--categoria", help="Solo indicadores de esta categoría (id)")
+        parser.add_argument("--fields", help="Columnas a exportar, separadas por comas")
+        parser.add_argument("--omit", help="Columnas a omitir, separadas por comas")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        salida = options["salida"]
+        formato = options["formato"] or os.path.splitext(salida)[1].lstrip(".").lower()
+        if formato not in FORMATOS:
+            raise CommandError(f"Formato no soportado: {formato}")
+
+        columnas = resolver_columnas(
+            fields=options["fields"].split(",") if options["fields"] else None,
+            omit=options["omit"].split(",") if options["omit"] else None,
+        )
+        filas = iterar_filas(
+            queryset_exportacion(columnas, options["categoria"]),
+            columnas, chunk_size=options["chunk_size"],
+        )
+
+        try:
+            if formato == "csv":
+                with open(salida, "w", encoding="utf-8", newline="") as archivo:
+                    for linea in generar_csv(columnas, filas):
+                        archivo.write(linea)
+            elif formato == "xlsx":
+                escribir_xlsx(columnas, filas, salida)
+            else:
+                escribir_parquet(columnas, filas, salida, chunk_size=options["chunk_size"])
+        except FormatoNoDisponible as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Indicadores exportados a {salida}"))
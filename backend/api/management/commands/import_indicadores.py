@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importacion import importar_indicadores
+
+
+class Command(BaseCommand):
+    help = "Importa indicadores desde un archivo CSV o XLSX en lotes (bulk_create)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo", help="Ruta del archivo .csv o .xlsx")
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Indicadores por lote de bulk_create (por defecto 1000)",
+        )
+
+    def handle(self, *args, **options):
+        ruta = options["archivo"]
+        try:
+            with open(ruta, "rb") as archivo:
+                resumen = importar_indicadores(archivo, ruta, options["batch_size"])
+        except OSError as e:
+            raise CommandError(f"No se pudo leer {ruta}: {e}")
+
+        for error in resumen["errores"]:
+            fila = f"Fila {error['fila']}" if error["fila"] else "Enlaces"
+            self.stdout.write(self.style.WARNING(f"⚠ {fila}: {error['errores']}"))
+        if resumen["columnas_ignoradas"]:
+            self.stdout.write(
+                f"Columnas ignoradas: {', '.join(resumen['columnas_ignoradas'])}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {resumen['creados']} indicadores importados, "
+            f"{resumen['total_errores']} errores"
+        ))
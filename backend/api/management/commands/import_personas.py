@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importacion import leer_filas
+from api.preregistro import escribir_csv, preregistrar
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-registra personas desde un CSV o XLSX (nombres, apellidos, email) "
+        "y genera sus códigos de registro"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo", help="Ruta del archivo .csv o .xlsx")
+        parser.add_argument(
+            "--salida",
+            help="CSV con los códigos generados (por defecto se imprime en la salida estándar)",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Filas por sentencia de bulk_create (por defecto 1000)",
+        )
+
+    def handle(self, *args, **options):
+        ruta = options["archivo"]
+        try:
+            with open(ruta, "rb") as archivo:
+                resumen = preregistrar(leer_filas(archivo, ruta), max(options["batch_size"], 1))
+        except OSError as e:
+            raise CommandError(f"No se pudo leer {ruta}: {e}")
+
+        if options["salida"]:
+            try:
+                with open(options["salida"], "w", encoding="utf-8", newline="") as salida:
+                    escribir_csv(resumen["codigos"], salida)
+            except OSError as e:
+                raise CommandError(f"No se pudo escribir {options['salida']}: {e}")
+        else:
+            escribir_csv(resumen["codigos"], self.stdout)
+
+        # Los mensajes van a stderr para no mezclarse con el CSV
+        for error in resumen["errores"]:
+            self.stderr.write(self.style.WARNING(f"⚠ Fila {error['fila']}: {error['errores']}"))
+        self.stderr.write(self.style.SUCCESS(
+            f"✅ {resumen['creadas']} personas creadas, {resumen['existentes']} existentes "
+            f"({resumen['con_usuario']} ya con usuario), {len(resumen['codigos'])} códigos, "
+            f"{resumen['total_errores']} errores"
+        ))
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import CodigoRegistro
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra los códigos de registro usados o vencidos, por lotes "
+        "(pensado para cron)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Códigos por DELETE (por defecto 1000)",
+        )
+        parser.add_argument(
+            "--pausa", type=float, default=0,
+            help="Segundos de espera entre lotes, para no competir con el tráfico",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Solo cuenta los códigos que se borrarían",
+        )
+
+    def handle(self, *args, **options):
+        # Fijo para toda la corrida: los lotes no persiguen a los que vencen
+        # mientras tanto
+        purgables = CodigoRegistro.objects.purgables(timezone.now())
+        if options["dry_run"]:
+            self.stdout.write(f"{purgables.count()} códigos usados o vencidos")
+            return
+
+        batch_size = max(options["batch_size"], 1)
+        total = 0
+        while True:
+            # Cada lote es su propia transacción corta (autocommit)
+            ids = list(purgables.order_by("pk").values_list("pk", flat=True)[:batch_size])
+            if not ids:
+                break
+            borrados, _ = CodigoRegistro.objects.filter(pk__in=ids).delete()
+            total += borrados
+            if len(ids) < batch_size:
+                break
+            if options["pausa"]:
+                time.sleep(options["pausa"])
+
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} códigos borrados"))
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api import cache, jerarquia, resumenes
+from api.models import Indicador
+from api.rollup import CAMPOS_ROLLUP, propagar, recalcular_nodos
+from api.series import sincronizar
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula los agregados (hijos, trimestres y año a la fecha) de todos "
+        "los indicadores y reconstruye los resúmenes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Filas por sentencia de bulk_update (por defecto 500)",
+        )
+        parser.add_argument(
+            "--indicador", type=int,
+            help="Solo el subárbol de este indicador (leído de la BD) y sus ancestros",
+        )
+
+    def handle(self, *args, **options):
+        if options["indicador"] is not None:
+            return self._subarbol(options["indicador"], options["batch_size"])
+
+        hijos_de = jerarquia.indice().mapa_hijos()
+        cargados = Indicador.objects.only(
+            "id", "metodo_q", "anio", *CAMPOS_ROLLUP
+        ).in_bulk()
+
+        actualizados = recalcular_nodos(cargados.keys(), hijos_de, cargados)
+        ahora = timezone.now()
+        for indicador in actualizados:
+            indicador.actualizado_en = ahora
+
+        with transaction.atomic():
+            Indicador.objects.bulk_update(
+                actualizados, CAMPOS_ROLLUP, batch_size=options["batch_size"]
+            )
+            sincronizar(actualizados, batch_size=options["batch_size"])
+            resumenes.reconstruir(batch_size=options["batch_size"])
+        cache.invalidar(*cache.MODELOS)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(actualizados)} indicadores recalculados"
+        ))
+
+    def _subarbol(self, indicador_id, batch_size):
+        if not Indicador.objects.filter(pk=indicador_id).exists():
+            raise CommandError(f"No existe el indicador {indicador_id}")
+
+        actualizados = Indicador.objects.rollup_subarbol(indicador_id)
+        ahora = timezone.now()
+        for indicador in actualizados:
+            indicador.actualizado_en = ahora
+
+        with transaction.atomic():
+            Indicador.objects.bulk_update(actualizados, CAMPOS_ROLLUP, batch_size=batch_size)
+            sincronizar(actualizados, batch_size=batch_size)
+            propagados = propagar([indicador_id])
+            resumenes.actualizar([i.pk for i in actualizados] + propagados)
+        cache.invalidar(*cache.MODELOS)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(actualizados)} indicadores del subárbol y "
+            f"{len(propagados)} ancestros recalculados"
+        ))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importacion import leer_filas
+from api.preregistro import registrar_usuarios
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea los usuarios de muchos códigos de registro desde un CSV o XLSX "
+        "(codigo, username, password); las contraseñas se hashean en paralelo"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo", help="Ruta del archivo .csv o .xlsx")
+        parser.add_argument(
+            "--procesos", type=int, default=None,
+            help="Procesos para hashear contraseñas (por defecto, uno por CPU)",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Filas por sentencia de bulk_create (por defecto 1000)",
+        )
+
+    def handle(self, *args, **options):
+        ruta = options["archivo"]
+        try:
+            with open(ruta, "rb") as archivo:
+                resumen = registrar_usuarios(
+                    leer_filas(archivo, ruta), options["procesos"], max(options["batch_size"], 1)
+                )
+        except OSError as e:
+            raise CommandError(f"No se pudo leer {ruta}: {e}")
+
+        for error in resumen["errores"]:
+            self.stdout.write(self.style.WARNING(f"⚠ Fila {error['fila']}: {error['errores']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {resumen['registrados']} usuarios registrados, "
+            f"{resumen['total_errores']} errores"
+        ))
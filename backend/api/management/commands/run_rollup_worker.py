@@ -0,0 +1,81 @@
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from api.diferido import drenar, procesar_lote
+
+
+class Command(BaseCommand):
+    help = (
+        "Procesa la cola de rollup diferido (ROLLUP_DIFERIDO): recalcula "
+        "ancestros, serie y resúmenes de los indicadores pendientes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hilos", type=int, default=1,
+            help="Hilos que procesan la cola en paralelo (por defecto 1)",
+        )
+        parser.add_argument(
+            "--lote", type=int, default=500,
+            help="Indicadores pendientes por lote (por defecto 500)",
+        )
+        parser.add_argument(
+            "--intervalo", type=float, default=1.0,
+            help="Segundos de espera cuando la cola está vacía (por defecto 1)",
+        )
+        parser.add_argument(
+            "--una-vez", action="store_true",
+            help="Vacía la cola y termina",
+        )
+
+    def handle(self, *args, **options):
+        lote = max(options["lote"], 1)
+
+        if options["una_vez"] and options["hilos"] <= 1:
+            total = drenar(lote)
+            self.stdout.write(self.style.SUCCESS(f"✅ {total} indicadores procesados"))
+            return
+
+        hilos = max(options["hilos"], 1)
+        if hilos > 1 and not connection.features.has_select_for_update_skip_locked:
+            self.stdout.write(self.style.WARNING(
+                "⚠ La base de datos no soporta SKIP LOCKED: se usa un solo hilo"
+            ))
+            hilos = 1
+
+        parar = threading.Event()
+        totales = [0] * hilos
+
+        def trabajar(numero):
+            try:
+                while not parar.is_set():
+                    procesados = procesar_lote(lote)
+                    totales[numero] += procesados
+                    if not procesados:
+                        if options["una_vez"]:
+                            return
+                        parar.wait(options["intervalo"])
+            finally:
+                connections.close_all()
+
+        self.stdout.write(f"Worker de rollup con {hilos} hilo(s)")
+        trabajadores = [
+            threading.Thread(target=trabajar, args=(k,), daemon=True)
+            for k in range(hilos)
+        ]
+        for t in trabajadores:
+            t.start()
+        try:
+            for t in trabajadores:
+                while t.is_alive():
+                    t.join(0.5)
+        except KeyboardInterrupt:
+            parar.set()
+            for t in trabajadores:
+                t.join()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {sum(totales)} indicadores procesados"
+        ))
@@ -0,0 +1,132 @@
+"""
+Operaciones masivas sobre indicadores.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import cache, jerarquia, resumenes
+from .agregacion import CAMPOS_MES
+from .diferido import encolar
+from .models import Indicador
+from .rollup import propagar
+from .serializers import IndicadorSerializer
+
+# Campos que no se pueden tocar con un parche masivo
+CAMPOS_NO_EDITABLES = {
+    "id", "categorias", "categorias_detalle", "hijos", "padres",
+    "creado_en", "actualizado_en",
+}
+
+# Cambios que obligan a recalcular trimestres, año a la fecha y ancestros
+CAMPOS_RECALCULO = set(CAMPOS_MES) | {"metodo_q"}
+
+
+def _error(indice, errores, pk=None):
+    error = {"indice": indice, "errores": errores}
+    if pk is not None:
+        error["id"] = pk
+    return error
+
+
+def aplicar_parches(parches):
+    """
+    Aplica una lista de parches ``{"id": …, campo: valor, …}``.
+
+    Todas las filas se validan en una pasada con los campos de
+    ``IndicadorSerializer``; las válidas se guardan con un solo
+    ``bulk_update`` y los rollups se recalculan una vez para la unión de
+    sus ancestros. Las filas con errores se informan sin afectar al resto.
+    Con ``ROLLUP_DIFERIDO`` los recálculos se encolan para el worker (y
+    ``recalculados`` queda vacío).
+
+    Devuelve ``(actualizados, recalculados, errores)``.
+    """
+    campos = IndicadorSerializer().fields
+    errores = []
+
+    ids = set()
+    for parche in parches:
+        if isinstance(parche, dict):
+            try:
+                ids.add(int(parche.get("id")))
+            except (TypeError, ValueError):
+                pass
+    existentes = Indicador.objects.in_bulk(ids)
+
+    cambios = {}  # id -> {campo: valor}
+    for indice, parche in enumerate(parches):
+        if not isinstance(parche, dict):
+            errores.append(_error(indice, {"non_field_errors": ["Se esperaba un objeto"]}))
+            continue
+
+        try:
+            pk = int(parche.get("id"))
+        except (TypeError, ValueError):
+            errores.append(_error(indice, {"id": ["Debe indicar un id válido"]}))
+            continue
+        if pk not in existentes:
+            errores.append(_error(indice, {"id": ["Indicador no encontrado"]}, pk))
+            continue
+
+        errores_fila = {}
+        valores = {}
+        for nombre, valor in parche.items():
+            if nombre == "id":
+                continue
+            campo = campos.get(nombre)
+            if campo is None or campo.read_only or nombre in CAMPOS_NO_EDITABLES:
+                errores_fila[nombre] = ["Campo no editable en carga masiva"]
+                continue
+            try:
+                valores[campo.source] = campo.run_validation(valor)
+            except serializers.ValidationError as exc:
+                errores_fila[nombre] = exc.detail
+
+        if errores_fila:
+            errores.append(_error(indice, errores_fila, pk))
+            continue
+        cambios.setdefault(pk, {}).update(valores)
+
+    if not cambios:
+        return [], [], errores
+
+    ahora = timezone.now()
+    campos_escritos = set()
+    instancias = []
+    duenos_anteriores = set()
+    for pk, valores in cambios.items():
+        indicador = existentes[pk]
+        duenos_anteriores.add(indicador.dueno)
+        for campo, valor in valores.items():
+            setattr(indicador, campo, valor)
+        indicador.actualizado_en = ahora
+        campos_escritos.update(valores)
+        instancias.append(indicador)
+
+    # Se recalculan las filas con meses / método cambiados y las que tienen
+    # hijos (su save() normal también las re-agregaría)
+    indice = jerarquia.indice()
+    a_recalcular = [
+        pk for pk, valores in cambios.items()
+        if CAMPOS_RECALCULO & set(valores) or indice.hijos(pk)
+    ]
+
+    with transaction.atomic():
+        Indicador.objects.bulk_update(
+            instancias, sorted(campos_escritos) + ["actualizado_en"]
+        )
+        if settings.ROLLUP_DIFERIDO:
+            # Como Indicador.save: el worker recalcula las filas, sus
+            # ancestros y sus resúmenes
+            encolar(a_recalcular)
+            recalculados = []
+            resumenes.actualizar(set(cambios) - set(a_recalcular))
+            resumenes.actualizar_alcances(duenos=duenos_anteriores)
+        else:
+            recalculados = propagar(a_recalcular, incluir_modificados=True)
+            resumenes.actualizar(set(cambios) | set(recalculados), duenos=duenos_anteriores)
+    cache.invalidar("indicador")
+
+    return sorted(cambios), sorted(recalculados), errores
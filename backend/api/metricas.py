@@ -0,0 +1,318 @@
+"""
+Métricas por request: consultas SQL, tiempo en BD, tiempo de
+serialización, tiempo total y bytes de respuesta.
+
+- ``MetricasMiddleware`` mide cada request y agrega el header
+  ``Server-Timing``.
+- ``MetricasMixin`` (en los ViewSets de ``views.py``) nombra la ruta como
+  ``<basename>.<acción>`` y mide la serialización.
+- ``vista_metricas`` expone los histogramas por ruta y método en formato
+  Prometheus (``/metrics``). Son del proceso: con varios workers, cada uno
+  publica los suyos.
+- Los requests más lentos que ``METRICAS_LENTO_MS`` se registran en el log
+  ``api.metricas`` con sus consultas más costosas.
+"""
+import heapq
+import hmac
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger("api.metricas")
+
+# Consultas más lentas que se guardan por request para el log de lentos
+MAX_SQL_MUESTRA = 10
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+BUCKETS_BYTES = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+# nombre -> (descripción, buckets)
+METRICAS = {
+    "api_request_duration_seconds": ("Duración total del request", BUCKETS_SEGUNDOS),
+    "api_db_queries": ("Consultas SQL por request", BUCKETS_CONSULTAS),
+    "api_db_duration_seconds": ("Tiempo en la base de datos por request", BUCKETS_SEGUNDOS),
+    "api_serialization_duration_seconds": ("Tiempo de serialización (sin BD) por request", BUCKETS_SEGUNDOS),
+    "api_response_bytes": ("Tamaño de la respuesta", BUCKETS_BYTES),
+}
+
+_medicion = ContextVar("medicion", default=None)
+
+
+class Medicion:
+    """Datos de un request en curso."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.ruta = None
+        self.consultas = 0
+        self.tiempo_bd = 0.0
+        self.tiempo_serializacion = 0.0
+        self._sql = []  # heap (duración, sql) de las consultas más lentas
+        # Las vistas async consultan desde varios hilos a la vez
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper de Django: se llama en cada consulta
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            with self._lock:
+                self.consultas += 1
+                self.tiempo_bd += duracion
+                entrada = (duracion, sql)
+                if len(self._sql) < MAX_SQL_MUESTRA:
+                    heapq.heappush(self._sql, entrada)
+                elif duracion > self._sql[0][0]:
+                    heapq.heapreplace(self._sql, entrada)
+
+    def consultas_lentas(self):
+        with self._lock:
+            return sorted(self._sql, reverse=True)
+
+
+def medicion_actual():
+    return _medicion.get()
+
+
+def _medir_consulta(execute, sql, params, many, context):
+    medicion = _medicion.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    return medicion(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def _instalar_medicion(sender, connection, **kwargs):
+    # Un execute_wrapper fijo por conexión que mide para el request del
+    # contexto actual. Así se cuentan también las consultas de los hilos
+    # de sync_to_async (vistas sync bajo ASGI, consultas de vistas async),
+    # que heredan el contexto del request
+    if _medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir_consulta)
+
+
+# ============================================================
+#   R E G I S T R O   ( H I S T O G R A M A S )
+# ============================================================
+class Histograma:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.conteos = [0] * len(buckets)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.suma += valor
+        self.total += 1
+        for k, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.conteos[k] += 1
+                break
+
+
+class Registro:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}  # (métrica, ruta, método) -> Histograma
+
+    def observar(self, ruta, metodo, valores):
+        with self._lock:
+            for nombre, valor in valores.items():
+                clave = (nombre, ruta, metodo)
+                if clave not in self._series:
+                    self._series[clave] = Histograma(METRICAS[nombre][1])
+                self._series[clave].observar(valor)
+
+    def exponer(self):
+        """Texto en el formato de exposición de Prometheus."""
+        with self._lock:
+            series = sorted(self._series.items())
+            lineas = []
+            for nombre, (descripcion, _) in METRICAS.items():
+                lineas += [f"# HELP {nombre} {descripcion}", f"# TYPE {nombre} histogram"]
+                for (metrica, ruta, metodo), h in series:
+                    if metrica != nombre:
+                        continue
+                    etiquetas = f'route="{_escapar(ruta)}",method="{metodo}"'
+                    acumulado = 0
+                    for limite, conteo in zip(h.buckets, h.conteos):
+                        acumulado += conteo
+                        lineas.append(f'{nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+                    lineas.append(f'{nombre}_bucket{{{etiquetas},le="+Inf"}} {h.total}')
+                    lineas.append(f"{nombre}_sum{{{etiquetas}}} {h.suma}")
+                    lineas.append(f"{nombre}_count{{{etiquetas}}} {h.total}")
+        return "\n".join(lineas) + "\n"
+
+    def reiniciar(self):
+        with self._lock:
+            self._series.clear()
+
+
+def _escapar(valor):
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registro = Registro()
+
+
+# ============================================================
+#   M I D D L E W A R E
+# ============================================================
+class MetricasMiddleware:
+    """
+    Funciona en WSGI y en ASGI (sync y async). Las consultas se miden con
+    ``_medir_consulta`` en el hilo que sea.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.METRICAS or request.path == "/metrics":
+            return self.get_response(request)
+
+        medicion = Medicion()
+        token = _medicion.set(medicion)
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        return self._registrar(request, response, medicion)
+
+    async def __acall__(self, request):
+        if not settings.METRICAS or request.path == "/metrics":
+            return await self.get_response(request)
+
+        medicion = Medicion()
+        token = _medicion.set(medicion)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        return self._registrar(request, response, medicion)
+
+    def _registrar(self, request, response, medicion):
+        total = time.perf_counter() - medicion.inicio
+        ruta = medicion.ruta or _ruta(request)
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={medicion.tiempo_bd * 1000:.1f};desc="{medicion.consultas} consultas"',
+            f"ser;dur={medicion.tiempo_serializacion * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ])
+
+        registro.observar(ruta, request.method, {
+            "api_request_duration_seconds": total,
+            "api_db_queries": medicion.consultas,
+            "api_db_duration_seconds": medicion.tiempo_bd,
+            "api_serialization_duration_seconds": medicion.tiempo_serializacion,
+            "api_response_bytes": _bytes(response),
+        })
+
+        if total * 1000 >= settings.METRICAS_LENTO_MS:
+            self._registrar_lento(request, ruta, total, medicion)
+        return response
+
+    @staticmethod
+    def _registrar_lento(request, ruta, total, medicion):
+        detalle = "\n".join(
+            f"  {duracion * 1000:.1f} ms: {sql[:500]}"
+            for duracion, sql in medicion.consultas_lentas()
+        )
+        logger.warning(
+            "Request lento %s %s (%s): %.1f ms, %d consultas, %.1f ms en BD\n%s",
+            request.method, request.get_full_path(), ruta, total * 1000,
+            medicion.consultas, medicion.tiempo_bd * 1000, detalle,
+        )
+
+
+def _ruta(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "sin_ruta"
+    return match.view_name or match.route or "sin_ruta"
+
+
+def _bytes(response):
+    if response.streaming:
+        return int(response.get("Content-Length") or 0)
+    return len(response.content)
+
+
+# ============================================================
+#   D R F
+# ============================================================
+class MetricasMixin:
+    """
+    Nombra la ruta del request como ``<basename>.<acción>`` y mide el
+    tiempo de serialización (descontando las consultas que ocurren dentro,
+    que ya cuentan como tiempo de BD).
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        medicion = medicion_actual()
+        if medicion is not None:
+            nombre = getattr(self, "basename", None) or type(self).__name__
+            accion = getattr(self, "action", None) or request.method.lower()
+            medicion.ruta = f"{nombre}.{accion}"
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        medicion = medicion_actual()
+        if medicion is not None:
+            serializer.to_representation = _medir(serializer.to_representation, medicion)
+        return serializer
+
+
+def _medir(funcion, medicion):
+    def medida(*args, **kwargs):
+        inicio, bd = time.perf_counter(), medicion.tiempo_bd
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            duracion = time.perf_counter() - inicio
+            medicion.tiempo_serializacion += max(duracion - (medicion.tiempo_bd - bd), 0.0)
+    return medida
+
+
+# ============================================================
+#   E N D P O I N T
+# ============================================================
+def _autorizado(request):
+    token = settings.METRICAS_TOKEN
+    if token:
+        enviado = request.headers.get("Authorization", "")
+        if hmac.compare_digest(enviado.encode(), f"Bearer {token}".encode()):
+            return True
+    # Sin token (o con otro) solo un usuario staff con sesión (admin)
+    user = getattr(request, "user", None)
+    return bool(user and user.is_active and user.is_staff)
+
+
+def vista_metricas(request):
+    """
+    ``/metrics`` en texto Prometheus. Exige ``Authorization: Bearer
+    <METRICAS_TOKEN>`` (``authorization`` del scrape config) o una sesión
+    de staff; sin ``METRICAS_TOKEN`` solo la sesión.
+    """
+    if not _autorizado(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registro.exponer(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,37 @@
+"""
+Middleware de archivos estáticos que no bloquea el camino async (ASGI).
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class WhiteNoiseAsyncMiddleware(WhiteNoiseMiddleware):
+    """
+    ``WhiteNoiseMiddleware`` que también funciona async.
+
+    El de whitenoise es solo sync: bajo ASGI, Django adapta todo lo que
+    queda debajo (incluidas las vistas async) a un único hilo por proceso
+    y los requests se atienden de a uno. Aquí solo se sirve el archivo
+    estático en un hilo; el resto de los requests sigue async.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:50
+
+import django.db.models.deletion
+from datetime import date
+
+from django.db import migrations, models
+from django.utils import timezone
+
+MESES = ["ene", "feb", "mar", "abr", "may", "jun",
+         "jul", "ago", "sep", "oct", "nov", "dic"]
+
+
+def copiar_columnas(apps, schema_editor):
+    """
+    Copia ene_r … dic_o a IndicadorValor. Las columnas se asignan al año
+    de la última actualización de cada indicador.
+    """
+    Indicador = apps.get_model("api", "Indicador")
+    IndicadorValor = apps.get_model("api", "IndicadorValor")
+    campos = [f"{m}_{t}" for t in ("r", "o") for m in MESES]
+
+    lote = []
+    for fila in Indicador.objects.values("id", "actualizado_en", *campos).iterator(chunk_size=1000):
+        anio = (fila["actualizado_en"] or timezone.now()).year
+        for t in ("r", "o"):
+            for k, mes in enumerate(MESES):
+                lote.append(IndicadorValor(
+                    indicador_id=fila["id"],
+                    periodo=date(anio, k + 1, 1),
+                    tipo=t.upper(),
+                    valor=fila[f"{mes}_{t}"],
+                ))
+        if len(lote) >= 5000:
+            IndicadorValor.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        IndicadorValor.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_alter_indicador_n'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndicadorValor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.DateField()),
+                ('tipo', models.CharField(choices=[('R', 'Resultado'), ('O', 'Objetivo')], max_length=1)),
+                ('valor', models.FloatField(blank=True, null=True)),
+                ('indicador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='valores', to='api.indicador')),
+            ],
+            options={
+                'ordering': ['indicador', 'tipo', 'periodo'],
+                'indexes': [models.Index(fields=['periodo', 'tipo'], name='indicadorvalor_periodo_tipo')],
+                'constraints': [models.UniqueConstraint(fields=('indicador', 'tipo', 'periodo'), name='indicadorvalor_indicador_tipo_periodo')],
+            },
+        ),
+        migrations.RunPython(copiar_columnas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_indicadorvalor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Resumen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alcance', models.CharField(choices=[('INDICADOR', 'Indicador'), ('CATEGORIA', 'Categoría'), ('BSC', 'BSC'), ('DUENO', 'Dueño')], max_length=10)),
+                ('alcance_id', models.CharField(max_length=255)),
+                ('periodo', models.CharField(choices=[('Q1', 'Trimestre 1'), ('Q2', 'Trimestre 2'), ('Q3', 'Trimestre 3'), ('Q4', 'Trimestre 4'), ('ANO', 'Año a la fecha')], max_length=3)),
+                ('resultado', models.FloatField(blank=True, null=True)),
+                ('objetivo', models.FloatField(blank=True, null=True)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('cumplen', models.PositiveIntegerField(default=0)),
+                ('no_cumplen', models.PositiveIntegerField(default=0)),
+                ('sin_datos', models.PositiveIntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('indicador', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes', to='api.indicador')),
+            ],
+            options={
+                'ordering': ['alcance', 'alcance_id', 'periodo'],
+                'constraints': [models.UniqueConstraint(fields=('alcance', 'alcance_id', 'periodo'), name='resumen_alcance_periodo')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_resumen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('encolado_en', models.DateTimeField(db_index=True)),
+                ('indicador', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='rollup_pendiente', to='api.indicador')),
+            ],
+            options={
+                'ordering': ['encolado_en'],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:11
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def iniciar_secuencia(apps, schema_editor):
+    """El siguiente n sigue al último id (o al mayor n numérico), como antes."""
+    Indicador = apps.get_model("api", "Indicador")
+    Secuencia = apps.get_model("api", "Secuencia")
+    ultimo_id = Indicador.objects.aggregate(m=Max("id"))["m"] or 0
+    numericos = (
+        int(n) for n in Indicador.objects.exclude(n=None).values_list("n", flat=True).iterator()
+        if n.isdigit()
+    )
+    Secuencia.objects.create(nombre="indicador_n", valor=max(ultimo_id, max(numericos, default=0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_rolluppendiente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Secuencia',
+            fields=[
+                ('nombre', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(iniciar_secuencia, migrations.RunPython.noop),
+    ]
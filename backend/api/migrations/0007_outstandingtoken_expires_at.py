@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Índice en ``token_blacklist_outstandingtoken.expires_at`` para
+    ``flushexpiredtokens`` (el modelo es de simplejwt). ``jti`` y
+    ``BlacklistedToken.token`` ya son únicos: comprobar y poner un token en
+    la lista negra al rotar son búsquedas por índice.
+    """
+
+    dependencies = [
+        ("api", "0006_secuencia"),
+        ("token_blacklist", "0013_alter_blacklistedtoken_options_and_more"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX IF NOT EXISTS api_outstandingtoken_expires_at "
+            "ON token_blacklist_outstandingtoken (expires_at)",
+            "DROP INDEX IF EXISTS api_outstandingtoken_expires_at",
+        ),
+    ]
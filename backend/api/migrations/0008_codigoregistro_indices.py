@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_outstandingtoken_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='codigoregistro',
+            index=models.Index(fields=['usado', 'expira_en'], name='codigo_usado_expira'),
+        ),
+        migrations.AddIndex(
+            model_name='codigoregistro',
+            index=models.Index(condition=models.Q(('usado', False)), fields=['expira_en'], name='codigo_sin_usar_expira'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:28
+
+import api.models
+from django.db import migrations, models
+from django.db.models import Max
+from django.db.models.functions import ExtractYear
+
+
+def anio_de_la_serie(apps, schema_editor):
+    """Las columnas son las del último año replicado en IndicadorValor."""
+    Indicador = apps.get_model("api", "Indicador")
+    IndicadorValor = apps.get_model("api", "IndicadorValor")
+    ultimos = (
+        IndicadorValor.objects.values("indicador_id")
+        .annotate(anio=Max(ExtractYear("periodo")))
+        .values_list("indicador_id", "anio")
+    )
+    por_anio = {}
+    for indicador_id, anio in ultimos.iterator():
+        por_anio.setdefault(anio, []).append(indicador_id)
+    for anio, ids in por_anio.items():
+        for inicio in range(0, len(ids), 1000):
+            Indicador.objects.filter(id__in=ids[inicio:inicio + 1000]).update(anio=anio)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_codigoregistro_indices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='indicador',
+            name='anio',
+            field=models.PositiveSmallIntegerField(default=api.models.anio_actual),
+        ),
+        migrations.RunPython(anio_de_la_serie, migrations.RunPython.noop),
+    ]
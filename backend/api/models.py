@@ -1,6 +1,9 @@
-from django.db import models
+from django.conf import settings
+from django.db import connections, models, transaction
 from django.contrib.auth.models import User
 import uuid
+from collections import Counter
+from contextvars import ContextVar
 from django.utils import timezone
 from datetime import timedelta
 
@@ -13,6 +16,54 @@ class Categoria(models.Model):
         return self.nombre
 
 
+class IndicadorQuerySet(models.QuerySet):
+    """
+    Jerarquía ``IndicadorRel`` consultada en la BD con una CTE recursiva:
+    una sola consulta sea cual sea la profundidad (ver
+    ``jerarquia.sql_alcanzables``).
+    """
+
+    def _alcanzables(self, direccion, indicador_id, excluir_rel=None):
+        from . import jerarquia
+
+        return jerarquia.alcanzables(connections[self.db], direccion, indicador_id, excluir_rel)
+
+    def descendientes_de(self, indicador_id, excluir_rel=None):
+        """Todos los descendientes (sin incluir a ``indicador_id``)."""
+        return self.filter(id__in=self._alcanzables("descendientes", indicador_id, excluir_rel))
+
+    def ancestros_de(self, indicador_id):
+        """Todos los ancestros (sin incluir a ``indicador_id``)."""
+        return self.filter(id__in=self._alcanzables("ancestros", indicador_id))
+
+    def rollup_subarbol(self, indicador_id):
+        """
+        Recalcula en memoria (sin guardar) el subárbol de ``indicador_id``
+        con los valores de la BD: hojas con sus meses y cada nodo con el
+        agregado de sus hijos. Dos consultas: las relaciones del subárbol
+        y sus indicadores. Devuelve las instancias recalculadas.
+        """
+        from .rollup import CAMPOS_ROLLUP, recalcular_nodos
+
+        relaciones = IndicadorRel.objects.using(self.db).filter(
+            models.Q(indicador_padre_id=indicador_id)
+            | models.Q(indicador_padre_id__in=self._alcanzables("descendientes", indicador_id))
+        )
+        hijos_de = {}
+        for padre, hijo in relaciones.order_by("id").values_list(
+            "indicador_padre_id", "indicador_hijo_id"
+        ):
+            hijos_de.setdefault(padre, []).append(hijo)
+
+        nodos = {indicador_id, *(h for hijos in hijos_de.values() for h in hijos)}
+        cargados = self.only("id", "metodo_q", "anio", *CAMPOS_ROLLUP).in_bulk(nodos)
+        return recalcular_nodos(nodos, hijos_de, cargados)
+
+
+def anio_actual():
+    return timezone.localdate().year
+
+
 class Indicador(models.Model):
     CONDICION_CHOICES = [
         ("MAYOR", "Mayor"),
@@ -37,6 +88,10 @@ class Indicador(models.Model):
     
     metodo_q = models.CharField(max_length=10, choices=METODO_Q_CHOICES, default="PROMEDIO", blank=True, null=True)
 
+    # Año al que corresponden ene_r … q4_o (ver series.py); cambia solo con
+    # `manage.py abrir_anio`
+    anio = models.PositiveSmallIntegerField(default=anio_actual)
+
     # 🔹 Un indicador puede tener muchas categorías
     categorias = models.ManyToManyField("Categoria", related_name="indicadores", blank=True)
 
@@ -82,109 +137,100 @@ class Indicador(models.Model):
     creado_en = models.DateTimeField(auto_now_add=True)
     actualizado_en = models.DateTimeField(auto_now=True)
 
+    objects = IndicadorQuerySet.as_manager()
+
     class Meta:
         ordering = ["id"]
 
     def __str__(self):
         return self.indicador or f"Indicador {self.id}"
 
-    def save(self, *args, **kwargs):
-        meses = ["ene", "feb", "mar", "abr", "may", "jun",
-                "jul", "ago", "sep", "oct", "nov", "dic"]
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valores tal como vienen de la BD: evitan releer la fila en save()
+        instance._valores_cargados = dict(zip(field_names, values))
+        return instance
 
-        # ==========================================================
-        # 1️⃣ PRE-SAVE: Solo lógica que NO dependa de relaciones
-        # ==========================================================
+    def _valores_originales(self, campos):
+        cargados = getattr(self, "_valores_cargados", {})
+        if all(c in cargados for c in campos):
+            return cargados
+        return Indicador.objects.filter(pk=self.pk).values(*campos).first()
+
+    def save(self, *args, **kwargs):
+        from .agregacion import CAMPOS_MES, aplicar_hijos, recalcular
+        from . import resumenes
+        from .diferido import encolar
+        from .rollup import propagar
+        from .secuencias import asignar_codigos
+        from .series import sincronizar
 
         # Autogenerar N
         if not self.n:
-            ultimo = Indicador.objects.order_by("-id").first()
-            numero = (ultimo.id + 1) if ultimo else 1
-            self.n = f"{numero}"
+            asignar_codigos([self])
 
         # Determinar si recalcula Q
-        recalc_needed = False
-        if self.pk:
-            old = Indicador.objects.filter(pk=self.pk).first()
-            for m in meses:
-                for t in ["r", "o"]:
-                    if getattr(old, f"{m}_{t}") != getattr(self, f"{m}_{t}"):
-                        recalc_needed = True
-                        break
-                if recalc_needed:
-                    break
-            if old.metodo_q != self.metodo_q:
-                recalc_needed = True
-        else:
-            recalc_needed = True  # Nuevo
-
-        # Si ya sabe que recalculará Qs, NO accede a hijos aún.
-
-        # ==========================================================
-        # ➡️ PRIMER GUARDADO (crea PK)
-        # ==========================================================
         is_new = self.pk is None
-        super().save(force_insert=is_new, force_update=not is_new)
-
-        # ==========================================================
-        # 2️⃣ POST-SAVE: Aquí SÍ se puede acceder a hijos / padres
-        # ==========================================================
+        recalc_needed = True  # Nuevo
+        dueno_anterior = None
+        if not is_new:
+            old = self._valores_originales(CAMPOS_MES + ["metodo_q", "dueno"])
+            if old is not None:
+                dueno_anterior = old["dueno"]
+                recalc_needed = any(
+                    old[campo] != getattr(self, campo)
+                    for campo in CAMPOS_MES + ["metodo_q"]
+                )
 
         # --- Agregar valores agregados de hijos ---
-        hijos = self.hijos.all()
-        if hijos.exists():
-            for m in meses:
-                for t in ["r", "o"]:
-                    valores_hijos = [
-                        getattr(rel.indicador_hijo, f"{m}_{t}")
-                        for rel in hijos
-                        if getattr(rel.indicador_hijo, f"{m}_{t}") is not None
-                    ]
-
-                    if valores_hijos:
-                        if self.metodo_q == "PROMEDIO":
-                            setattr(self, f"{m}_{t}", sum(valores_hijos) / len(valores_hijos))
-                        else:
-                            setattr(self, f"{m}_{t}", sum(valores_hijos))
-                    else:
-                        setattr(self, f"{m}_{t}", None)
-
-            recalc_needed = True
-
-        # --- Recalcular Qs ---
-        if recalc_needed:
-            def calcular_q(trimestre, tipo):
-                idxs = [(0,1,2), (3,4,5), (6,7,8), (9,10,11)][trimestre - 1]
-                valores = [getattr(self, f"{meses[i]}_{tipo}") for i in idxs if getattr(self, f"{meses[i]}_{tipo}") is not None]
-                if not valores:
-                    return None
-                return sum(valores)/len(valores) if self.metodo_q == "PROMEDIO" else sum(valores)
-
-            for t in range(1, 5):
-                setattr(self, f"q{t}_r", calcular_q(t, "r"))
-                setattr(self, f"q{t}_o", calcular_q(t, "o"))
-
-        # --- Año a la fecha ---
-        valores_r = [getattr(self, f"{m}_r") for m in meses if getattr(self, f"{m}_r") is not None]
-        if valores_r:
-            if self.metodo_q == "PROMEDIO":
-                self.ano_a_la_fecha = round(sum(valores_r) / len(valores_r), 2)
-            else:
-                self.ano_a_la_fecha = round(sum(valores_r), 2)
-        else:
-            self.ano_a_la_fecha = None
+        diferido = settings.ROLLUP_DIFERIDO
+        if not is_new and not diferido:
+            hijos = [
+                rel.indicador_hijo
+                for rel in self.hijos.select_related("indicador_hijo").order_by("id")
+            ]
+            if hijos:
+                aplicar_hijos(self, hijos)
+                recalc_needed = True
+
+        # --- Recalcular Qs y año a la fecha ---
+        recalcular([self], trimestres=recalc_needed)
 
         # ==========================================================
-        # ➡️ SEGUNDO GUARDADO (para actualizar valores agregados)
+        # ➡️ Un solo guardado y propagación en bloque a los ancestros
         # ==========================================================
-        super().save(force_update=True)
-
-        # --- Propagar cambios a padres ---
-        padres = self.padres.all()
-        for rel in padres:
-            padre = rel.indicador_padre
-            padre.save()
-
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if diferido:
+                # Hijos, ancestros, serie y resúmenes quedan para el worker
+                encolar([self.pk])
+                if dueno_anterior and dueno_anterior != self.dueno:
+                    resumenes.actualizar_alcances(duenos=[dueno_anterior])
+            else:
+                sincronizar([self])
+                propagados = propagar([self.pk]) if not is_new else []
+                resumenes.actualizar([self.pk, *propagados], duenos=[dueno_anterior])
+
+        self._valores_cargados = {
+            campo: getattr(self, campo) for campo in CAMPOS_MES + ["metodo_q", "dueno"]
+        }
+
+
+class IndicadorRelQuerySet(models.QuerySet):
+    def crearia_ciclo(self, padre_id, hijo_id, excluir_rel=None):
+        """
+        True si la relación ``padre`` → ``hijo`` cerraría un ciclo según la
+        BD (una consulta recursiva). ``excluir_rel`` ignora una relación
+        existente (al editarla).
+        """
+        if padre_id == hijo_id:
+            return True
+        return (
+            Indicador.objects.using(self.db)
+            .descendientes_de(hijo_id, excluir_rel=excluir_rel)
+            .filter(id=padre_id).exists()
+        )
 
 
 class IndicadorRel(models.Model):
@@ -195,6 +241,8 @@ class IndicadorRel(models.Model):
         Indicador, related_name="padres", on_delete=models.CASCADE
     )
 
+    objects = IndicadorRelQuerySet.as_manager()
+
     class Meta:
         unique_together = ("indicador_padre", "indicador_hijo")
 
@@ -202,6 +250,71 @@ class IndicadorRel(models.Model):
         return f"{self.indicador_padre.indicador} → {self.indicador_hijo.indicador}"
 
 
+class RollupPendiente(models.Model):
+    """
+    Indicador con rollup pendiente (modo ``ROLLUP_DIFERIDO``): falta
+    recalcular su agregado de hijos, sus ancestros, su serie y sus
+    resúmenes. Una fila por indicador; volver a encolarlo actualiza
+    ``encolado_en``.
+    """
+    indicador = models.OneToOneField(
+        Indicador, related_name="rollup_pendiente", on_delete=models.CASCADE
+    )
+    encolado_en = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ["encolado_en"]
+
+    def __str__(self):
+        return f"{self.indicador_id} ({self.encolado_en:%Y-%m-%d %H:%M:%S})"
+
+
+class Secuencia(models.Model):
+    """
+    Contador con nombre para códigos correlativos (ver ``secuencias.py``).
+    ``valor`` es el último valor entregado.
+    """
+    nombre = models.CharField(max_length=50, primary_key=True)
+    valor = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.nombre}: {self.valor}"
+
+
+class IndicadorValor(models.Model):
+    """
+    Valor mensual de un indicador (serie de varios años).
+    ``periodo`` es el primer día del mes.
+    """
+    TIPO_CHOICES = [
+        ("R", "Resultado"),
+        ("O", "Objetivo"),
+    ]
+
+    indicador = models.ForeignKey(
+        Indicador, related_name="valores", on_delete=models.CASCADE
+    )
+    periodo = models.DateField()
+    tipo = models.CharField(max_length=1, choices=TIPO_CHOICES)
+    valor = models.FloatField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["indicador", "tipo", "periodo"]
+        constraints = [
+            # También sirve de índice para los rangos por indicador / tipo / periodo
+            models.UniqueConstraint(
+                fields=["indicador", "tipo", "periodo"],
+                name="indicadorvalor_indicador_tipo_periodo",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["periodo", "tipo"], name="indicadorvalor_periodo_tipo"),
+        ]
+
+    def __str__(self):
+        return f"{self.indicador_id} {self.tipo} {self.periodo:%Y-%m}: {self.valor}"
+
+
 class BSC(models.Model):
     nombre = models.CharField(max_length=100)
 
@@ -215,9 +328,110 @@ class BSC(models.Model):
     def __str__(self):
         return self.nombre
 
+
+class Resumen(models.Model):
+    """
+    Resumen materializado de cumplimiento por alcance y periodo.
+
+    Las filas de alcance INDICADOR guardan R, O y el cumplimiento de un
+    indicador; las de CATEGORIA, BSC y DUENO agregan esas filas. Se
+    mantienen al día desde ``resumenes.py``.
+    """
+    INDICADOR = "INDICADOR"
+    CATEGORIA = "CATEGORIA"
+    BSC = "BSC"
+    DUENO = "DUENO"
+
+    ALCANCE_CHOICES = [
+        (INDICADOR, "Indicador"),
+        (CATEGORIA, "Categoría"),
+        (BSC, "BSC"),
+        (DUENO, "Dueño"),
+    ]
+
+    PERIODO_CHOICES = [
+        ("Q1", "Trimestre 1"),
+        ("Q2", "Trimestre 2"),
+        ("Q3", "Trimestre 3"),
+        ("Q4", "Trimestre 4"),
+        ("ANO", "Año a la fecha"),
+    ]
+
+    alcance = models.CharField(max_length=10, choices=ALCANCE_CHOICES)
+    # id del indicador / categoría / BSC, o el nombre del dueño
+    alcance_id = models.CharField(max_length=255)
+    periodo = models.CharField(max_length=3, choices=PERIODO_CHOICES)
+
+    # Solo en filas INDICADOR: permite agregar por SQL y se borra en cascada
+    indicador = models.ForeignKey(
+        Indicador, related_name="resumenes", on_delete=models.CASCADE,
+        blank=True, null=True,
+    )
+
+    resultado = models.FloatField(blank=True, null=True)
+    objetivo = models.FloatField(blank=True, null=True)
+    total = models.PositiveIntegerField(default=0)
+    cumplen = models.PositiveIntegerField(default=0)
+    no_cumplen = models.PositiveIntegerField(default=0)
+    sin_datos = models.PositiveIntegerField(default=0)
+
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["alcance", "alcance_id", "periodo"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["alcance", "alcance_id", "periodo"],
+                name="resumen_alcance_periodo",
+            ),
+        ]
+
+    @property
+    def porcentaje_cumplimiento(self):
+        con_datos = self.cumplen + self.no_cumplen
+        return round(100 * self.cumplen / con_datos, 2) if con_datos else None
+
+    def __str__(self):
+        return f"{self.alcance} {self.alcance_id} {self.periodo}"
+
 # ======================================================
 #   PERSONA (PRE-REGISTRO)
 # ======================================================
+# Mientras PersonaQuerySet.delete borra en bloque, el receptor post_delete
+# de Persona (signals.py) no borra los usuarios uno por uno
+borrando_personas_en_bloque = ContextVar("borrando_personas_en_bloque", default=False)
+
+
+class PersonaQuerySet(models.QuerySet):
+    def delete(self):
+        """
+        Como borrar cada persona con su usuario y perfil, pero con un DELETE
+        por tabla: los ``User`` y ``PerfilUsuario`` vinculados se borran por
+        sus ids, en la misma transacción que las personas.
+        """
+        with transaction.atomic(using=self.db):
+            user_ids = list(self.exclude(user=None).values_list("user_id", flat=True))
+            token = borrando_personas_en_bloque.set(True)
+            try:
+                total, por_modelo = super().delete()
+            finally:
+                borrando_personas_en_bloque.reset(token)
+
+            por_modelo = Counter(por_modelo)
+            if user_ids:
+                for queryset in (
+                    PerfilUsuario.objects.using(self.db).filter(user_id__in=user_ids),
+                    User.objects.using(self.db).filter(pk__in=user_ids),
+                ):
+                    borrados, detalle = queryset.delete()
+                    total += borrados
+                    por_modelo.update(detalle)
+        return total, dict(por_modelo)
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class Persona(models.Model):
     nombres = models.CharField(max_length=150)
     apellidos = models.CharField(max_length=150)
@@ -232,6 +446,8 @@ class Persona(models.Model):
 
     creado_en = models.DateTimeField(auto_now_add=True)
 
+    objects = PersonaQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.nombres} {self.apellidos}"
 
@@ -248,7 +464,21 @@ class PerfilUsuario(models.Model):
 # ======================================================
 #   CÓDIGO DE REGISTRO
 # ======================================================
+class CodigoRegistroQuerySet(models.QuerySet):
+    def vigentes(self, ahora=None):
+        """Los que ``es_valido`` aceptaría, filtrados en la BD."""
+        return self.filter(usado=False, expira_en__gte=ahora or timezone.now())
+
+    def purgables(self, ahora=None):
+        """Usados o vencidos: ya no sirven para registrarse."""
+        return self.filter(
+            models.Q(usado=True) | models.Q(expira_en__lt=ahora or timezone.now())
+        )
+
+
 class CodigoRegistro(models.Model):
+    VIGENCIA = timedelta(days=3)
+
     codigo = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
 
     persona = models.OneToOneField(
@@ -261,11 +491,24 @@ class CodigoRegistro(models.Model):
     creado_en = models.DateTimeField(auto_now_add=True)
     expira_en = models.DateTimeField()
 
+    objects = CodigoRegistroQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
         if not self.expira_en:
-            self.expira_en = timezone.now() + timedelta(days=3)
+            self.expira_en = timezone.now() + self.VIGENCIA
         super().save(*args, **kwargs)
 
+    class Meta:
+        indexes = [
+            # purge_codigos: usados o vencidos
+            models.Index(fields=["usado", "expira_en"], name="codigo_usado_expira"),
+            # Vencimientos de los códigos sin usar (los que quedan tras purgar)
+            models.Index(
+                fields=["expira_en"], condition=models.Q(usado=False),
+                name="codigo_sin_usar_expira",
+            ),
+        ]
+
     def es_valido(self):
         return not self.usado and timezone.now() <= self.expira_en
 
@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Paginación por cursor sobre ``id``.
+
+    Solo pagina si el cliente envía ``?page_size=``; sin él la respuesta
+    sigue siendo la lista completa que espera el frontend actual.
+    """
+    ordering = "id"
+    page_size = None
+    page_size_query_param = "page_size"
+    max_page_size = 1000
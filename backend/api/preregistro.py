@@ -0,0 +1,206 @@
+"""
+Pre-registro masivo de personas con sus códigos de registro.
+
+Las filas (``nombres``, ``apellidos``, ``email``) se validan una por una;
+las personas que ya existen se buscan con una sola consulta ``IN`` por
+email, las nuevas se insertan con ``bulk_create`` y los códigos de todas
+se crean o reemplazan en una sola sentencia (``INSERT … ON CONFLICT
+(persona) DO UPDATE``), igual que ``CodigoRegistroViewSet.create`` borra
+el código anterior antes de crear uno nuevo.
+
+Las personas que ya tienen usuario no reciben código.
+
+``registrar_usuarios`` es el paso siguiente: crea los usuarios de muchos
+códigos a la vez. Las contraseñas se hashean en un pool de procesos
+(``hashers.hashear_en_paralelo``) y los usuarios, perfiles y personas se
+guardan con sentencias masivas.
+"""
+import csv
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .hashers import hashear_en_paralelo
+from .models import CodigoRegistro, PerfilUsuario, Persona
+from .serializers import PersonaMasivaSerializer, RegistroMasivoSerializer
+
+COLUMNAS_SALIDA = ["email", "nombres", "apellidos", "codigo", "expira_en", "estado"]
+MAX_ERRORES = 1000
+
+
+def preregistrar(filas, batch_size=1000):
+    """
+    ``filas``: iterable de dicts. Devuelve el resumen con los códigos
+    generados (``estado`` ``nueva`` o ``existente``) y los errores por
+    fila (la 1 es la cabecera del archivo).
+    """
+    validas, errores, total_errores = {}, [], 0
+    for numero, datos in enumerate(filas, start=2):
+        serializer = PersonaMasivaSerializer(data={
+            campo: str(datos.get(campo) or "").strip() for campo in ("nombres", "apellidos", "email")
+        })
+        if not serializer.is_valid():
+            detalle = serializer.errors
+        elif serializer.validated_data["email"] in validas:
+            detalle = {"email": ["Email repetido en el archivo"]}
+        else:
+            validas[serializer.validated_data["email"]] = serializer.validated_data
+            continue
+        total_errores += 1
+        if len(errores) < MAX_ERRORES:
+            errores.append({"fila": numero, "errores": detalle})
+
+    with transaction.atomic():
+        existentes = {
+            p.email: p
+            for p in Persona.objects.filter(email__in=list(validas))
+            .only("id", "email", "nombres", "apellidos", "user_id")
+        }
+        nuevas = Persona.objects.bulk_create(
+            (Persona(**datos) for email, datos in validas.items() if email not in existentes),
+            batch_size=batch_size,
+        )
+
+        personas = [(p, "nueva") for p in nuevas] + [
+            (p, "existente") for p in existentes.values() if p.user_id is None
+        ]
+        expira_en = timezone.now() + CodigoRegistro.VIGENCIA
+        # bulk_create no llama a save(): expira_en se fija aquí
+        codigos = CodigoRegistro.objects.bulk_create(
+            [CodigoRegistro(persona=p, expira_en=expira_en) for p, _ in personas],
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["persona"],
+            update_fields=["codigo", "usado", "creado_en", "expira_en"],
+        )
+
+    return {
+        "creadas": len(nuevas),
+        "existentes": len(existentes),
+        "con_usuario": sum(1 for p in existentes.values() if p.user_id is not None),
+        "codigos": [
+            {
+                "persona": persona.id,
+                "email": persona.email,
+                "nombres": persona.nombres,
+                "apellidos": persona.apellidos,
+                "codigo": str(codigo.codigo),
+                "expira_en": codigo.expira_en.isoformat(),
+                "estado": estado,
+            }
+            for (persona, estado), codigo in zip(personas, codigos)
+        ],
+        "errores": errores,
+        "total_errores": total_errores,
+    }
+
+
+def _error_codigo(codigo):
+    # Mismos mensajes que RegistroUsuarioSerializer.validate_codigo
+    if codigo is None:
+        return "Código inválido"
+    if not codigo.es_valido():
+        return "Código expirado o usado"
+    if codigo.persona.user_id is not None:
+        return "Esta persona ya tiene usuario"
+    return None
+
+
+def registrar_usuarios(filas, procesos=None, batch_size=1000):
+    """
+    ``filas``: iterable de dicts con ``codigo``, ``username`` y ``password``.
+    Como ``RegistroUsuarioSerializer.create`` para cada fila válida.
+    Devuelve los usuarios creados y los errores por fila.
+    """
+    validas, errores, total_errores = [], [], 0
+    codigos_vistos, usernames_vistos = set(), set()
+
+    def error(numero, detalle):
+        nonlocal total_errores
+        total_errores += 1
+        if len(errores) < MAX_ERRORES:
+            errores.append({"fila": numero, "errores": detalle})
+
+    for numero, datos in enumerate(filas, start=2):
+        serializer = RegistroMasivoSerializer(data={
+            campo: str(datos.get(campo) or "").strip() for campo in ("codigo", "username", "password")
+        })
+        if not serializer.is_valid():
+            error(numero, serializer.errors)
+        elif serializer.validated_data["codigo"] in codigos_vistos:
+            error(numero, {"codigo": ["Código repetido en el archivo"]})
+        elif serializer.validated_data["username"] in usernames_vistos:
+            error(numero, {"username": ["Usuario repetido en el archivo"]})
+        else:
+            codigos_vistos.add(serializer.validated_data["codigo"])
+            usernames_vistos.add(serializer.validated_data["username"])
+            validas.append((numero, serializer.validated_data))
+
+    codigos = {
+        c.codigo: c
+        for c in CodigoRegistro.objects.filter(codigo__in=codigos_vistos).select_related("persona")
+    }
+    ocupados = set(
+        User.objects.filter(username__in=usernames_vistos).values_list("username", flat=True)
+    )
+    filas_ok = []
+    for numero, datos in validas:
+        detalle = _error_codigo(codigos.get(datos["codigo"]))
+        if detalle:
+            error(numero, {"codigo": [detalle]})
+        elif datos["username"] in ocupados:
+            error(numero, {"username": ["Ya existe un usuario con ese nombre"]})
+        else:
+            filas_ok.append((numero, datos, codigos[datos["codigo"]]))
+
+    # Lo caro (CPU) va antes de la transacción y en varios procesos
+    hashes = hashear_en_paralelo([datos["password"] for _, datos, _ in filas_ok], procesos)
+
+    with transaction.atomic():
+        # Otro registro pudo usar los códigos mientras se hasheaba
+        libres = set(
+            CodigoRegistro.objects.select_for_update().vigentes()
+            .filter(pk__in=[c.pk for _, _, c in filas_ok], persona__user=None)
+            .values_list("pk", flat=True)
+        )
+        registros = []
+        for (numero, datos, codigo), password in zip(filas_ok, hashes):
+            if codigo.pk in libres:
+                registros.append((datos, codigo, password))
+            else:
+                error(numero, {"codigo": ["Código expirado o usado"]})
+
+        usuarios = User.objects.bulk_create(
+            [
+                User(username=datos["username"], email=codigo.persona.email, password=password)
+                for datos, codigo, password in registros
+            ],
+            batch_size=batch_size,
+        )
+        PerfilUsuario.objects.bulk_create(
+            [PerfilUsuario(user=user) for user in usuarios], batch_size=batch_size
+        )
+        personas = []
+        for (_, codigo, _), user in zip(registros, usuarios):
+            codigo.persona.user = user
+            personas.append(codigo.persona)
+        Persona.objects.bulk_update(personas, ["user"], batch_size=batch_size)
+        CodigoRegistro.objects.filter(pk__in=[c.pk for _, c, _ in registros]).update(usado=True)
+
+    return {
+        "registrados": len(usuarios),
+        "usuarios": [
+            {"persona": persona.id, "email": persona.email, "username": user.username}
+            for persona, user in zip(personas, usuarios)
+        ],
+        "errores": sorted(errores, key=lambda e: e["fila"]),
+        "total_errores": total_errores,
+    }
+
+
+def escribir_csv(codigos, archivo):
+    """Escribe los códigos de ``preregistrar`` en ``archivo`` (texto)."""
+    escritor = csv.DictWriter(archivo, fieldnames=COLUMNAS_SALIDA, extrasaction="ignore")
+    escritor.writeheader()
+    escritor.writerows(codigos)
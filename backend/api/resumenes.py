@@ -0,0 +1,220 @@
+"""
+Resúmenes materializados de cumplimiento (modelo ``Resumen``).
+
+Cada indicador tiene una fila INDICADOR por periodo (Q1 … Q4 y ANO) con
+su R, O y cumplimiento. Las filas de CATEGORIA, BSC y DUENO se obtienen
+agregando por SQL las filas INDICADOR de sus miembros, y solo se vuelven
+a calcular los alcances afectados por cada cambio:
+
+- ``Indicador.save`` y las cargas masivas llaman a ``actualizar``.
+- Los cambios de categorías (m2m) y los borrados llegan por ``signals.py``.
+- ``recalcular_indicadores`` reconstruye la tabla completa.
+"""
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .agregacion import CAMPOS_MES, CAMPOS_Q
+from .dashboard import CAMPOS_INDICADOR, cumple, evaluar
+from .models import BSC, Categoria, Indicador, Resumen
+
+PERIODOS = ["Q1", "Q2", "Q3", "Q4", "ANO"]
+
+# Columnas de Indicador necesarias para calcular sus filas
+CAMPOS_RESUMEN = list(dict.fromkeys([*CAMPOS_INDICADOR, *CAMPOS_MES, *CAMPOS_Q]))
+
+CAMPOS_ACTUALIZABLES = [
+    "indicador", "resultado", "objetivo",
+    "total", "cumplen", "no_cumplen", "sin_datos", "actualizado_en",
+]
+
+# Camino desde una fila INDICADOR hasta la clave de cada alcance agregado
+RUTAS = {
+    Resumen.CATEGORIA: "indicador__categorias",
+    Resumen.BSC: "indicador__categorias__bscs",
+    Resumen.DUENO: "indicador__dueno",
+}
+
+
+def _conteos(estado):
+    return {
+        "total": 1,
+        "cumplen": int(estado is True),
+        "no_cumplen": int(estado is False),
+        "sin_datos": int(estado is None),
+    }
+
+
+# ============================================================
+#   F I L A S   P O R   I N D I C A D O R
+# ============================================================
+def filas_indicador(indicadores):
+    """Filas INDICADOR de ``indicadores`` (con ``CAMPOS_RESUMEN`` cargados)."""
+    filas = []
+    for indicador, evaluado in zip(indicadores, evaluar(indicadores)):
+        pares = [
+            (getattr(indicador, f"q{q}_r"), getattr(indicador, f"q{q}_o"))
+            for q in range(1, 5)
+        ]
+        pares.append((evaluado["resultado"], evaluado["objetivo"]))
+        for periodo, (r, o) in zip(PERIODOS, pares):
+            filas.append(Resumen(
+                alcance=Resumen.INDICADOR,
+                alcance_id=str(indicador.pk),
+                periodo=periodo,
+                indicador_id=indicador.pk,
+                resultado=r,
+                objetivo=o,
+                **_conteos(cumple(r, o, indicador.condicion)),
+            ))
+    return filas
+
+
+def guardar(filas, batch_size=1000):
+    if not filas:
+        return
+    Resumen.objects.bulk_create(
+        filas,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["alcance", "alcance_id", "periodo"],
+        update_fields=CAMPOS_ACTUALIZABLES,
+    )
+
+
+# ============================================================
+#   A L C A N C E S   A G R E G A D O S
+# ============================================================
+def _agregar(alcance, claves=None):
+    """
+    Filas de ``alcance`` para ``claves`` (todas si es None). Las claves sin
+    miembros quedan con conteos en cero.
+    """
+    ruta = RUTAS[alcance]
+    qs = Resumen.objects.filter(alcance=Resumen.INDICADOR)
+    if claves is not None:
+        qs = qs.filter(**{f"{ruta}__in": claves})
+    if alcance == Resumen.DUENO:
+        qs = qs.exclude(indicador__dueno__isnull=True).exclude(indicador__dueno="")
+
+    # distinct: un indicador en dos categorías del mismo BSC cuenta una vez
+    conteo = lambda filtro=None: Count("indicador", distinct=True, filter=filtro)
+    agregados = (
+        qs.values(ruta, "periodo")
+        .annotate(
+            total=conteo(),
+            cumplen_=conteo(Q(cumplen=1)),
+            no_cumplen_=conteo(Q(no_cumplen=1)),
+            sin_datos_=conteo(Q(sin_datos=1)),
+        )
+        .order_by()
+    )
+
+    filas = {
+        (str(clave), periodo): Resumen(
+            alcance=alcance, alcance_id=str(clave), periodo=periodo
+        )
+        for clave in (claves or ())
+        for periodo in PERIODOS
+    }
+    for fila in agregados:
+        clave = (str(fila[ruta]), fila["periodo"])
+        resumen = filas.setdefault(clave, Resumen(
+            alcance=alcance, alcance_id=clave[0], periodo=clave[1]
+        ))
+        resumen.total = fila["total"]
+        resumen.cumplen = fila["cumplen_"]
+        resumen.no_cumplen = fila["no_cumplen_"]
+        resumen.sin_datos = fila["sin_datos_"]
+    return list(filas.values())
+
+
+def actualizar_alcances(categorias=(), bscs=(), duenos=()):
+    """
+    Recalcula las filas de ``categorias``, ``bscs`` y ``duenos``. Los BSC
+    que contienen alguna de las categorías también se recalculan.
+    """
+    categorias = set(categorias)
+    bscs = set(bscs)
+    if categorias:
+        bscs.update(BSC.categorias.through.objects.filter(
+            categoria_id__in=categorias
+        ).values_list("bsc_id", flat=True))
+    duenos = {d for d in duenos if d}
+
+    filas = []
+    for alcance, claves in (
+        (Resumen.CATEGORIA, categorias),
+        (Resumen.BSC, bscs),
+        (Resumen.DUENO, duenos),
+    ):
+        if claves:
+            filas += _agregar(alcance, claves)
+
+    # Un dueño sin indicadores deja de tener resumen
+    vacios = {f.alcance_id for f in filas if f.alcance == Resumen.DUENO and not f.total}
+    with transaction.atomic():
+        guardar([f for f in filas if not (f.alcance == Resumen.DUENO and not f.total)])
+        if vacios:
+            Resumen.objects.filter(alcance=Resumen.DUENO, alcance_id__in=vacios).delete()
+
+
+def alcances_de(ids):
+    """Categorías y dueños actuales de los indicadores ``ids``."""
+    return {
+        "categorias": set(Indicador.categorias.through.objects.filter(
+            indicador_id__in=ids
+        ).values_list("categoria_id", flat=True)),
+        "duenos": set(Indicador.objects.filter(
+            id__in=ids
+        ).values_list("dueno", flat=True)),
+    }
+
+
+# ============================================================
+#   E N T R A D A S
+# ============================================================
+def actualizar(ids, duenos=()):
+    """
+    Actualiza las filas de los indicadores ``ids`` y las de sus
+    categorías, BSC y dueños. ``duenos`` agrega dueños anteriores que
+    también deben recalcularse (p. ej. tras cambiar ``dueno``).
+    """
+    ids = set(ids)
+    if not ids:
+        return
+    indicadores = list(
+        Indicador.objects.filter(id__in=ids).only(*CAMPOS_RESUMEN).order_by("id")
+    )
+    categorias = Indicador.categorias.through.objects.filter(
+        indicador_id__in=ids
+    ).values_list("categoria_id", flat=True)
+
+    with transaction.atomic():
+        guardar(filas_indicador(indicadores))
+        actualizar_alcances(
+            categorias=categorias,
+            duenos={i.dueno for i in indicadores} | set(duenos),
+        )
+
+
+def reconstruir(batch_size=1000):
+    """Vuelve a generar todos los resúmenes desde los indicadores."""
+    with transaction.atomic():
+        Resumen.objects.all().delete()
+
+        lote = []
+        for indicador in Indicador.objects.only(*CAMPOS_RESUMEN).order_by("id").iterator(
+            chunk_size=batch_size
+        ):
+            lote.append(indicador)
+            if len(lote) >= batch_size:
+                guardar(filas_indicador(lote), batch_size)
+                lote = []
+        guardar(filas_indicador(lote), batch_size)
+
+        guardar(
+            _agregar(Resumen.CATEGORIA, list(Categoria.objects.values_list("id", flat=True)))
+            + _agregar(Resumen.BSC, list(BSC.objects.values_list("id", flat=True)))
+            + _agregar(Resumen.DUENO),
+            batch_size,
+        )
@@ -0,0 +1,152 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import cache, jerarquia
+from .models import Indicador
+from .series import sincronizar
+from .agregacion import (
+    CAMPOS_MES, CAMPOS_Q, agregar_hijos, asignar, mascara_promedio,
+    matriz_meses, recalcular,
+)
+
+# Campos que el rollup reescribe en cada ancestro
+CAMPOS_ROLLUP = CAMPOS_MES + CAMPOS_Q + ["ano_a_la_fecha", "actualizado_en"]
+
+
+def _niveles(nodos, hijos_de):
+    """
+    Agrupa ``nodos`` en niveles: cada nodo queda en un nivel posterior al
+    de todos sus hijos que también pertenecen a ``nodos``, de modo que los
+    nodos de un mismo nivel se pueden calcular juntos. Los nodos atrapados
+    en un ciclo se agregan al final, uno por nivel, para que cada uno se
+    calcule una sola vez.
+    """
+    pendientes = {
+        nodo: sum(1 for h in hijos_de.get(nodo, ()) if h in nodos)
+        for nodo in nodos
+    }
+    padres_de = defaultdict(list)
+    for nodo in nodos:
+        for h in hijos_de.get(nodo, ()):
+            if h in nodos:
+                padres_de[h].append(nodo)
+
+    niveles = []
+    nivel = sorted(n for n, c in pendientes.items() if c == 0)
+    while nivel:
+        niveles.append(nivel)
+        siguiente = []
+        for nodo in nivel:
+            for padre in padres_de[nodo]:
+                pendientes[padre] -= 1
+                if pendientes[padre] == 0:
+                    siguiente.append(padre)
+        nivel = sorted(siguiente)
+
+    vistos = {n for nivel in niveles for n in nivel}
+    niveles.extend([n] for n in sorted(nodos) if n not in vistos)
+    return niveles
+
+
+def recalcular_nodos(nodos, hijos_de, cargados):
+    """
+    Recalcula en memoria los ``nodos`` (ids) usando las instancias de
+    ``cargados`` ({id: Indicador}, que debe incluir a sus hijos).
+
+    Los nodos con hijos toman el agregado de sus hijos, nivel por nivel;
+    todos recalculan trimestres y año a la fecha. Devuelve las instancias
+    recalculadas.
+    """
+    ids = list(cargados)
+    fila = {pk: k for k, pk in enumerate(ids)}
+    instancias = [cargados[pk] for pk in ids]
+    matriz = matriz_meses(instancias)
+    promedio = mascara_promedio(instancias)
+
+    nodos = {n for n in nodos if n in fila}
+    for nivel in _niveles({n for n in nodos if hijos_de.get(n)}, hijos_de):
+        filas_destino = [fila[p] for p in nivel]
+        filas_padre, filas_hijo = [], []
+        for k, padre in enumerate(nivel):
+            for hijo in hijos_de[padre]:
+                if hijo in fila:
+                    filas_padre.append(k)
+                    filas_hijo.append(fila[hijo])
+        matriz[filas_destino] = agregar_hijos(
+            matriz[filas_hijo], filas_padre, len(nivel), promedio[filas_destino]
+        )
+
+    filas = sorted(fila[n] for n in nodos)
+    recalculados = [instancias[k] for k in filas]
+    asignar(recalculados, CAMPOS_MES, matriz[filas])
+    recalcular(recalculados, matriz[filas])
+    return recalculados
+
+
+def propagar(ids_modificados, incluir_modificados=False, indice=None, bloquear=False):
+    """
+    Recalcula una sola vez cada ancestro de ``ids_modificados`` y los
+    guarda con un único ``bulk_update``. Con ``incluir_modificados`` los
+    propios indicadores modificados también se recalculan (ya guardados
+    en la BD, p. ej. tras un ``bulk_update`` de valores crudos).
+
+    Los ancestros salen del índice de jerarquía en memoria, así que el
+    número de consultas no depende de la profundidad del árbol: una para
+    los indicadores involucrados, el ``bulk_update`` final y la réplica en
+    ``IndicadorValor``. Devuelve los
+    ids de los indicadores actualizados.
+
+    ``indice`` reemplaza al índice del proceso, p. ej. uno que ya incluye
+    relaciones todavía sin confirmar.
+
+    Con ``bloquear`` (dentro de una transacción) las filas a recalcular se
+    bloquean con ``SELECT … FOR UPDATE`` antes de leer los hijos: dos
+    workers con hojas bajo el mismo ancestro lo recalculan uno después del
+    otro, y el segundo parte de lo que confirmó el primero.
+    """
+    ids_modificados = set(ids_modificados)
+    if not ids_modificados:
+        return []
+
+    indice = indice or jerarquia.indice()
+    hijos_de = indice.mapa_hijos()
+
+    # Ancestros alcanzables desde los indicadores modificados
+    objetivos = set()
+    for nodo in ids_modificados:
+        objetivos.update(indice.ancestros(nodo))
+
+    if incluir_modificados:
+        objetivos |= ids_modificados
+    if not objetivos:
+        return []
+
+    if bloquear:
+        # Siempre en orden de id: dos lotes que comparten ancestros no se
+        # bloquean mutuamente
+        list(
+            Indicador.objects.select_for_update().filter(pk__in=objetivos)
+            .order_by("pk").values_list("pk", flat=True)
+        )
+
+    necesarios = set(objetivos)
+    for padre in objetivos:
+        necesarios.update(hijos_de.get(padre, ()))
+
+    cargados = Indicador.objects.only(
+        "id", "metodo_q", "anio", *CAMPOS_MES, *CAMPOS_Q, "ano_a_la_fecha"
+    ).in_bulk(necesarios)
+
+    ahora = timezone.now()
+    actualizados = recalcular_nodos(objetivos, hijos_de, cargados)
+    for indicador in actualizados:
+        indicador.actualizado_en = ahora
+
+    with transaction.atomic():
+        Indicador.objects.bulk_update(actualizados, CAMPOS_ROLLUP)
+        sincronizar(actualizados)
+    cache.invalidar("indicador")
+
+    return [i.pk for i in actualizados]
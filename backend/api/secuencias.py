@@ -0,0 +1,110 @@
+"""
+Códigos correlativos respaldados por la BD (``Secuencia``).
+
+``reservar`` aparta un rango de valores consecutivos en una sola
+sentencia: ``UPDATE … SET valor = valor + cantidad … RETURNING valor``
+(PostgreSQL, SQLite ≥ 3.35). El incremento es atómico, así que dos
+procesos nunca reciben el mismo valor. En los demás motores se bloquea
+la fila con ``select_for_update``.
+
+Los valores de una transacción que se revierte se pierden (quedan
+huecos), como con una secuencia de la BD.
+
+Las mismas filas sirven de contadores de versión compartidos por todos
+los procesos (caché de respuestas y jerarquía, ver ``incrementar`` y
+``valores``): a diferencia de ``cache.incr`` en el backend de archivo, dos
+incrementos simultáneos nunca devuelven el mismo valor.
+"""
+import time
+
+from django.db import connections, router, transaction
+from django.db.models import Max
+
+from .models import Indicador, Secuencia
+
+INDICADOR_N = "indicador_n"
+PREFIJO_VERSION = "version:"
+
+
+def _valor_inicial(nombre):
+    """Último valor ya usado, para crear la secuencia si no existe."""
+    if nombre.startswith(PREFIJO_VERSION):
+        # Un contador de versión que se perdió (BD restaurada, transacción
+        # revertida) vuelve a empezar en un valor que no se usó nunca: las
+        # entradas de caché guardadas con el anterior no se reutilizan
+        return time.time_ns()
+    if nombre != INDICADOR_N:
+        return 0
+    # Como antes: el siguiente código sigue al último id (o al mayor n numérico)
+    ultimo_id = Indicador.objects.aggregate(m=Max("id"))["m"] or 0
+    numericos = (
+        int(n) for n in Indicador.objects.exclude(n=None).values_list("n", flat=True).iterator()
+        if n.isdigit()
+    )
+    return max(ultimo_id, max(numericos, default=0))
+
+
+def _soporta_returning(conexion):
+    if conexion.vendor == "postgresql":
+        return True
+    if conexion.vendor == "sqlite":
+        return conexion.Database.sqlite_version_info >= (3, 35)
+    return False
+
+
+def reservar(nombre, cantidad=1):
+    """``range`` con ``cantidad`` valores nuevos de la secuencia ``nombre``."""
+    if cantidad <= 0:
+        return range(0)
+
+    using = router.db_for_write(Secuencia)
+    conexion = connections[using]
+    if _soporta_returning(conexion):
+        q = conexion.ops.quote_name
+        tabla = q(Secuencia._meta.db_table)
+        valor = q(Secuencia._meta.get_field("valor").column)
+        clave = q(Secuencia._meta.get_field("nombre").column)
+        with conexion.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {tabla} SET {valor} = {valor} + %s WHERE {clave} = %s RETURNING {valor}",
+                [cantidad, nombre],
+            )
+            fila = cursor.fetchone()
+        if fila is not None:
+            return range(fila[0] - cantidad + 1, fila[0] + 1)
+
+    # Sin RETURNING, o la secuencia todavía no existe
+    with transaction.atomic(using=using):
+        Secuencia.objects.using(using).get_or_create(
+            nombre=nombre, defaults={"valor": lambda: _valor_inicial(nombre)}
+        )
+        secuencia = Secuencia.objects.using(using).select_for_update().get(nombre=nombre)
+        inicio = secuencia.valor + 1
+        secuencia.valor += cantidad
+        secuencia.save(update_fields=["valor"])
+    return range(inicio, inicio + cantidad)
+
+
+def reservar_codigos(cantidad):
+    """``cantidad`` códigos ``n`` nuevos para indicadores."""
+    return [str(numero) for numero in reservar(INDICADOR_N, cantidad)]
+
+
+def asignar_codigos(indicadores):
+    """Completa ``n`` en los indicadores que no lo tienen, con una sola reserva."""
+    sin_codigo = [i for i in indicadores if not i.n]
+    for indicador, codigo in zip(sin_codigo, reservar_codigos(len(sin_codigo))):
+        indicador.n = codigo
+    return sin_codigo
+
+
+def incrementar(nombre):
+    """Incrementa el contador ``nombre`` y devuelve su nuevo valor."""
+    return reservar(nombre)[0]
+
+
+def valores(nombres):
+    """``{nombre: valor}`` de los contadores que ya existen, en una consulta."""
+    return dict(
+        Secuencia.objects.filter(nombre__in=list(nombres)).values_list("nombre", "valor")
+    )
@@ -1,8 +1,45 @@
 from rest_framework import serializers
-from .models import Indicador, Categoria, IndicadorRel, BSC, CodigoRegistro, PerfilUsuario, Persona
+from . import jerarquia, series
+from .models import Indicador, Categoria, IndicadorRel, BSC, CodigoRegistro, PerfilUsuario, Persona, Resumen, RollupPendiente
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+# ============================================================
+#   C A M P O S   D I N Á M I C O S
+# ============================================================
+def campos_solicitados(request, disponibles):
+    """
+    Campos pedidos con ``?fields=a,b`` y/o ``?omit=c,d`` (solo en GET).
+    Devuelve None si no se filtra nada.
+    """
+    if request is None or request.method != "GET":
+        return None
+    fields = request.query_params.get("fields")
+    omit = request.query_params.get("omit")
+    if not fields and not omit:
+        return None
+
+    campos = list(disponibles)
+    if fields:
+        pedidos = {f.strip() for f in fields.split(",")}
+        campos = [c for c in campos if c in pedidos]
+    if omit:
+        omitidos = {f.strip() for f in omit.split(",")}
+        campos = [c for c in campos if c not in omitidos]
+    return campos
+
+
+class CamposDinamicosMixin:
+    """Limita los campos del serializer según ``?fields=`` / ``?omit=``."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        campos = campos_solicitados(self.context.get("request"), self.fields)
+        if campos is not None:
+            for nombre in set(self.fields) - set(campos):
+                self.fields.pop(nombre)
+
+
 # ============================================================
 #   C A T E G O R Í A
 # ============================================================
@@ -47,6 +84,22 @@ class BSCSerializer(serializers.ModelSerializer):
             instance.categorias.set(categorias)
         return instance
 
+# ============================================================
+#   R E S U M E N
+# ============================================================
+class ResumenSerializer(serializers.ModelSerializer):
+    porcentaje_cumplimiento = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Resumen
+        fields = [
+            "alcance", "alcance_id", "periodo",
+            "resultado", "objetivo",
+            "total", "cumplen", "no_cumplen", "sin_datos",
+            "porcentaje_cumplimiento",
+            "actualizado_en",
+        ]
+
 # ============================================================
 #   R E L A C I Ó N   I N D I C A D O R - I N D I C A D O R
 # ============================================================
@@ -55,12 +108,32 @@ class IndicadorRelSerializer(serializers.ModelSerializer):
         model = IndicadorRel
         fields = ["id", "indicador_padre", "indicador_hijo"]
 
+    def validate(self, attrs):
+        padre = attrs.get("indicador_padre") or self.instance.indicador_padre
+        hijo = attrs.get("indicador_hijo") or self.instance.indicador_hijo
+        excluir_rel = self.instance.pk if self.instance else None
+
+        # Con el índice al día basta leer la versión; si otro proceso cambió
+        # la jerarquía o esta transacción tiene relaciones sin confirmar, la
+        # CTE recursiva en la BD
+        indice = jerarquia.indice_vigente()
+        if indice is not None:
+            ciclo = indice.crearia_ciclo(padre.pk, hijo.pk, excluir_rel)
+        else:
+            ciclo = IndicadorRel.objects.crearia_ciclo(padre.pk, hijo.pk, excluir_rel)
+        if ciclo:
+            raise serializers.ValidationError(
+                "La relación crearía un ciclo entre indicadores"
+            )
+        return attrs
+
 # ============================================================
 #   I N D I C A D O R
 # ============================================================
-class IndicadorSerializer(serializers.ModelSerializer):
+class IndicadorSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     hijos = serializers.SerializerMethodField()
     padres = serializers.SerializerMethodField()
+    rollup_pending = serializers.SerializerMethodField()
     categorias = serializers.PrimaryKeyRelatedField(
         many=True, queryset=Categoria.objects.all(), required=False
     )
@@ -88,6 +161,7 @@ class IndicadorSerializer(serializers.ModelSerializer):
             "condicion",
             "ano_a_la_fecha",
             "metodo_q",          # ⚡ Nuevo campo
+            "anio",              # Año de ene_r … q4_o
             "categorias",
             "categorias_detalle",
             "ene_r", "feb_r", "mar_r", "abr_r", "may_r", "jun_r",
@@ -100,11 +174,14 @@ class IndicadorSerializer(serializers.ModelSerializer):
             "actualizado_en",
             "hijos",
             "padres",
+            "rollup_pending",    # Rollup diferido aún sin procesar
         ]
+        # Se cambia para todos con `manage.py abrir_anio`
+        read_only_fields = ["anio"]
 
 
+    # Usan .all() para aprovechar el prefetch del ViewSet (sin consultas por fila)
     def get_hijos(self, obj):
-        relaciones = obj.hijos.select_related("indicador_hijo").all()
         return [
             {
                 "rel_id": rel.id,
@@ -112,11 +189,10 @@ class IndicadorSerializer(serializers.ModelSerializer):
                 "n": rel.indicador_hijo.n,
                 "indicador": rel.indicador_hijo.indicador,
             }
-            for rel in relaciones
+            for rel in obj.hijos.all()
         ]
 
     def get_padres(self, obj):
-        relaciones = obj.padres.select_related("indicador_padre").all()
         return [
             {
                 "rel_id": rel.id,
@@ -124,9 +200,26 @@ class IndicadorSerializer(serializers.ModelSerializer):
                 "n": rel.indicador_padre.n,
                 "indicador": rel.indicador_padre.indicador,
             }
-            for rel in relaciones
+            for rel in obj.padres.all()
         ]
 
+    def get_rollup_pending(self, obj):
+        # El ViewSet lo anota con un EXISTS; fuera de él se consulta la cola
+        pendiente = getattr(obj, "rollup_pending", None)
+        if pendiente is None:
+            pendiente = RollupPendiente.objects.filter(indicador_id=obj.pk).exists()
+        return pendiente
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Con ?anio= el ViewSet precarga la serie de ese año en valores_anio
+        valores = getattr(instance, "valores_anio", None)
+        if valores is not None:
+            for campo, valor in series.campos_del_anio(instance, valores).items():
+                if campo in data:
+                    data[campo] = valor
+        return data
+
     def create(self, validated_data):
         categorias = validated_data.pop("categorias", [])
         indicador = Indicador.objects.create(**validated_data)
@@ -180,24 +273,40 @@ class PersonaSerializer(serializers.ModelSerializer):
     def get_tiene_usuario(self, obj):
         return obj.user is not None
 
+class PersonaMasivaSerializer(serializers.Serializer):
+    """Una fila del pre-registro masivo (ver ``preregistro.py``)."""
+    nombres = serializers.CharField(max_length=150)
+    apellidos = serializers.CharField(max_length=150)
+    email = serializers.EmailField(max_length=254)
+
+class RegistroMasivoSerializer(serializers.Serializer):
+    """Una fila del registro masivo de usuarios (ver ``preregistro.py``)."""
+    codigo = serializers.UUIDField()
+    username = serializers.CharField(max_length=150)
+    password = serializers.CharField(write_only=True)
+
 class RegistroUsuarioSerializer(serializers.Serializer):
     codigo = serializers.UUIDField()
     username = serializers.CharField()
     password = serializers.CharField(write_only=True)
 
     def validate_codigo(self, value):
-        try:
-            codigo = CodigoRegistro.objects.select_related("persona").get(codigo=value)
-        except CodigoRegistro.DoesNotExist:
-            raise serializers.ValidationError("Código inválido")
+        # Una consulta por el índice único de ``codigo`` con la validez en SQL;
+        # la segunda solo se hace para explicar por qué no es válido
+        codigo = (
+            CodigoRegistro.objects.vigentes()
+            .filter(codigo=value, persona__user__isnull=True)
+            .select_related("persona").first()
+        )
+        if codigo is not None:
+            return codigo
 
+        codigo = CodigoRegistro.objects.filter(codigo=value).select_related("persona").first()
+        if codigo is None:
+            raise serializers.ValidationError("Código inválido")
         if not codigo.es_valido():
             raise serializers.ValidationError("Código expirado o usado")
-
-        if codigo.persona.user:
-            raise serializers.ValidationError("Esta persona ya tiene usuario")
-
-        return codigo
+        raise serializers.ValidationError("Esta persona ya tiene usuario")
 
     def create(self, validated_data):
         codigo = validated_data.pop("codigo")
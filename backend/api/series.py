@@ -0,0 +1,140 @@
+"""
+Serie temporal normalizada de valores (``IndicadorValor``).
+
+Las columnas ene_r … dic_o de ``Indicador`` son las del año
+``Indicador.anio``; cada escritura se replica en ``IndicadorValor`` (un
+registro por mes y tipo) en ese año, no en el año calendario: editar en
+enero sigue escribiendo el año abierto. ``abrir_anio`` pasa todos los
+indicadores a otro año (el nuevo o uno anterior, para corregirlo)
+cargando sus columnas desde la serie. La capa de compatibilidad
+reconstruye ene_r … q4_o y ``ano_a_la_fecha`` de cualquier año a partir
+de la serie.
+"""
+from datetime import date
+
+import numpy as np
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .agregacion import (
+    CAMPOS_MES, CAMPOS_Q, MESES, a_python, calcular_ano_a_la_fecha,
+    calcular_trimestres, mascara_promedio,
+)
+from .models import Indicador, IndicadorValor, anio_actual
+
+# Columnas que cambian al abrir otro año
+CAMPOS_ANIO = ["anio", *CAMPOS_MES, *CAMPOS_Q, "ano_a_la_fecha"]
+
+
+def anio_vigente():
+    """Año calendario en curso (por defecto de ``?hasta=`` en el histórico)."""
+    return anio_actual()
+
+
+def rango_anio(anio):
+    return date(anio, 1, 1), date(anio + 1, 1, 1)
+
+
+# ============================================================
+#   E S C R I T U R A
+# ============================================================
+def filas_valores(indicador):
+    anio = indicador.anio
+    return [
+        IndicadorValor(
+            indicador_id=indicador.pk,
+            periodo=date(anio, k + 1, 1),
+            tipo=t.upper(),
+            valor=getattr(indicador, f"{mes}_{t}"),
+        )
+        for t in ("r", "o")
+        for k, mes in enumerate(MESES)
+    ]
+
+
+def sincronizar(indicadores, batch_size=1000):
+    """
+    Inserta o actualiza los 24 valores mensuales de ``indicadores`` en el
+    ``anio`` de cada uno.
+    """
+    filas = [fila for indicador in indicadores for fila in filas_valores(indicador)]
+    if not filas:
+        return
+    IndicadorValor.objects.bulk_create(
+        filas,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["indicador", "tipo", "periodo"],
+        update_fields=["valor"],
+    )
+
+
+def abrir_anio(anio, batch_size=1000):
+    """
+    Pasa a ``anio`` las columnas de los indicadores que están en otro año.
+    El año que se deja ya está en la serie (cada escritura se replica), así
+    que no se pierde nada; las columnas se cargan con los valores de
+    ``anio`` (vacías si es nuevo). Devuelve los indicadores cambiados.
+    """
+    indicadores = list(
+        Indicador.objects.exclude(anio=anio)
+        .only("id", "metodo_q", *CAMPOS_ANIO)
+        .prefetch_related(prefetch_anio(anio))
+    )
+    ahora = timezone.now()
+    for indicador in indicadores:
+        for campo, valor in campos_del_anio(indicador, indicador.valores_anio).items():
+            setattr(indicador, campo, valor)
+        indicador.anio = anio
+        indicador.actualizado_en = ahora
+    Indicador.objects.bulk_update(
+        indicadores, [*CAMPOS_ANIO, "actualizado_en"], batch_size=batch_size
+    )
+    return indicadores
+
+
+# ============================================================
+#   C O M P A T I B I L I D A D
+# ============================================================
+def prefetch_anio(anio):
+    """Prefetch de los valores de ``anio`` en ``indicador.valores_anio``."""
+    desde, hasta = rango_anio(anio)
+    return Prefetch(
+        "valores",
+        queryset=IndicadorValor.objects.filter(
+            periodo__gte=desde, periodo__lt=hasta
+        ).only("indicador_id", "periodo", "tipo", "valor"),
+        to_attr="valores_anio",
+    )
+
+
+def campos_del_anio(indicador, valores):
+    """ene_r … dic_o, q1_r … q4_o y ano_a_la_fecha calculados desde la serie."""
+    meses = dict.fromkeys(CAMPOS_MES)
+    for valor in valores:
+        meses[f"{MESES[valor.periodo.month - 1]}_{valor.tipo.lower()}"] = valor.valor
+
+    matriz = np.array([[meses[c] for c in CAMPOS_MES]], dtype=float)
+    promedio = mascara_promedio([indicador])
+    return {
+        **meses,
+        **dict(zip(CAMPOS_Q, a_python(calcular_trimestres(matriz, promedio)[0]))),
+        "ano_a_la_fecha": calcular_ano_a_la_fecha(matriz, promedio)[0],
+    }
+
+
+def historico(indicador_id, desde, hasta, tipo=None):
+    """Valores entre los años ``desde`` y ``hasta`` (inclusive), por periodo."""
+    qs = IndicadorValor.objects.filter(
+        indicador_id=indicador_id,
+        periodo__gte=rango_anio(desde)[0],
+        periodo__lt=rango_anio(hasta)[1],
+    )
+    if tipo:
+        qs = qs.filter(tipo=tipo)
+    return [
+        {"periodo": f"{periodo:%Y-%m}", "tipo": t, "valor": valor}
+        for periodo, t, valor in qs.order_by("tipo", "periodo").values_list(
+            "periodo", "tipo", "valor"
+        )
+    ]
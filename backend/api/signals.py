@@ -1,16 +1,129 @@
 # hr/signals.py
-from django.db.models.signals import post_delete
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Persona, PerfilUsuario
+from . import cache, jerarquia, resumenes
+from .autenticacion import invalidar_usuarios
+from .models import (
+    BSC, Categoria, Indicador, IndicadorRel, Persona, PerfilUsuario, Resumen,
+    borrando_personas_en_bloque,
+)
 
 @receiver(post_delete, sender=Persona)
 def eliminar_usuario_al_borrar_persona(sender, instance, **kwargs):
     """
     Cuando se elimina una Persona, se elimina también su usuario y perfil.
+    ``PersonaQuerySet.delete`` los borra en bloque.
     """
+    if borrando_personas_en_bloque.get():
+        return
     if instance.user:
         # Eliminar perfil de usuario si existe
         PerfilUsuario.objects.filter(user=instance.user).delete()
         # Eliminar usuario
         instance.user.delete()
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidar_usuario_en_cache(sender, instance, **kwargs):
+    invalidar_usuarios(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=PerfilUsuario)
+def invalidar_usuario_del_perfil(sender, instance, **kwargs):
+    invalidar_usuarios(instance.user_id)
+
+
+@receiver(post_save, sender=IndicadorRel)
+def actualizar_jerarquia_al_guardar_relacion(sender, instance, **kwargs):
+    jerarquia.relacion_guardada(
+        instance.pk, instance.indicador_padre_id, instance.indicador_hijo_id
+    )
+
+
+@receiver(post_delete, sender=IndicadorRel)
+def actualizar_jerarquia_al_borrar_relacion(sender, instance, **kwargs):
+    jerarquia.relacion_eliminada(instance.pk)
+
+
+# ======================================================
+#   VERSIONES DE LA CACHÉ DE RESPUESTAS
+# ======================================================
+@receiver([post_save, post_delete], sender=Indicador)
+@receiver([post_save, post_delete], sender=IndicadorRel)
+@receiver([post_save, post_delete], sender=Categoria)
+@receiver([post_save, post_delete], sender=BSC)
+def invalidar_cache_respuestas(sender, **kwargs):
+    cache.invalidar(sender._meta.model_name)
+
+
+@receiver(m2m_changed, sender=Indicador.categorias.through)
+@receiver(m2m_changed, sender=BSC.categorias.through)
+def invalidar_cache_por_categorias(sender, action, **kwargs):
+    if action.startswith("post_"):
+        cache.invalidar(*cache.MODELOS)
+
+
+# ======================================================
+#   R E S Ú M E N E S
+# ======================================================
+# Las filas INDICADOR se borran en cascada; aquí se recalculan los alcances
+# a los que pertenecía (sus enlaces ya no existen en post_delete)
+@receiver(pre_delete, sender=Indicador)
+def recordar_alcances_del_indicador(sender, instance, **kwargs):
+    instance._alcances_resumen = resumenes.alcances_de([instance.pk])
+
+
+@receiver(post_delete, sender=Indicador)
+def actualizar_resumenes_al_borrar_indicador(sender, instance, **kwargs):
+    alcances = getattr(instance, "_alcances_resumen", None)
+    if alcances:
+        resumenes.actualizar_alcances(**alcances)
+
+
+@receiver(pre_delete, sender=Categoria)
+def recordar_bscs_de_la_categoria(sender, instance, **kwargs):
+    instance._bscs_resumen = set(instance.bscs.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=Categoria)
+def actualizar_resumenes_al_borrar_categoria(sender, instance, **kwargs):
+    Resumen.objects.filter(alcance=Resumen.CATEGORIA, alcance_id=str(instance.pk)).delete()
+    resumenes.actualizar_alcances(bscs=getattr(instance, "_bscs_resumen", ()))
+
+
+@receiver(post_delete, sender=BSC)
+def borrar_resumenes_del_bsc(sender, instance, **kwargs):
+    Resumen.objects.filter(alcance=Resumen.BSC, alcance_id=str(instance.pk)).delete()
+
+
+def _afectados(instance, modelo, pk_set, action):
+    """
+    Ids del lado ``modelo`` de un m2m_changed. En un ``clear`` el
+    pk_set llega vacío, así que se usa lo recordado en pre_clear.
+    """
+    if isinstance(instance, modelo):
+        return {instance.pk}
+    if action == "post_clear":
+        return getattr(instance, "_enlaces_resumen", set())
+    return set(pk_set or ())
+
+
+@receiver(m2m_changed, sender=Indicador.categorias.through)
+def actualizar_resumenes_por_categorias(sender, instance, action, pk_set, **kwargs):
+    if action == "pre_clear" and isinstance(instance, Indicador):
+        instance._enlaces_resumen = set(instance.categorias.values_list("id", flat=True))
+    elif action.startswith("post_"):
+        resumenes.actualizar_alcances(
+            categorias=_afectados(instance, Categoria, pk_set, action)
+        )
+
+
+@receiver(m2m_changed, sender=BSC.categorias.through)
+def actualizar_resumenes_por_bsc(sender, instance, action, pk_set, **kwargs):
+    if action == "pre_clear" and isinstance(instance, Categoria):
+        instance._enlaces_resumen = set(instance.bscs.values_list("id", flat=True))
+    elif action.startswith("post_"):
+        resumenes.actualizar_alcances(
+            bscs=_afectados(instance, BSC, pk_set, action)
+        )
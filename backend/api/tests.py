@@ -1,3 +1,1560 @@
-from django.test import TestCase
+import csv
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import uuid
+from datetime import date, datetime, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import User
+from django.core.cache import cache as django_cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import arbol, autenticacion, cache, dashboard, diferido, jerarquia, resumenes, secuencias
+from .agregacion import CAMPOS_MES, CAMPOS_Q, MESES, recalcular
+from .autenticacion import CachedJWTAuthentication, _clave_usuario, invalidar_usuarios
+from .hashers import MD5RapidoPasswordHasher, hashear_en_paralelo, revisar_hasher_rapido
+from .importacion import Importador, importar_indicadores
+from .models import (
+    BSC, Categoria, Indicador, IndicadorRel, IndicadorValor, Resumen, RollupPendiente,
+    CodigoRegistro, PerfilUsuario, Persona, Secuencia,
+)
+from .preregistro import registrar_usuarios
+from .serializers import IndicadorRelSerializer
+
+
+class IndicadorListQueryCountTests(TestCase):
+    """
+    El listado de indicadores debe ejecutar un número fijo de consultas,
+    sin importar cuántas filas devuelva (sin N+1 en hijos, padres ni
+    categorías).
+    """
+
+    # versiones de la caché + indicadores + categorías + bscs de las
+    # categorías + hijos + padres
+    CONSULTAS_LISTADO = 6
+
+    def setUp(self):
+        django_cache.clear()
+        self.client = APIClient()
+        self.bsc = BSC.objects.create(nombre="BSC")
+        self.categorias = [
+            Categoria.objects.create(nombre=f"Categoría {i}") for i in range(3)
+        ]
+        self.bsc.categorias.set(self.categorias)
+
+    def crear_indicadores(self, cantidad):
+        indicadores = Indicador.objects.bulk_create(
+            Indicador(n=str(i), indicador=f"Indicador {i}", ene_r=i)
+            for i in range(cantidad)
+        )
+        # Cada indicador es hijo del anterior y tiene una categoría
+        IndicadorRel.objects.bulk_create(
+            IndicadorRel(indicador_padre=padre, indicador_hijo=hijo)
+            for padre, hijo in zip(indicadores, indicadores[1:])
+        )
+        Through = Indicador.categorias.through
+        Through.objects.bulk_create(
+            Through(indicador=ind, categoria=self.categorias[i % 3])
+            for i, ind in enumerate(indicadores)
+        )
+        # bulk_create no emite signals: se invalida como en las cargas masivas
+        with self.captureOnCommitCallbacks(execute=True):
+            cache.invalidar(*cache.MODELOS)
+
+    def test_listado_con_consultas_constantes(self):
+        total = 0
+        for cantidad in (10, 100, 1000):
+            with self.subTest(cantidad=cantidad):
+                self.crear_indicadores(cantidad - total)
+                total = cantidad
+
+                with self.assertNumQueries(self.CONSULTAS_LISTADO):
+                    response = self.client.get("/api/indicadores/")
+
+                self.assertEqual(response.status_code, 200)
+                datos = response.json()
+                self.assertEqual(len(datos), cantidad)
+                self.assertEqual(len(datos[1]["padres"]), 1)
+                self.assertEqual(datos[0]["categorias_detalle"][0]["bscs"], [self.bsc.id])
+
+
+class PaginacionCursorTests(TestCase):
+    """``IdCursorPagination``: solo pagina con ``?page_size=``."""
+
+    def setUp(self):
+        django_cache.clear()
+        self.client = APIClient()
+        self.ids = [
+            Indicador.objects.create(n=str(i), indicador=f"Indicador {i}").id for i in range(7)
+        ]
+
+    def test_sin_page_size_devuelve_la_lista(self):
+        data = self.client.get("/api/indicadores/").json()
+        self.assertIsInstance(data, list)
+        self.assertEqual([fila["id"] for fila in data], self.ids)
+
+    def test_recorre_todos_los_ids_una_vez(self):
+        response = self.client.get("/api/indicadores/", {"page_size": 3, "fields": "id"})
+        vistos, paginas = [], 0
+        while True:
+            data = response.json()
+            self.assertLessEqual(len(data["results"]), 3)
+            vistos += [fila["id"] for fila in data["results"]]
+            paginas += 1
+            if data["next"] is None:
+                break
+            response = self.client.get(data["next"])
+        self.assertEqual(paginas, 3)
+        self.assertEqual(vistos, self.ids)
+
+    def test_una_sola_pagina_sin_next(self):
+        data = self.client.get("/api/indicadores/", {"page_size": 100000}).json()
+        self.assertEqual(len(data["results"]), 7)
+        self.assertIsNone(data["next"])
+
+
+class JerarquiaTests(TestCase):
+    """
+    Ciclos en ``IndicadorRel`` (índice en memoria y CTE en la BD) y
+    actualización del índice del proceso al confirmar la transacción.
+    """
+
+    def setUp(self):
+        django_cache.clear()
+        # El índice es del proceso: que no arrastre relaciones de otros tests
+        jerarquia.descartar()
+        self.addCleanup(jerarquia.descartar)
+        self.a, self.b, self.c, self.d = Indicador.objects.bulk_create(
+            Indicador(n=str(i), indicador=f"Indicador {i}") for i in range(4)
+        )
+
+    def relacionar(self, padre, hijo):
+        with self.captureOnCommitCallbacks(execute=True):
+            return IndicadorRel.objects.create(indicador_padre=padre, indicador_hijo=hijo)
+
+    def es_valida(self, padre, hijo, instance=None):
+        serializer = IndicadorRelSerializer(
+            instance, data={"indicador_padre": padre.pk, "indicador_hijo": hijo.pk}
+        )
+        return serializer.is_valid()
+
+    def test_rechaza_ciclos(self):
+        self.relacionar(self.a, self.b)
+        self.relacionar(self.b, self.c)
+        casos = {
+            "propio": (self.a, self.a),
+            "dos nodos": (self.b, self.a),
+            "tres nodos": (self.c, self.a),
+        }
+        for nombre, (padre, hijo) in casos.items():
+            with self.subTest(nombre):
+                self.assertFalse(self.es_valida(padre, hijo))
+        self.assertTrue(self.es_valida(self.a, self.c))
+        self.assertTrue(self.es_valida(self.d, self.a))
+
+    def test_editar_relacion_excluye_la_propia(self):
+        self.relacionar(self.a, self.b)
+        rel = self.relacionar(self.b, self.c)
+        # c → b solo es ciclo por la relación que se está editando
+        self.assertTrue(self.es_valida(self.c, self.b, instance=rel))
+        self.assertFalse(self.es_valida(self.b, self.a, instance=rel))
+
+    def test_ciclo_detectado_en_la_bd_con_indice_atrasado(self):
+        # Índice cargado antes; sin ejecutar on_commit no ve las relaciones
+        jerarquia.indice()
+        IndicadorRel.objects.create(indicador_padre=self.a, indicador_hijo=self.b)
+        rel = IndicadorRel.objects.create(indicador_padre=self.b, indicador_hijo=self.c)
+        self.assertFalse(jerarquia.indice().crearia_ciclo(self.c.pk, self.a.pk))
+
+        self.assertTrue(IndicadorRel.objects.crearia_ciclo(self.a.pk, self.a.pk))
+        self.assertTrue(IndicadorRel.objects.crearia_ciclo(self.b.pk, self.a.pk))
+        self.assertTrue(IndicadorRel.objects.crearia_ciclo(self.c.pk, self.a.pk))
+        self.assertFalse(IndicadorRel.objects.crearia_ciclo(self.c.pk, self.b.pk, excluir_rel=rel.pk))
+        self.assertFalse(self.es_valida(self.c, self.a))
+
+    def consultas_de_validacion(self, padre, hijo):
+        with CaptureQueriesContext(connection) as consultas:
+            valida = self.es_valida(padre, hijo)
+        recursivas = [q for q in consultas.captured_queries if "RECURSIVE" in q["sql"]]
+        return valida, recursivas
+
+    def test_indice_al_dia_sin_cte(self):
+        self.relacionar(self.a, self.b)
+        self.relacionar(self.b, self.c)
+        jerarquia.indice()
+        for padre, hijo, esperada in [(self.c, self.a, False), (self.a, self.d, True)]:
+            valida, recursivas = self.consultas_de_validacion(padre, hijo)
+            self.assertEqual(valida, esperada)
+            self.assertEqual(recursivas, [])
+
+    def test_indice_de_otra_version_usa_la_cte(self):
+        self.relacionar(self.a, self.b)
+        jerarquia.indice()
+        # Otro proceso agrega b → c
+        with mock.patch.object(jerarquia, "_incrementar_version"):
+            self.relacionar(self.b, self.c)
+        secuencias.incrementar(jerarquia.CLAVE_VERSION)
+
+        valida, recursivas = self.consultas_de_validacion(self.c, self.a)
+        self.assertFalse(valida)
+        self.assertEqual(len(recursivas), 1)
+        self.assertIsNone(jerarquia.indice_vigente())
+
+    def test_cambios_sin_confirmar_usan_la_cte(self):
+        # Con el contador ya creado, publicar el cambio conserva el índice
+        self.relacionar(self.c, self.d)
+        jerarquia.indice()
+        with self.captureOnCommitCallbacks(execute=True):
+            IndicadorRel.objects.create(indicador_padre=self.a, indicador_hijo=self.b)
+            self.assertIsNone(jerarquia.indice_vigente())
+            valida, recursivas = self.consultas_de_validacion(self.b, self.a)
+            self.assertFalse(valida)
+            self.assertEqual(len(recursivas), 1)
+        self.assertIsNotNone(jerarquia.indice_vigente())
+
+    def test_relacion_revertida_no_queda_en_el_indice(self):
+        self.relacionar(self.a, self.b)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                IndicadorRel.objects.create(indicador_padre=self.b, indicador_hijo=self.c)
+                raise RuntimeError
+        self.assertEqual(jerarquia.indice().hijos(self.b.pk), [])
+        self.assertTrue(self.es_valida(self.c, self.b))
+
+    def test_indice_publicado_no_cambia(self):
+        self.relacionar(self.a, self.b)
+        anterior = jerarquia.indice()
+        rel = self.relacionar(self.b, self.c)
+        self.assertEqual(anterior.hijos(self.b.pk), [])
+        self.assertEqual(jerarquia.indice().descendientes(self.a.pk), {self.b.pk, self.c.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rel.delete()
+        self.assertEqual(jerarquia.indice().descendientes(self.a.pk), {self.b.pk})
+
+
+    def test_cambio_de_otro_proceso_descarta_el_indice(self):
+        self.relacionar(self.a, self.b)
+        jerarquia.indice()
+        # Otro proceso agrega c → d (sin pasar por este índice) e incrementa
+        # la versión compartida
+        IndicadorRel.objects.bulk_create([IndicadorRel(indicador_padre=self.c, indicador_hijo=self.d)])
+        secuencias.incrementar(jerarquia.CLAVE_VERSION)
+
+        # El incremento propio no queda justo después: el índice se recarga
+        self.relacionar(self.b, self.c)
+        self.assertEqual(
+            jerarquia.indice().descendientes(self.a.pk), {self.b.pk, self.c.pk, self.d.pk}
+        )
+
+    def test_version_atomica(self):
+        inicio = jerarquia.version_compartida()
+        siguientes = [secuencias.incrementar(jerarquia.CLAVE_VERSION) for _ in range(3)]
+        self.assertEqual(len(set(siguientes)), 3)
+        self.assertEqual(jerarquia.version_compartida(), siguientes[-1])
+        self.assertGreater(siguientes[0], inicio)
+
+
+class CacheRespuestasTests(TestCase):
+    """Versiones por modelo, claves por URL y revalidación con ETag."""
+
+    def setUp(self):
+        django_cache.clear()
+        self.client = APIClient()
+        Indicador.objects.create(indicador="Uno", dueno="Ana")
+        Categoria.objects.create(nombre="Finanzas")
+
+    def test_respuesta_cacheada_sin_consultas(self):
+        primera = self.client.get("/api/categorias/")
+        self.assertEqual(primera.status_code, 200)
+        # Solo la lectura de las versiones
+        with self.assertNumQueries(1):
+            segunda = self.client.get("/api/categorias/")
+        self.assertEqual(segunda.json(), primera.json())
+        self.assertEqual(segunda["ETag"], primera["ETag"])
+
+    def test_if_none_match_devuelve_304(self):
+        etag = self.client.get("/api/categorias/")["ETag"]
+        response = self.client.get("/api/categorias/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_guardar_invalida_la_version(self):
+        etag = self.client.get("/api/categorias/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Categoria.objects.create(nombre="Clientes")
+
+        response = self.client.get("/api/categorias/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual([c["nombre"] for c in response.json()], ["Clientes", "Finanzas"])
+
+    def test_otro_modelo_no_invalida(self):
+        etag = self.client.get("/api/categorias/")["ETag"]
+        Indicador.objects.create(indicador="Dos")
+        response = self.client.get("/api/categorias/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_version_en_la_bd(self):
+        antes = cache.versiones(["categoria"])
+        # Perder la caché (o un backend que la reinicia) no toca la versión
+        django_cache.clear()
+        self.assertEqual(cache.versiones(["categoria"]), antes)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            cache.invalidar("categoria")
+        # Se incrementa al confirmar, no antes
+        self.assertEqual(cache.versiones(["categoria"]), antes)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(cache.versiones(["categoria"]), (antes[0] + 1,))
+
+    @override_settings(CACHES={"default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": tempfile.mkdtemp(prefix="cache-respuestas-"),
+    }})
+    def test_con_cache_de_archivo(self):
+        etag = self.client.get("/api/categorias/")["ETag"]
+        self.assertEqual(self.client.get("/api/categorias/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Categoria.objects.create(nombre="Clientes")
+        response = self.client.get("/api/categorias/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, len(response.json())), (200, 2))
+
+    def test_parametros_forman_parte_de_la_clave(self):
+        completa = self.client.get("/api/indicadores/")
+        parcial = self.client.get("/api/indicadores/?fields=id,indicador")
+        self.assertNotEqual(completa["ETag"], parcial["ETag"])
+        self.assertEqual(set(parcial.json()[0]), {"id", "indicador"})
+        self.assertIn("dueno", self.client.get("/api/indicadores/").json()[0])
+
+
+class SerieAnualTests(TestCase):
+    """Las columnas se escriben en el año del indicador, no en el calendario."""
+
+    def setUp(self):
+        django_cache.clear()
+        self.indicador = Indicador.objects.create(indicador="Ventas", anio=2025, ene_r=10, ene_o=8)
+
+    def valor(self, anio, tipo="R"):
+        return IndicadorValor.objects.get(
+            indicador=self.indicador, tipo=tipo, periodo=date(anio, 1, 1)
+        ).valor
+
+    def test_editar_escribe_el_anio_del_indicador(self):
+        self.indicador.ene_r = 12
+        self.indicador.save()
+        self.assertEqual(self.valor(2025), 12)
+        self.assertFalse(IndicadorValor.objects.exclude(periodo__year=2025).exists())
+
+    def test_cambio_de_anio_conserva_el_anterior(self):
+        call_command("abrir_anio", 2026, stdout=StringIO())
+        self.indicador.refresh_from_db()
+        self.assertEqual(self.indicador.anio, 2026)
+        self.assertIsNone(self.indicador.ene_r)
+        self.assertIsNone(self.indicador.q1_r)
+
+        self.indicador.ene_r = 3
+        self.indicador.save()
+        self.assertEqual(self.valor(2026), 3)
+        self.assertEqual(self.valor(2025), 10)
+
+        # Volver a un año anterior carga sus valores para corregirlo
+        call_command("abrir_anio", 2025, stdout=StringIO())
+        self.indicador.refresh_from_db()
+        self.assertEqual((self.indicador.ene_r, self.indicador.ene_o), (10, 8))
+        self.assertEqual(self.indicador.q1_r, 10)
+        self.assertEqual(self.valor(2026), 3)
+
+    def test_listado_de_otro_anio_desde_la_serie(self):
+        call_command("abrir_anio", 2026, stdout=StringIO())
+        client = APIClient()
+        fila = client.get("/api/indicadores/?anio=2025").json()[0]
+        self.assertEqual((fila["anio"], fila["ene_r"], fila["q1_r"]), (2026, 10, 10))
+        self.assertIsNone(client.get("/api/indicadores/").json()[0]["ene_r"])
+
+    def test_exportar_parquet_con_anio(self):
+        import pyarrow.parquet as pq
+
+        response = APIClient().get("/api/indicadores/exportar/?formato=parquet")
+        self.assertEqual(response.status_code, 200)
+        tabla = pq.read_table(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(str(tabla.schema.field("anio").type), "int64")
+        self.assertEqual(tabla.column("anio").to_pylist(), [2025])
+
+
+@override_settings(ROLLUP_DIFERIDO=True)
+class RollupDiferidoTests(TestCase):
+    """Cola ``RollupPendiente``: encolado, coalescencia y procesamiento."""
+
+    def setUp(self):
+        django_cache.clear()
+        jerarquia.descartar()
+        self.addCleanup(jerarquia.descartar)
+        self.client = APIClient()
+        self.raiz = Indicador.objects.create(indicador="Raíz", metodo_q="SUMA")
+        self.a = Indicador.objects.create(indicador="A", metodo_q="SUMA")
+        self.b = Indicador.objects.create(indicador="B", metodo_q="SUMA")
+        with self.captureOnCommitCallbacks(execute=True):
+            for hijo in (self.a, self.b):
+                IndicadorRel.objects.create(indicador_padre=self.raiz, indicador_hijo=hijo)
+        RollupPendiente.objects.all().delete()
+
+    def pendiente(self, indicador):
+        return self.client.get(f"/api/indicadores/{indicador.pk}/").json()["rollup_pending"]
+
+    def test_save_encola_y_coalesce(self):
+        for valor in (1, 5):
+            self.a.ene_r = valor
+            self.a.save()
+        self.b.ene_r = 7
+        self.b.save()
+
+        self.assertEqual(
+            set(RollupPendiente.objects.values_list("indicador_id", flat=True)),
+            {self.a.pk, self.b.pk},
+        )
+        self.raiz.refresh_from_db()
+        self.assertIsNone(self.raiz.ene_r)
+        self.assertTrue(self.pendiente(self.a))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(diferido.drenar(), 2)
+        self.raiz.refresh_from_db()
+        self.assertEqual((self.raiz.ene_r, self.raiz.q1_r), (12, 12))
+        self.assertFalse(RollupPendiente.objects.exists())
+        self.assertFalse(self.pendiente(self.a))
+
+    def test_bulk_encola_en_modo_diferido(self):
+        response = self.client.post(
+            "/api/indicadores/bulk/",
+            [{"id": self.a.pk, "ene_r": 4}, {"id": self.b.pk, "ene_r": 6}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["recalculados"], [])
+        self.assertEqual(RollupPendiente.objects.count(), 2)
+        self.raiz.refresh_from_db()
+        self.assertIsNone(self.raiz.ene_r)
+
+        diferido.drenar()
+        self.raiz.refresh_from_db()
+        self.assertEqual(self.raiz.ene_r, 10)
+
+    @override_settings(ROLLUP_DIFERIDO=False)
+    def test_bulk_sin_diferido_recalcula_en_el_request(self):
+        response = self.client.post(
+            "/api/indicadores/bulk/", [{"id": self.a.pk, "ene_r": 4}], format="json"
+        )
+        self.assertIn(self.raiz.pk, response.json()["recalculados"])
+        self.assertFalse(RollupPendiente.objects.exists())
+        self.raiz.refresh_from_db()
+        self.assertEqual(self.raiz.ene_r, 4)
+
+
+class CargaMasivaTests(TestCase):
+    """``POST /api/indicadores/bulk/``: errores por fila y un solo recálculo."""
+
+    def setUp(self):
+        django_cache.clear()
+        jerarquia.descartar()
+        self.addCleanup(jerarquia.descartar)
+        self.client = APIClient()
+        self.raiz = Indicador.objects.create(indicador="Raíz", metodo_q="PROMEDIO")
+        self.hojas = [
+            Indicador.objects.create(indicador=f"H{k}", metodo_q="SUMA") for k in range(3)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            for hoja in self.hojas:
+                IndicadorRel.objects.create(indicador_padre=self.raiz, indicador_hijo=hoja)
+
+    def bulk(self, datos):
+        return self.client.post("/api/indicadores/bulk/", datos, format="json")
+
+    def test_errores_por_fila_no_afectan_al_resto(self):
+        h0, h1, h2 = self.hojas
+        response = self.bulk([
+            {"id": h0.pk, "ene_r": 10, "feb_r": 2},
+            {"ene_r": 1},                          # sin id
+            {"id": 999999, "ene_r": 1},            # no existe
+            {"id": h1.pk, "creado_en": "2020-01-01"},  # no editable
+            {"id": h1.pk, "metodo_q": "OTRO"},     # opción inválida
+            "no es un objeto",
+            {"id": h2.pk, "ene_r": 20},
+        ])
+        self.assertEqual(response.status_code, 200)
+        datos = response.json()
+        self.assertEqual(datos["actualizados"], sorted([h0.pk, h2.pk]))
+        self.assertEqual(datos["recalculados"], sorted([self.raiz.pk, h0.pk, h2.pk]))
+
+        errores = {e["indice"]: e for e in datos["errores"]}
+        self.assertEqual(sorted(errores), [1, 2, 3, 4, 5])
+        self.assertIn("id", errores[1]["errores"])
+        self.assertEqual(errores[2]["id"], 999999)
+        self.assertIn("creado_en", errores[3]["errores"])
+        self.assertIn("metodo_q", errores[4]["errores"])
+        self.assertIn("non_field_errors", errores[5]["errores"])
+
+        h0.refresh_from_db()
+        h1.refresh_from_db()
+        self.raiz.refresh_from_db()
+        self.assertEqual((h0.ene_r, h0.q1_r, h0.ano_a_la_fecha), (10, 12, 12))
+        self.assertEqual((h1.ene_r, h1.metodo_q), (None, "SUMA"))
+        self.assertEqual((self.raiz.ene_r, self.raiz.feb_r, self.raiz.q1_r), (15, 2, 8.5))
+
+    def test_parches_del_mismo_id_se_combinan(self):
+        h0 = self.hojas[0]
+        response = self.bulk([{"id": h0.pk, "ene_r": 1}, {"id": str(h0.pk), "feb_r": 3}])
+        self.assertEqual(response.json()["actualizados"], [h0.pk])
+        h0.refresh_from_db()
+        self.assertEqual((h0.ene_r, h0.feb_r, h0.q1_r), (1, 3, 4))
+
+    def test_consultas_no_crecen_con_las_filas(self):
+        def consultas(valor):
+            with CaptureQueriesContext(connection) as ctx:
+                self.bulk([{"id": h.pk, "ene_r": valor} for h in self.hojas[:n]])
+            return len(ctx.captured_queries)
+
+        n = 1
+        una = consultas(1)
+        n = 3
+        self.assertLessEqual(consultas(2), una)
+
+    def test_cuerpo_que_no_es_lista(self):
+        response = self.bulk({"id": self.hojas[0].pk, "ene_r": 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("detail", response.json())
+
+
+class ResumenesTests(TestCase):
+    """Tabla ``Resumen``: filas por indicador y alcances agregados al día."""
+
+    def setUp(self):
+        django_cache.clear()
+        jerarquia.descartar()
+        self.addCleanup(jerarquia.descartar)
+        # i1: Q1 cumple, Q2 no cumple, Q3 sin datos, ANO 11 vs 13 no cumple
+        self.i1 = Indicador.objects.create(
+            indicador="i1", dueno="ana", metodo_q="SUMA", condicion="MAYOR",
+            ene_r=10, ene_o=8, abr_r=1, abr_o=5,
+        )
+        # i2: Q1 cumple (4 <= 5), Q2 sin datos, ANO cumple
+        self.i2 = Indicador.objects.create(
+            indicador="i2", dueno="ana", metodo_q="PROMEDIO", condicion="MENOR",
+            ene_r=4, ene_o=5,
+        )
+        self.c1 = Categoria.objects.create(nombre="C1")
+        self.c2 = Categoria.objects.create(nombre="C2")
+        self.bsc = BSC.objects.create(nombre="BSC")
+        self.bsc.categorias.add(self.c1, self.c2)
+        self.i1.categorias.add(self.c1, self.c2)
+        self.i2.categorias.add(self.c1)
+
+    def conteos(self, alcance, clave, periodo):
+        fila = Resumen.objects.get(alcance=alcance, alcance_id=str(clave), periodo=periodo)
+        return (fila.total, fila.cumplen, fila.no_cumplen, fila.sin_datos)
+
+    def tabla(self):
+        return sorted(Resumen.objects.values_list(
+            "alcance", "alcance_id", "periodo", "resultado", "objetivo",
+            "total", "cumplen", "no_cumplen", "sin_datos",
+        ))
+
+    def test_filas_por_indicador(self):
+        filas = {
+            f.periodo: (f.resultado, f.objetivo, f.cumplen, f.no_cumplen, f.sin_datos)
+            for f in Resumen.objects.filter(alcance=Resumen.INDICADOR, indicador=self.i1)
+        }
+        self.assertEqual(filas, {
+            "Q1": (10, 8, 1, 0, 0),
+            "Q2": (1, 5, 0, 1, 0),
+            "Q3": (None, None, 0, 0, 1),
+            "Q4": (None, None, 0, 0, 1),
+            "ANO": (11, 13, 0, 1, 0),
+        })
+
+    def test_alcances_agregados(self):
+        for alcance, clave in (
+            (Resumen.CATEGORIA, self.c1.pk), (Resumen.BSC, self.bsc.pk), (Resumen.DUENO, "ana"),
+        ):
+            with self.subTest(alcance=alcance):
+                # i1 está en dos categorías del BSC pero cuenta una vez
+                self.assertEqual(self.conteos(alcance, clave, "Q1"), (2, 2, 0, 0))
+                self.assertEqual(self.conteos(alcance, clave, "Q2"), (2, 0, 1, 1))
+                self.assertEqual(self.conteos(alcance, clave, "ANO"), (2, 1, 1, 0))
+        self.assertEqual(self.conteos(Resumen.CATEGORIA, self.c2.pk, "Q1"), (1, 1, 0, 0))
+
+    def test_save_actualiza_indicador_y_alcances(self):
+        self.i1.abr_r = 7
+        self.i1.save()
+        self.assertEqual(self.conteos(Resumen.INDICADOR, self.i1.pk, "Q2"), (1, 1, 0, 0))
+        self.assertEqual(self.conteos(Resumen.CATEGORIA, self.c1.pk, "Q2"), (2, 1, 0, 1))
+        self.assertEqual(self.conteos(Resumen.BSC, self.bsc.pk, "Q2"), (2, 1, 0, 1))
+
+    def test_cambio_de_dueno(self):
+        self.i2.dueno = "luis"
+        self.i2.save()
+        self.assertEqual(self.conteos(Resumen.DUENO, "ana", "Q1"), (1, 1, 0, 0))
+        self.assertEqual(self.conteos(Resumen.DUENO, "luis", "Q1"), (1, 1, 0, 0))
+
+        self.i1.dueno = "luis"
+        self.i1.save()
+        self.assertFalse(Resumen.objects.filter(alcance=Resumen.DUENO, alcance_id="ana").exists())
+        self.assertEqual(self.conteos(Resumen.DUENO, "luis", "Q1"), (2, 2, 0, 0))
+
+    def test_cambio_de_categorias_y_borrado(self):
+        self.i2.categorias.remove(self.c1)
+        self.assertEqual(self.conteos(Resumen.CATEGORIA, self.c1.pk, "Q1"), (1, 1, 0, 0))
+        self.assertEqual(self.conteos(Resumen.BSC, self.bsc.pk, "Q1"), (1, 1, 0, 0))
+
+        self.i1.delete()
+        self.assertEqual(self.conteos(Resumen.CATEGORIA, self.c1.pk, "Q1"), (0, 0, 0, 0))
+        self.assertFalse(Resumen.objects.filter(alcance=Resumen.INDICADOR, alcance_id=str(self.i1.pk)).exists())
+
+    def test_reconstruir_coincide_con_lo_incremental(self):
+        self.i2.dueno = "luis"
+        self.i2.save()
+        self.i1.categorias.remove(self.c2)
+        incremental = self.tabla()
+        resumenes.reconstruir()
+        self.assertEqual(self.tabla(), incremental)
+
+
+class SecuenciasTests(TestCase):
+    """Códigos ``n`` reservados por rangos desde ``Secuencia``."""
+
+    def test_rangos_consecutivos(self):
+        self.assertEqual(secuencias.reservar("prueba", 3), range(1, 4))
+        self.assertEqual(secuencias.reservar("prueba", 2), range(4, 6))
+        self.assertEqual(secuencias.reservar("prueba", 0), range(0))
+        self.assertEqual(Secuencia.objects.get(nombre="prueba").valor, 5)
+
+    def test_sin_returning_bloquea_la_fila(self):
+        with mock.patch.object(secuencias, "_soporta_returning", return_value=False):
+            self.assertEqual(secuencias.reservar("prueba", 3), range(1, 4))
+            self.assertEqual(secuencias.reservar("prueba", 2), range(4, 6))
+
+    def test_mil_codigos_en_una_consulta(self):
+        if not secuencias._soporta_returning(connection):
+            self.skipTest("El motor no soporta UPDATE … RETURNING")
+        inicio = Secuencia.objects.get(nombre=secuencias.INDICADOR_N).valor
+        with CaptureQueriesContext(connection) as ctx:
+            codigos = secuencias.reservar_codigos(1000)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(codigos, [str(inicio + k) for k in range(1, 1001)])
+
+    def test_save_y_asignar_codigos(self):
+        a = Indicador.objects.create(indicador="A")
+        b = Indicador.objects.create(indicador="B")
+        self.assertEqual(int(b.n), int(a.n) + 1)
+        self.assertEqual(Indicador.objects.create(indicador="C", n="X-1").n, "X-1")
+
+        nuevos = [Indicador(indicador="D"), Indicador(indicador="E", n="fijo"), Indicador(indicador="F")]
+        asignados = secuencias.asignar_codigos(nuevos)
+        self.assertEqual([i.indicador for i in asignados], ["D", "F"])
+        self.assertEqual([i.n for i in nuevos], [str(int(b.n) + 1), "fijo", str(int(b.n) + 2)])
+
+    def test_secuencia_faltante_sigue_al_ultimo_codigo(self):
+        Indicador.objects.create(indicador="A")
+        Indicador.objects.create(indicador="B", n="500")
+        ultimo = Indicador.objects.create(indicador="C", n="ABC")
+        Secuencia.objects.filter(nombre=secuencias.INDICADOR_N).delete()
+        # El mayor entre el último id y el mayor n numérico
+        siguiente = max(ultimo.pk, 500) + 1
+        self.assertEqual(secuencias.reservar_codigos(2), [str(siguiente), str(siguiente + 1)])
+
+
+class PreregistroTests(TestCase):
+    """``POST /api/personas/bulk/`` y ``manage.py import_personas``."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("admin"))
+        # Ya pre-registrada, sin usuario: su código se reemplaza
+        self.existente = Persona.objects.create(nombres="Ana", apellidos="Paz", email="ana@x.com")
+        self.codigo_anterior = CodigoRegistro.objects.create(persona=self.existente).codigo
+        # Con usuario: no recibe código
+        Persona.objects.create(
+            nombres="Luis", apellidos="Rey", email="luis@x.com",
+            user=User.objects.create_user("luis"),
+        )
+
+    FILAS = [
+        {"nombres": "Eva", "apellidos": "Sol", "email": "eva@x.com"},
+        {"nombres": "Ana", "apellidos": "Paz", "email": "ana@x.com"},
+        {"nombres": "Luis", "apellidos": "Rey", "email": "luis@x.com"},
+        {"nombres": "Eva", "apellidos": "Sol", "email": "eva@x.com"},  # repetida
+        {"nombres": "", "apellidos": "Sin nombre", "email": "no-es-email"},
+    ]
+
+    def test_lista_json(self):
+        response = self.client.post("/api/personas/bulk/", self.FILAS, format="json")
+        self.assertEqual(response.status_code, 201)
+        datos = response.json()
+        self.assertEqual(
+            (datos["creadas"], datos["existentes"], datos["con_usuario"], datos["total_errores"]),
+            (1, 2, 1, 2),
+        )
+        errores = {e["fila"]: e["errores"] for e in datos["errores"]}
+        self.assertEqual(errores[5], {"email": ["Email repetido en el archivo"]})
+        self.assertEqual(set(errores[6]), {"nombres", "email"})
+
+        codigos = {c["email"]: c for c in datos["codigos"]}
+        self.assertEqual(set(codigos), {"eva@x.com", "ana@x.com"})
+        self.assertEqual(codigos["ana@x.com"]["estado"], "existente")
+        self.assertEqual(Persona.objects.filter(email="eva@x.com").count(), 1)
+
+        # El código de la existente se reemplazó: el anterior ya no sirve
+        nuevo = CodigoRegistro.objects.get(persona=self.existente)
+        self.assertEqual(str(nuevo.codigo), codigos["ana@x.com"]["codigo"])
+        self.assertNotEqual(nuevo.codigo, self.codigo_anterior)
+        self.assertTrue(nuevo.es_valido())
+        self.assertFalse(CodigoRegistro.objects.filter(codigo=self.codigo_anterior).exists())
+
+    def test_archivo_y_salida_csv(self):
+        archivo = BytesIO(
+            "nombres,apellidos,email\nEva,Sol,eva@x.com\nAna,Paz,ana@x.com\n".encode()
+        )
+        archivo.name = "personas.csv"
+        response = self.client.post(
+            "/api/personas/bulk/?formato=csv", {"archivo": archivo}, format="multipart"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        cabecera, *filas = csv.reader(StringIO(response.content.decode()))
+        self.assertEqual(cabecera, ["email", "nombres", "apellidos", "codigo", "expira_en", "estado"])
+        self.assertEqual(sorted((f[0], f[5]) for f in filas), [("ana@x.com", "existente"), ("eva@x.com", "nueva")])
+
+    def test_cuerpo_invalido(self):
+        for datos in ({"nombres": "Eva"}, ["eva@x.com"]):
+            with self.subTest(datos=datos):
+                response = self.client.post("/api/personas/bulk/", datos, format="json")
+                self.assertEqual(response.status_code, 400)
+
+    def test_comando(self):
+        with tempfile.TemporaryDirectory() as carpeta:
+            entrada = os.path.join(carpeta, "personas.csv")
+            salida = os.path.join(carpeta, "codigos.csv")
+            with open(entrada, "w", newline="") as archivo:
+                escritor = csv.DictWriter(archivo, fieldnames=["nombres", "apellidos", "email"])
+                escritor.writeheader()
+                escritor.writerows(self.FILAS)
+
+            errores = StringIO()
+            call_command("import_personas", entrada, salida=salida, stdout=StringIO(), stderr=errores)
+            with open(salida, newline="") as archivo:
+                filas = list(csv.DictReader(archivo))
+        self.assertEqual(sorted(f["email"] for f in filas), ["ana@x.com", "eva@x.com"])
+        self.assertIn("Fila 5", errores.getvalue())
+        self.assertIn("1 personas creadas, 2 existentes", errores.getvalue())
+
+
+class RegistroMasivoTests(TestCase):
+    """``registrar_usuarios``, hasheo en paralelo y perfiles de hashers."""
+
+    def setUp(self):
+        User.objects.create_user("ocupado")
+        self.codigos = []
+        for k in range(3):
+            persona = Persona.objects.create(nombres="P", apellidos=str(k), email=f"p{k}@x.com")
+            self.codigos.append(CodigoRegistro.objects.create(persona=persona, usado=k == 2))
+
+    def fila(self, k, username, password="clave-123"):
+        return {"codigo": str(self.codigos[k].codigo), "username": username, "password": password}
+
+    def test_registrar_usuarios(self):
+        resumen = registrar_usuarios([
+            self.fila(0, "eva"),
+            self.fila(1, "ocupado"),
+            self.fila(2, "usado"),
+            self.fila(0, "otra"),
+            {"codigo": "no-es-uuid", "username": "x", "password": "y"},
+        ])
+        self.assertEqual((resumen["registrados"], resumen["total_errores"]), (1, 4))
+        errores = {e["fila"]: e["errores"] for e in resumen["errores"]}
+        self.assertEqual(errores[3], {"username": ["Ya existe un usuario con ese nombre"]})
+        self.assertEqual(errores[4], {"codigo": ["Código expirado o usado"]})
+        self.assertEqual(errores[5], {"codigo": ["Código repetido en el archivo"]})
+        self.assertIn("codigo", errores[6])
+
+        eva = User.objects.get(username="eva")
+        self.assertEqual(eva.email, "p0@x.com")
+        self.assertTrue(PerfilUsuario.objects.filter(user=eva).exists())
+        self.assertEqual(Persona.objects.get(email="p0@x.com").user, eva)
+        self.codigos[0].refresh_from_db()
+        self.assertTrue(self.codigos[0].usado)
+        response = self.client.post(
+            "/token/", {"username": "eva", "password": "clave-123"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_hasheo_en_paralelo_autentica(self):
+        contrasenas = [f"clave-{k}" for k in range(4)]
+        hashes = hashear_en_paralelo(contrasenas, procesos=2, minimo=1)
+        self.assertEqual(len(hashes), 4)
+        for contrasena, hasheada in zip(contrasenas, hashes):
+            self.assertTrue(check_password(contrasena, hasheada))
+
+        User.objects.create(username="paralelo", password=hashes[1])
+        response = self.client.post(
+            "/token/", {"username": "paralelo", "password": "clave-1"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_comando(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as archivo:
+            escritor = csv.DictWriter(archivo, fieldnames=["codigo", "username", "password"])
+            escritor.writeheader()
+            escritor.writerow(self.fila(1, "luis"))
+        self.addCleanup(os.remove, archivo.name)
+        salida = StringIO()
+        call_command("registrar_usuarios", archivo.name, procesos=1, stdout=salida)
+        self.assertIn("1 usuarios registrados", salida.getvalue())
+        self.assertTrue(User.objects.filter(username="luis").exists())
+
+    def test_check_del_hasher_rapido(self):
+        self.assertEqual(revisar_hasher_rapido(None), [])
+        with override_settings(HASHER_RAPIDO_PERMITIDO=False):
+            self.assertEqual([e.id for e in revisar_hasher_rapido(None)], ["api.E001"])
+            with self.assertRaises(ImproperlyConfigured):
+                MD5RapidoPasswordHasher().encode("clave", "sal")
+            sin_rapido = [h for h in settings.PASSWORD_HASHERS if h != settings.HASHER_RAPIDO]
+            with override_settings(PASSWORD_HASHERS=sin_rapido):
+                self.assertEqual(revisar_hasher_rapido(None), [])
+
+    def test_perfiles_de_settings(self):
+        def primer_hasher(perfil):
+            entorno = {**os.environ, "PASSWORD_HASHER": perfil, "DJANGO_SETTINGS_MODULE": "backend.settings"}
+            return subprocess.run(
+                [sys.executable, "-c",
+                 "from django.conf import settings; print(settings.PASSWORD_HASHERS[0])"],
+                env=entorno, capture_output=True, text=True, cwd=settings.BASE_DIR,
+            )
+
+        for perfil, hasher in (
+            ("pbkdf2", "django.contrib.auth.hashers.PBKDF2PasswordHasher"),
+            ("bcrypt", "api.hashers.BCryptSHA256PasswordHasher"),
+            ("argon2", "api.hashers.Argon2PasswordHasher"),
+        ):
+            with self.subTest(perfil=perfil):
+                self.assertEqual(primer_hasher(perfil).stdout.strip(), hasher)
+        resultado = primer_hasher("md5")
+        self.assertNotEqual(resultado.returncode, 0)
+        self.assertIn("PASSWORD_HASHER debe ser uno de", resultado.stderr)
+
+
+class CodigosRegistroTests(TestCase):
+    """Validez de los códigos: ``vigentes``/``purgables``, ``purge_codigos`` y ``/registro/``."""
+
+    def setUp(self):
+        ahora = timezone.now()
+        self.codigos = {}
+        for nombre, usado, expira_en in (
+            ("vigente", False, ahora + timedelta(days=1)),
+            ("usado", True, ahora + timedelta(days=1)),
+            ("vencido", False, ahora - timedelta(minutes=1)),
+            ("usado_vencido", True, ahora - timedelta(days=1)),
+        ):
+            persona = Persona.objects.create(nombres=nombre, apellidos="X", email=f"{nombre}@x.com")
+            self.codigos[nombre] = CodigoRegistro.objects.create(
+                persona=persona, usado=usado, expira_en=expira_en
+            )
+
+    def nombres(self, codigos):
+        return {c.persona.nombres for c in codigos.select_related("persona")}
+
+    def test_vigentes_y_purgables(self):
+        self.assertEqual(self.nombres(CodigoRegistro.objects.vigentes()), {"vigente"})
+        self.assertEqual(
+            self.nombres(CodigoRegistro.objects.purgables()), {"usado", "vencido", "usado_vencido"}
+        )
+        for codigo in self.codigos.values():
+            self.assertEqual(
+                CodigoRegistro.objects.vigentes().filter(pk=codigo.pk).exists(), codigo.es_valido()
+            )
+
+    def test_purge_codigos(self):
+        salida = StringIO()
+        call_command("purge_codigos", dry_run=True, stdout=salida)
+        self.assertIn("3 códigos usados o vencidos", salida.getvalue())
+        self.assertEqual(CodigoRegistro.objects.count(), 4)
+
+        salida = StringIO()
+        call_command("purge_codigos", batch_size=1, stdout=salida)
+        self.assertIn("3 códigos borrados", salida.getvalue())
+        self.assertEqual(self.nombres(CodigoRegistro.objects.all()), {"vigente"})
+        # Las personas no se tocan
+        self.assertEqual(Persona.objects.count(), 4)
+
+    def registrar(self, codigo, username="nuevo"):
+        return self.client.post(
+            "/registro/", {"codigo": str(codigo), "username": username, "password": "clave-123"},
+            content_type="application/json",
+        )
+
+    def test_registro_con_codigo_vigente(self):
+        response = self.registrar(self.codigos["vigente"].codigo)
+        self.assertEqual(response.status_code, 201, response.content)
+        persona = Persona.objects.get(email="vigente@x.com")
+        self.assertEqual(persona.user.username, "nuevo")
+        self.codigos["vigente"].refresh_from_db()
+        self.assertTrue(self.codigos["vigente"].usado)
+
+    def test_mensajes_de_codigo_no_valido(self):
+        persona = self.codigos["vigente"].persona
+        persona.user = User.objects.create_user("ya")
+        persona.save()
+        for codigo, mensaje in (
+            (uuid.uuid4(), "Código inválido"),
+            (self.codigos["usado"].codigo, "Código expirado o usado"),
+            (self.codigos["vencido"].codigo, "Código expirado o usado"),
+            (self.codigos["vigente"].codigo, "Esta persona ya tiene usuario"),
+        ):
+            with self.subTest(mensaje=mensaje):
+                response = self.registrar(codigo)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()["codigo"], [mensaje])
+
+
+class PersonasBorradoTests(TestCase):
+    """Borrar personas se lleva su usuario y perfil, en bloque o una a una."""
+
+    def setUp(self):
+        django_cache.clear()
+        self.admin = User.objects.create_user("admin")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+        self.usuarios = [User.objects.create_user(f"u{k}", password="clave-123") for k in range(2)]
+        PerfilUsuario.objects.create(user=self.usuarios[0])
+        self.personas = [
+            Persona.objects.create(nombres="P", apellidos=str(k), email=f"p{k}@x.com", user=user)
+            for k, user in enumerate([*self.usuarios, None])
+        ]
+
+    def autenticar(self, user):
+        """Cliente con el JWT de ``user`` y su usuario ya en caché."""
+        acceso = APIClient().post(
+            "/token/", {"username": user.username, "password": "clave-123"}, format="json"
+        ).json()["access"]
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {acceso}")
+        self.assertEqual(cliente.get("/api/personas/").status_code, 200)
+        self.assertIsNotNone(django_cache.get(_clave_usuario(user.pk)))
+        return cliente
+
+    def test_borrado_masivo(self):
+        cliente = self.autenticar(self.usuarios[0])
+        ids = [p.pk for p in self.personas] + [999999]
+        response = self.client.post("/api/personas/bulk-delete/", {"ids": ids}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"eliminadas": 3, "usuarios": 2})
+        self.assertFalse(Persona.objects.exists())
+        self.assertFalse(PerfilUsuario.objects.exists())
+        self.assertEqual(list(User.objects.values_list("username", flat=True)), ["admin"])
+        # El JWT del usuario borrado deja de autenticar
+        self.assertIsNone(django_cache.get(_clave_usuario(self.usuarios[0].pk)))
+        self.assertEqual(cliente.get("/api/personas/").status_code, 401)
+
+    def test_borrado_de_una_persona(self):
+        cliente = self.autenticar(self.usuarios[0])
+        self.personas[0].delete()
+        self.assertFalse(User.objects.filter(pk=self.usuarios[0].pk).exists())
+        self.assertFalse(PerfilUsuario.objects.exists())
+        self.assertEqual(cliente.get("/api/personas/").status_code, 401)
+
+        response = self.client.delete(f"/api/personas/{self.personas[1].pk}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(User.objects.filter(pk=self.usuarios[1].pk).exists())
+
+    def test_cuerpos_invalidos(self):
+        for datos in ({}, {"ids": "1"}, {"ids": ["1"]}, {"ids": [True]}, {"ids": [1.5]}, [1, 2]):
+            with self.subTest(datos=datos):
+                response = self.client.post("/api/personas/bulk-delete/", datos, format="json")
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("detail", response.json())
+        self.assertEqual(Persona.objects.count(), 3)
+
+    def test_requiere_autenticacion(self):
+        response = APIClient().post(
+            "/api/personas/bulk-delete/", {"ids": [self.personas[0].pk]}, format="json"
+        )
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(Persona.objects.count(), 3)
+
+
+class AutenticacionCacheTests(TestCase):
+    """``CachedJWTAuthentication``: usuario en caché e invalidado al cambiar."""
+
+    def setUp(self):
+        django_cache.clear()
+        self.user = User.objects.create_user("u", password="clave-123")
+        acceso = self.client.post(
+            "/token/", {"username": "u", "password": "clave-123"}, content_type="application/json"
+        ).json()["access"]
+        self.cliente = APIClient()
+        self.cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {acceso}")
+
+    def consultas_de_usuario(self):
+        with CaptureQueriesContext(connection) as ctx:
+            status = self.cliente.get("/api/personas/").status_code
+        # La lista de personas también hace JOIN con auth_user
+        origen = f'FROM {connection.ops.quote_name(User._meta.db_table)}'
+        return status, sum(origen in q["sql"] for q in ctx.captured_queries)
+
+    def test_segundo_request_no_busca_el_usuario(self):
+        self.assertEqual(self.consultas_de_usuario(), (200, 1))
+        self.assertEqual(self.consultas_de_usuario(), (200, 0))
+
+    @override_settings(AUTH_CACHE_TIMEOUT=0)
+    def test_sin_cache(self):
+        self.assertEqual(self.consultas_de_usuario(), (200, 1))
+        self.assertEqual(self.consultas_de_usuario(), (200, 1))
+
+    def test_desactivar_con_save(self):
+        self.consultas_de_usuario()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.consultas_de_usuario()[0], 401)
+
+    def test_la_cache_no_guarda_la_contrasena(self):
+        self.consultas_de_usuario()
+        entrada = django_cache.get(_clave_usuario(self.user.pk))
+        self.assertNotIn(self.user.password, repr(entrada))
+        self.assertNotIn("password", repr(entrada))
+
+        # Los campos que no están en la caché se leen de la BD al usarlos
+        User.objects.filter(pk=self.user.pk).update(email="u@x.com")
+        token = AccessToken.for_user(self.user)
+        with self.assertNumQueries(0):
+            user = CachedJWTAuthentication().get_user(token)
+            self.assertEqual((user.pk, user.username, user.is_active), (self.user.pk, "u", True))
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, "u@x.com")
+
+    def test_cambio_de_contrasena_revoca_el_token(self):
+        # override_settings(SIMPLE_JWT=…) reemplaza api_settings solo en el
+        # módulo de simplejwt: se cambia el objeto que ya importaron todos
+        with mock.patch.object(autenticacion.api_settings, "CHECK_REVOKE_TOKEN", True):
+            self.cliente.credentials(
+                HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+            )
+            self.assertEqual(self.consultas_de_usuario(), (200, 1))
+            self.assertEqual(self.consultas_de_usuario(), (200, 0))
+            self.user.set_password("otra-clave-456")
+            self.user.save()
+            self.assertEqual(self.consultas_de_usuario()[0], 401)
+
+    def test_cambios_masivos_requieren_invalidar(self):
+        self.consultas_de_usuario()
+        # update() no envía señales: el usuario en caché sigue activo
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.consultas_de_usuario(), (200, 0))
+        invalidar_usuarios(self.user.pk)
+        self.assertEqual(self.consultas_de_usuario()[0], 401)
+
+
+class MetricasAccesoTests(TestCase):
+    """``/metrics`` no se sirve sin token ni sesión de staff."""
+
+    def test_sin_token_configurado_solo_staff(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.client.force_login(User.objects.create_user("comun"))
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.client.force_login(User.objects.create_user("admin", is_staff=True))
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+    @override_settings(METRICAS_TOKEN="secreto")
+    def test_con_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.assertEqual(
+            self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer otro").status_code, 403
+        )
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secreto")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"api_request_duration_seconds", response.content)
+
+
+class ImportacionTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        jerarquia.descartar()
+        self.addCleanup(jerarquia.descartar)
+        Categoria.objects.create(nombre="Finanzas")
+
+    def importar(self, texto, **kwargs):
+        return importar_indicadores(BytesIO(texto.encode()), "indicadores.csv", **kwargs)
+
+    def test_importa_con_codigos_padres_y_rollup(self):
+        resumen = self.importar(
+            "n,indicador,metodo_q,ene_r,categorias,padres\n"
+            "R,Raíz,SUMA,,Finanzas,\n"
+            ",Hijo 1,SUMA,2,,R\n"
+            ",Hijo 2,SUMA,3,,R\n"
+            ",Malo,SUMA,no-es-numero,,\n",
+            batch_size=2,
+        )
+        self.assertEqual((resumen["creados"], resumen["total_errores"]), (3, 1))
+        self.assertEqual(resumen["errores"][0]["fila"], 5)
+
+        raiz = Indicador.objects.get(n="R")
+        self.assertEqual(raiz.ene_r, 5)
+        self.assertEqual(list(raiz.categorias.values_list("nombre", flat=True)), ["Finanzas"])
+        hijos = Indicador.objects.exclude(n="R").order_by("id")
+        codigos = [int(i.n) for i in hijos]
+        self.assertEqual(codigos, [codigos[0], codigos[0] + 1])
+
+    def test_codigos_reservados_fuera_de_la_transaccion(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.importar("indicador,ene_r\nUno,1\nDos,2\nTres,3\n", batch_size=2)
+        # Profundidad de savepoints al reservar: la secuencia nunca queda
+        # bloqueada dentro de la transacción de un lote
+        profundidad, reservas = 0, []
+        for consulta in consultas.captured_queries:
+            sql = consulta["sql"]
+            if sql.startswith("SAVEPOINT"):
+                profundidad += 1
+            elif sql.startswith("RELEASE SAVEPOINT"):
+                profundidad -= 1
+            elif "api_secuencia" in sql:
+                reservas.append(profundidad)
+        self.assertEqual(reservas, [0, 0])
+
+    def test_lee_el_archivo_por_lotes(self):
+        insertados = []
+
+        def filas():
+            for k in range(7):
+                # Antes de leer la fila k ya se insertaron los lotes completos
+                insertados.append(Indicador.objects.count())
+                yield {"indicador": f"I{k}", "ene_r": str(k)}
+
+        resumen = Importador(batch_size=3).importar(filas())
+        self.assertEqual(resumen["creados"], 7)
+        self.assertEqual(insertados, [0, 0, 0, 3, 3, 3, 6])
+
+
+class ExportacionTests(TestCase):
+    """Exportación CSV / XLSX / Parquet por el endpoint y el comando."""
+
+    # En el orden de las columnas del serializer
+    CAMPOS = "n,indicador,anio,categorias,ene_r,actualizado_en,padres"
+
+    def setUp(self):
+        django_cache.clear()
+        jerarquia.descartar()
+        self.addCleanup(jerarquia.descartar)
+        self.c1 = Categoria.objects.create(nombre="Finanzas")
+        c2 = Categoria.objects.create(nombre="Clientes")
+        self.a = Indicador.objects.create(n="A", indicador="Ventas", anio=2025, ene_r=1.5)
+        self.b = Indicador.objects.create(n="B", indicador="Margen", anio=2025, ene_r=2)
+        otro = Indicador.objects.create(n="C", indicador="NPS", anio=2025)
+        with self.captureOnCommitCallbacks(execute=True):
+            IndicadorRel.objects.create(indicador_padre=self.a, indicador_hijo=self.b)
+        self.a.categorias.add(self.c1)
+        self.b.categorias.add(self.c1, c2)
+        otro.categorias.add(c2)
+
+    def exportar(self, formato, **params):
+        params = {"formato": formato, "fields": self.CAMPOS, "categoria": self.c1.pk, **params}
+        response = APIClient().get("/api/indicadores/exportar/", params)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def leer_csv(self, contenido):
+        return list(csv.reader(StringIO(contenido.decode("utf-8-sig"))))
+
+    def leer_xlsx(self, contenido):
+        import openpyxl
+
+        libro = openpyxl.load_workbook(BytesIO(contenido), read_only=True)
+        return [list(fila) for fila in libro.active.iter_rows(values_only=True)]
+
+    def comprobar(self, filas):
+        """Cabecera y filas de ``categoria=Finanzas`` con ``CAMPOS``."""
+        cabecera, *datos = filas
+        self.assertEqual(cabecera, self.CAMPOS.split(","))
+        self.assertEqual(len(datos), 2)
+        return [dict(zip(cabecera, fila)) for fila in datos]
+
+    def test_csv(self):
+        a, b = self.comprobar(self.leer_csv(self.exportar("csv")))
+        self.assertEqual(
+            (a["n"], a["anio"], a["ene_r"], a["categorias"], a["padres"]),
+            ("A", "2025", "1.5", "Finanzas", ""),
+        )
+        self.assertEqual((b["categorias"], b["padres"]), ("Finanzas;Clientes", "A"))
+        self.assertTrue(a["actualizado_en"].startswith(str(timezone.localdate().year)))
+
+    def test_xlsx(self):
+        a, b = self.comprobar(self.leer_xlsx(self.exportar("xlsx")))
+        self.assertEqual((a["anio"], a["ene_r"], b["padres"]), (2025, 1.5, "A"))
+        self.assertIsInstance(a["actualizado_en"], datetime)
+
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+
+        tabla = pq.read_table(BytesIO(self.exportar("parquet")))
+        self.assertEqual(tabla.num_rows, 2)
+        tipos = {campo.name: str(campo.type) for campo in tabla.schema}
+        self.assertEqual(tipos, {
+            "n": "string", "indicador": "string", "anio": "int64", "ene_r": "double",
+            "actualizado_en": "timestamp[us, tz=UTC]", "categorias": "string", "padres": "string",
+        })
+        self.assertEqual(tabla.column("ene_r").to_pylist(), [1.5, 2])
+
+    def test_omit_y_sin_filtros(self):
+        cabecera, *datos = self.leer_csv(self.exportar("csv", fields="", categoria="", omit="padres"))
+        self.assertEqual(len(datos), 3)
+        self.assertNotIn("padres", cabecera)
+        self.assertIn("dic_o", cabecera)
+
+    def test_formato_desconocido(self):
+        response = APIClient().get("/api/indicadores/exportar/", {"formato": "pdf"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_reimportar_el_csv(self):
+        contenido = self.exportar("csv", fields="n,indicador,ene_r,categorias,padres")
+        Indicador.objects.all().delete()
+        resumen = importar_indicadores(BytesIO(contenido), "indicadores.csv")
+        self.assertEqual((resumen["creados"], resumen["total_errores"]), (2, 0))
+        b = Indicador.objects.get(n="B")
+        self.assertEqual(list(b.padres.values_list("indicador_padre__n", flat=True)), ["A"])
+        self.assertEqual(Indicador.objects.get(n="A").ene_r, 2)  # rollup del hijo
+
+    def test_comando(self):
+        import pyarrow.parquet as pq
+
+        with tempfile.TemporaryDirectory() as carpeta:
+            for formato in ("csv", "xlsx", "parquet"):
+                with self.subTest(formato=formato):
+                    salida = os.path.join(carpeta, f"indicadores.{formato}")
+                    call_command(
+                        "export_indicadores", salida, fields=self.CAMPOS,
+                        categoria=str(self.c1.pk), chunk_size=1, stdout=StringIO(),
+                    )
+                    with open(salida, "rb") as archivo:
+                        contenido = archivo.read()
+                    if formato == "parquet":
+                        tabla = pq.read_table(BytesIO(contenido))
+                        self.assertEqual((tabla.num_rows, tabla.column_names), (2, self.CAMPOS.split(",")))
+                    else:
+                        leer = self.leer_csv if formato == "csv" else self.leer_xlsx
+                        self.comprobar(leer(contenido))
+
+
+# ============================================================
+#   R O L L U P
+# ============================================================
+def _reducir(valores, metodo):
+    """Como el ``save()`` original: ignora None, PROMEDIO o SUMA."""
+    valores = [v for v in valores if v is not None]
+    if not valores:
+        return None
+    return sum(valores) / len(valores) if metodo == "PROMEDIO" else sum(valores)
+
+
+def calculo_original(meses, metodo):
+    """Trimestres y año a la fecha fila por fila, como antes de NumPy."""
+    campos = {}
+    for t in ("r", "o"):
+        for q in range(4):
+            campos[f"q{q + 1}_{t}"] = _reducir(
+                [meses[f"{m}_{t}"] for m in MESES[3 * q:3 * q + 3]], metodo
+            )
+    ano = _reducir([meses[f"{m}_r"] for m in MESES], metodo)
+    campos["ano_a_la_fecha"] = None if ano is None else round(ano, 2)
+    return campos
+
+
+def cascada_original(hojas, hijos_de, metodos):
+    """
+    Estado final de la cascada recursiva de ``save()``: cada padre con el
+    agregado de sus hijos (en orden de relación) y sus trimestres.
+    """
+    resultado = {}
+
+    def calcular(nodo):
+        if nodo not in resultado:
+            if hijos_de.get(nodo):
+                hijos = [calcular(h) for h in hijos_de[nodo]]
+                meses = {c: _reducir([h[c] for h in hijos], metodos[nodo]) for c in CAMPOS_MES}
+            else:
+                meses = dict(hojas[nodo])
+            resultado[nodo] = {**meses, **calculo_original(meses, metodos[nodo])}
+        return resultado[nodo]
+
+    for nodo in metodos:
+        calcular(nodo)
+    return resultado
+
+
+class AgregacionParidadTests(TestCase):
+    """El núcleo NumPy da exactamente lo mismo que el cálculo en Python."""
+
+    def test_trimestres_y_ano_iguales_al_calculo_original(self):
+        rnd = random.Random(0)
+        indicadores = []
+        for k in range(60):
+            meses = {
+                c: None if rnd.random() < 0.3 else round(rnd.uniform(-50, 500), rnd.choice([0, 1, 3]))
+                for c in CAMPOS_MES
+            }
+            if k % 10 == 0:
+                meses = dict.fromkeys(CAMPOS_MES)  # fila sin datos
+            indicadores.append(Indicador(metodo_q=rnd.choice(["PROMEDIO", "SUMA"]), **meses))
+
+        recalcular(indicadores)
+        for indicador in indicadores:
+            meses = {c: getattr(indicador, c) for c in CAMPOS_MES}
+            esperado = calculo_original(meses, indicador.metodo_q)
+            obtenido = {c: getattr(indicador, c) for c in [*CAMPOS_Q, "ano_a_la_fecha"]}
+            self.assertEqual(obtenido, esperado)
+
+
+class ArbolTests(TestCase):
+    """
+    ``/api/indicadores/tree/`` sobre:
+
+        R ─┬─ A ─┬─ a1        X ─ Y
+           │     └─ a2
+           └─ B ─── a2
+
+    con A y a1 en la categoría ``c``.
+    """
+
+    def setUp(self):
+        django_cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("admin"))
+        self.ind = {
+            nombre: Indicador.objects.create(indicador=nombre)
+            for nombre in ("R", "A", "B", "a1", "a2", "X", "Y")
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            for padre, hijo in [("R", "A"), ("R", "B"), ("A", "a1"), ("A", "a2"), ("B", "a2"), ("X", "Y")]:
+                IndicadorRel.objects.create(indicador_padre=self.ind[padre], indicador_hijo=self.ind[hijo])
+        self.c = Categoria.objects.create(nombre="c")
+        self.c.indicadores.add(self.ind["A"], self.ind["a1"])
+
+    def arbol(self, **params):
+        response = self.client.get("/api/indicadores/tree/", params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def nombres(self, nodos):
+        return [(n["indicador"], self.nombres(n["hijos"])) if n["hijos"] else n["indicador"] for n in nodos]
+
+    def test_anidado_completo(self):
+        self.assertEqual(self.nombres(self.arbol()), [
+            ("R", [("A", ["a1", "a2"]), ("B", ["a2"])]),
+            ("X", ["Y"]),
+        ])
+
+    def test_raiz_y_profundidad(self):
+        self.assertEqual(self.nombres(self.arbol(root=self.ind["A"].id)), [("A", ["a1", "a2"])])
+        self.assertEqual(self.nombres(self.arbol(root=self.ind["R"].id, depth=1)), [("R", ["A", "B"])])
+        self.assertEqual(self.nombres(self.arbol(root=self.ind["R"].id, depth=0)), ["R"])
+
+    def test_raiz_inexistente(self):
+        response = self.client.get("/api/indicadores/tree/", {"root": 999999})
+        self.assertEqual(response.status_code, 404)
+
+    def test_raiz_limita_las_consultas(self):
+        consultas = arbol.consultas_arbol(raiz=self.ind["A"].id)
+        subarbol = {self.ind[n].id for n in ("A", "a1", "a2")}
+        self.assertEqual({f["id"] for f in consultas["indicadores"]}, subarbol)
+        self.assertEqual(
+            set(consultas["relaciones"]),
+            {(self.ind["A"].id, self.ind["a1"].id), (self.ind["A"].id, self.ind["a2"].id)},
+        )
+        self.assertEqual(
+            set(consultas["enlaces"]),
+            {(self.ind["A"].id, self.c.id), (self.ind["a1"].id, self.c.id)},
+        )
+
+    def test_categoria(self):
+        data = self.arbol(categoria=self.c.id)
+        self.assertEqual(self.nombres(data), [("A", ["a1"])])
+        self.assertEqual(data[0]["categorias"], [self.c.id])
+
+    def test_adyacencia(self):
+        ids = {pk: nombre for nombre, pk in ((n, i.id) for n, i in self.ind.items())}
+        data = self.arbol(formato="adyacencia", root=self.ind["R"].id, depth=1)
+        self.assertEqual([ids[pk] for pk in data["raices"]], ["R"])
+        self.assertEqual(
+            {ids[n["id"]]: [ids[h] for h in n["hijos"]] for n in data["nodos"]},
+            {"R": ["A", "B"], "A": [], "B": []},
+        )
+
+        # Sin raíz, cada indicador una sola vez aunque tenga dos padres
+        data = self.arbol(formato="adyacencia")
+        self.assertEqual([ids[pk] for pk in data["raices"]], ["R", "X"])
+        self.assertEqual(len(data["nodos"]), 7)
+        self.assertEqual(
+            {ids[n["id"]]: [ids[h] for h in n["hijos"]] for n in data["nodos"]}["B"], ["a2"]
+        )
+
+    def test_formato_invalido(self):
+        response = self.client.get("/api/indicadores/tree/", {"formato": "xml"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("formato", response.json())
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class VistasAsyncTests(TransactionTestCase):
+    """
+    Las vistas async responden lo mismo que las sync. Consultan en otros
+    hilos con otras conexiones, que no ven datos sin confirmar: de ahí
+    ``TransactionTestCase``.
+    """
+
+    def setUp(self):
+        django_cache.clear()
+        jerarquia.descartar()
+        self.addCleanup(jerarquia.descartar)
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create_user("admin"))
+
+        self.bsc = BSC.objects.create(nombre="BSC")
+        ventas = Categoria.objects.create(nombre="Ventas")
+        calidad = Categoria.objects.create(nombre="Calidad")
+        self.bsc.categorias.add(ventas, calidad)
+        self.padre = Indicador.objects.create(indicador="Total", ene_r=10, ene_o=8, feb_r=6, feb_o=9)
+        hijos = [
+            Indicador.objects.create(indicador="Quejas", condicion="MENOR", ene_r=3, ene_o=5),
+            Indicador.objects.create(indicador="Sin datos"),
+        ]
+        for hijo in hijos:
+            IndicadorRel.objects.create(indicador_padre=self.padre, indicador_hijo=hijo)
+        ventas.indicadores.add(self.padre, hijos[0])
+        calidad.indicadores.add(*hijos)
+        resumenes.reconstruir()
+
+    def get(self, url, **params):
+        sync = self.api.get(f"/api/{url}", params)
+        asincrona = self.api.get(f"/api/async/{url}", params)
+        self.assertEqual(sync.status_code, asincrona.status_code)
+        return sync, asincrona
+
+    def test_dashboard_igual_al_sync(self):
+        sync, asincrona = self.get(f"bsc/{self.bsc.id}/dashboard/")
+        self.assertEqual(sync.status_code, 200)
+        self.assertEqual(asincrona.json(), sync.json())
+        self.assertEqual(sync.json()["resumen"]["total"], 3)
+
+    def test_tree_igual_al_sync(self):
+        for params in ({}, {"root": self.padre.id, "depth": 1}, {"formato": "adyacencia"}):
+            with self.subTest(**params):
+                sync, asincrona = self.get("indicadores/tree/", **params)
+                self.assertEqual(sync.status_code, 200)
+                self.assertEqual(asincrona.json(), sync.json())
+
+    def test_no_encontrado(self):
+        sync, asincrona = self.get(f"bsc/{self.bsc.id + 1000}/dashboard/")
+        self.assertEqual(sync.status_code, 404)
+        sync, asincrona = self.get("indicadores/tree/", root=999999)
+        self.assertEqual(sync.status_code, 404)
+
+    def test_sin_resumenes_calcula_con_los_meses(self):
+        con_resumenes = self.api.get(f"/api/bsc/{self.bsc.id}/dashboard/").json()
+        Resumen.objects.all().delete()
+        with mock.patch("api.dashboard.evaluar", wraps=dashboard.evaluar) as evaluar:
+            sync, asincrona = self.get(f"bsc/{self.bsc.id}/dashboard/")
+        self.assertEqual(evaluar.call_count, 2)
+        self.assertEqual(sync.json(), con_resumenes)
+        self.assertEqual(asincrona.json(), con_resumenes)
+
+
+class RollupArbolTests(TestCase):
+    """
+    Árbol de tres niveles con métodos mixtos y meses vacíos:
+
+        R (PROMEDIO) ─┬─ A (SUMA) ─┬─ a1
+                      │            └─ a2
+                      └─ B (hoja, PROMEDIO)
+    """
+
+    def setUp(self):
+        django_cache.clear()
+        jerarquia.descartar()
+        self.addCleanup(jerarquia.descartar)
+        self.a1 = Indicador.objects.create(indicador="a1", metodo_q="SUMA", ene_r=1, feb_r=2, ene_o=10)
+        self.a2 = Indicador.objects.create(indicador="a2", metodo_q="SUMA", ene_r=3)
+        self.b = Indicador.objects.create(indicador="B", metodo_q="PROMEDIO", ene_r=6, feb_r=4, ene_o=20)
+        self.a = Indicador.objects.create(indicador="A", metodo_q="SUMA")
+        self.r = Indicador.objects.create(indicador="R", metodo_q="PROMEDIO")
+        with self.captureOnCommitCallbacks(execute=True):
+            for padre, hijo in [(self.a, self.a1), (self.a, self.a2), (self.r, self.a), (self.r, self.b)]:
+                IndicadorRel.objects.create(indicador_padre=padre, indicador_hijo=hijo)
+        # Un save de una hoja propaga a todos sus ancestros
+        self.a1.save()
+
+    def valores(self, indicador, *campos):
+        indicador.refresh_from_db()
+        return tuple(getattr(indicador, c) for c in campos)
+
+    def test_valores_calculados_a_mano(self):
+        campos = ("ene_r", "feb_r", "mar_r", "ene_o", "q1_r", "q2_r", "ano_a_la_fecha")
+        self.assertEqual(self.valores(self.a, *campos), (4, 2, None, 10, 6, None, 6))
+        self.assertEqual(self.valores(self.r, *campos), (5, 3, None, 15, 4, None, 4))
+        self.assertEqual(self.valores(self.b, "q1_r", "ano_a_la_fecha"), (5, 5))
+
+    def test_mes_que_queda_vacio(self):
+        self.a2.ene_r = None
+        self.a2.save()
+        self.assertEqual(self.valores(self.a, "ene_r", "q1_r"), (1, 3))
+        self.assertEqual(self.valores(self.r, "ene_r", "q1_r"), (3.5, 3.25))
+
+        self.a1.ene_r = self.a1.feb_r = None
+        self.a1.save()
+        # A sin ningún valor en ene / feb: R promedia solo a B
+        self.assertEqual(self.valores(self.a, "ene_r", "feb_r", "ano_a_la_fecha"), (None, None, None))
+        self.assertEqual(self.valores(self.r, "ene_r", "feb_r"), (6, 4))
+
+    def test_igual_a_la_cascada_recursiva(self):
+        rnd = random.Random(1)
+        # Segundo árbol más profundo bajo R: c1 → c2 → {c3, c4}
+        anterior = self.r
+        for nombre in ("c1", "c2"):
+            nodo = Indicador.objects.create(indicador=nombre, metodo_q=rnd.choice(["PROMEDIO", "SUMA"]))
+            with self.captureOnCommitCallbacks(execute=True):
+                IndicadorRel.objects.create(indicador_padre=anterior, indicador_hijo=nodo)
+            anterior = nodo
+        for nombre in ("c3", "c4"):
+            meses = {c: None if rnd.random() < 0.4 else rnd.randint(0, 99) / 4 for c in CAMPOS_MES}
+            hoja = Indicador.objects.create(indicador=nombre, metodo_q="SUMA", **meses)
+            with self.captureOnCommitCallbacks(execute=True):
+                IndicadorRel.objects.create(indicador_padre=anterior, indicador_hijo=hoja)
+            hoja.save()
+
+        hijos_de = {}
+        for padre, hijo in IndicadorRel.objects.order_by("id").values_list(
+            "indicador_padre_id", "indicador_hijo_id"
+        ):
+            hijos_de.setdefault(padre, []).append(hijo)
+        todos = {i.pk: i for i in Indicador.objects.all()}
+        hojas = {
+            pk: {c: getattr(i, c) for c in CAMPOS_MES}
+            for pk, i in todos.items() if pk not in hijos_de
+        }
+        esperado = cascada_original(hojas, hijos_de, {pk: i.metodo_q for pk, i in todos.items()})
+
+        for pk, indicador in todos.items():
+            with self.subTest(indicador=indicador.indicador):
+                obtenido = {c: getattr(indicador, c) for c in esperado[pk]}
+                self.assertEqual(obtenido, esperado[pk])
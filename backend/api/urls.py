@@ -4,11 +4,13 @@ from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
+from . import vistas_async
 from .views import (
     IndicadorViewSet,
     CategoriaViewSet,
     IndicadorRelViewSet,
     BSCViewSet,
+    ResumenViewSet,
     RegistroUsuarioView,
     PersonaViewSet,
     CodigoRegistroViewSet
@@ -19,6 +21,7 @@ router.register(r"indicadores", IndicadorViewSet)
 router.register(r"categorias", CategoriaViewSet)
 router.register(r"indicadores-rel", IndicadorRelViewSet)
 router.register(r"bsc", BSCViewSet)
+router.register(r"resumenes", ResumenViewSet)
 router.register(r"personas", PersonaViewSet)
 router.register(r"codigos", CodigoRegistroViewSet)
 
@@ -26,6 +29,8 @@ urlpatterns = router.urls
 
 urlpatterns = [
     path("api/", include(router.urls)),
+    path("api/async/bsc/<int:pk>/dashboard/", vistas_async.bsc_dashboard),
+    path("api/async/indicadores/tree/", vistas_async.indicadores_tree),
     path("registro/", RegistroUsuarioView.as_view()),
     path("token/", TokenObtainPairView.as_view()),
     path("token/refresh/", TokenRefreshView.as_view()),
@@ -1,10 +1,36 @@
+from django.contrib.auth.models import User
+from django.db.models import Exists, OuterRef, Prefetch
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from rest_framework import viewsets
-from .models import Indicador, Categoria, IndicadorRel, BSC, CodigoRegistro, Persona
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from .models import Indicador, Categoria, IndicadorRel, BSC, CodigoRegistro, Persona, Resumen, RollupPendiente
+from . import arbol, series
+from .cache import CacheRespuestaMixin, MODELOS
+from .dashboard import dashboard_bsc
+from .exportacion import (
+    FORMATOS,
+    FormatoNoDisponible,
+    exportar_a_archivo,
+    generar_csv,
+    iterar_filas,
+    queryset_exportacion,
+    resolver_columnas,
+)
+from .importacion import importar_indicadores, leer_filas
+from .masivo import aplicar_parches
+from .metricas import MetricasMixin
+from .pagination import IdCursorPagination
+from .preregistro import escribir_csv, preregistrar
 from .serializers import (
+    campos_solicitados,
     IndicadorSerializer,
     CategoriaSerializer,
     IndicadorRelSerializer,
     BSCSerializer,
+    ResumenSerializer,
     RegistroUsuarioSerializer,
     PersonaSerializer,
     CodigoRegistroSerializer,
@@ -15,44 +41,303 @@ from rest_framework import status
 from rest_framework.permissions import AllowAny, IsAuthenticated
 
 
-class IndicadorViewSet(viewsets.ModelViewSet):
-    queryset = Indicador.objects.all().prefetch_related(
-        "categorias", "hijos__indicador_hijo", "padres__indicador_padre"
-    ).order_by("id")
+class IndicadorViewSet(MetricasMixin, CacheRespuestaMixin, viewsets.ModelViewSet):
+    queryset = Indicador.objects.all().order_by("id")
     serializer_class = IndicadorSerializer
     permission_classes = [AllowAny]
+    pagination_class = IdCursorPagination
+
+    # Prefetch necesario para cada campo relacionado del serializer
+    PREFETCH_POR_CAMPO = {
+        "categorias": "categorias",
+        "categorias_detalle": "categorias__bscs",
+        "hijos": "hijos",
+        "padres": "padres",
+    }
+
+    @staticmethod
+    def _prefetch(nombre):
+        # Relaciones con solo las columnas que usan get_hijos / get_padres
+        if nombre == "hijos":
+            return Prefetch("hijos", queryset=IndicadorRel.objects.select_related(
+                "indicador_hijo"
+            ).only(
+                "indicador_padre_id", "indicador_hijo__n", "indicador_hijo__indicador"
+            ).order_by("id"))
+        if nombre == "padres":
+            return Prefetch("padres", queryset=IndicadorRel.objects.select_related(
+                "indicador_padre"
+            ).only(
+                "indicador_hijo_id", "indicador_padre__n", "indicador_padre__indicador"
+            ).order_by("id"))
+        return nombre
 
     def get_queryset(self):
         qs = super().get_queryset()
+        campos = campos_solicitados(
+            self.request, IndicadorSerializer.Meta.fields
+        )
+        if campos is None:
+            campos = IndicadorSerializer.Meta.fields
+        else:
+            # Solo las columnas que se van a serializar
+            columnas = {f.name for f in Indicador._meta.concrete_fields}
+            # metodo_q hace falta para recalcular trimestres con ?anio=
+            qs = qs.only("id", "metodo_q", *[c for c in campos if c in columnas])
+
+        prefetch = {self.PREFETCH_POR_CAMPO[c] for c in campos if c in self.PREFETCH_POR_CAMPO}
+        qs = qs.prefetch_related(*[self._prefetch(p) for p in sorted(prefetch)])
+
+        if "rollup_pending" in campos:
+            qs = qs.annotate(rollup_pending=Exists(
+                RollupPendiente.objects.filter(indicador=OuterRef("pk"))
+            ))
+
+        anio = self._anio()
+        if anio is not None:
+            # Cada indicador puede estar abierto en otro año: siempre desde la serie
+            qs = qs.prefetch_related(series.prefetch_anio(anio))
+
         categoria_id = self.request.query_params.get("categoria")
         if categoria_id:
             qs = qs.filter(categorias__id=categoria_id)
+
+        ancestro = self.request.query_params.get("descendiente_de")
+        if ancestro:
+            try:
+                qs = qs.descendientes_de(int(ancestro))
+            except ValueError:
+                raise ValidationError({"descendiente_de": ["Debe ser un id de indicador"]})
         return qs
 
+    def _anio(self, parametro="anio", defecto=None):
+        valor = self.request.query_params.get(parametro)
+        if not valor:
+            return defecto
+        try:
+            anio = int(valor)
+        except ValueError:
+            anio = 0
+        if not 1 <= anio <= 9999:
+            raise ValidationError({parametro: ["Año inválido"]})
+        return anio
+
+    @action(detail=True, methods=["get"])
+    def historico(self, request, pk=None):
+        """
+        Serie mensual entre ``?desde=`` y ``?hasta=`` (años, inclusive);
+        ``?tipo=R|O`` limita a resultados u objetivos.
+        """
+        def vista(request, pk):
+            indicador = get_object_or_404(Indicador.objects.only("id"), pk=pk)
+            hasta = self._anio("hasta", series.anio_vigente())
+            desde = self._anio("desde", hasta)
+            tipo = request.query_params.get("tipo", "").upper() or None
+            if tipo not in (None, "R", "O"):
+                raise ValidationError({"tipo": ["Debe ser R u O"]})
+            return Response({
+                "id": indicador.id,
+                "desde": desde,
+                "hasta": hasta,
+                "valores": series.historico(indicador.id, desde, hasta, tipo),
+            })
+
+        return self.respuesta_cacheada(request, vista, pk=pk)
+
+    @action(detail=False, methods=["get"], url_path="tree")
+    def tree(self, request):
+        """
+        Jerarquía completa armada en el servidor (ver ``arbol.py``).
+        ``?root=`` parte de un indicador, ``?depth=`` limita los niveles,
+        ``?categoria=`` filtra y ``?formato=anidado|adyacencia``.
+        """
+        def vista(request):
+            opciones = arbol.leer_parametros(request.query_params)
+            consultas = arbol.consultas_arbol(opciones.pop("categoria"), opciones["raiz"])
+            data = arbol.componer(*(list(consultas[k]) for k in arbol.CONSULTAS), **opciones)
+            if data is None:
+                raise NotFound()
+            return Response(data)
+
+        return self.respuesta_cacheada(request, vista)
+
+    @action(detail=False, methods=["get"], url_path="exportar")
+    def exportar(self, request):
+        """
+        Exporta en ``?formato=csv|xlsx|parquet`` (por defecto CSV).
+        Respeta ``?categoria=`` y ``?fields=`` / ``?omit=``.
+        """
+        formato = request.query_params.get("formato", "csv").lower()
+        if formato not in FORMATOS:
+            return Response(
+                {"detail": f"Formato no soportado: {formato}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        columnas = resolver_columnas(request)
+        filas = iterar_filas(
+            queryset_exportacion(columnas, request.query_params.get("categoria")),
+            columnas,
+        )
+        content_type, extension = FORMATOS[formato]
+        nombre = f"indicadores.{extension}"
+
+        if formato == "csv":
+            response = StreamingHttpResponse(generar_csv(columnas, filas), content_type=content_type)
+            response["Content-Disposition"] = f'attachment; filename="{nombre}"'
+            return response
+
+        try:
+            archivo = exportar_a_archivo(formato, columnas, filas)
+        except FormatoNoDisponible as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return FileResponse(archivo, as_attachment=True, filename=nombre, content_type=content_type)
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        """
+        Parches masivos: ``[{"id": 1, "ene_r": 10.5}, …]``.
+        Responde con los ids actualizados y los errores por fila.
+        """
+        if not isinstance(request.data, list):
+            return Response(
+                {"detail": "Se esperaba una lista de parches"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-class CategoriaViewSet(viewsets.ModelViewSet):
+        actualizados, recalculados, errores = aplicar_parches(request.data)
+        return Response({
+            "actualizados": actualizados,
+            "recalculados": recalculados,
+            "errores": errores,
+        })
+
+    @action(
+        detail=False, methods=["post"], url_path="importar",
+        parser_classes=[MultiPartParser, FormParser],
+    )
+    def importar(self, request):
+        """Importa un CSV / XLSX enviado en el campo ``archivo``."""
+        archivo = request.FILES.get("archivo")
+        if archivo is None:
+            return Response(
+                {"detail": "Debe adjuntar un archivo"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            batch_size = int(request.data.get("batch_size", 1000))
+        except (TypeError, ValueError):
+            batch_size = 1000
+
+        resumen = importar_indicadores(archivo, archivo.name, max(batch_size, 1))
+        return Response(resumen, status=status.HTTP_201_CREATED)
+
+
+class CategoriaViewSet(MetricasMixin, CacheRespuestaMixin, viewsets.ModelViewSet):
+    cache_modelos = ("categoria", "bsc")
     queryset = Categoria.objects.all().prefetch_related("bscs").order_by("nombre")
     serializer_class = CategoriaSerializer
     permission_classes = [AllowAny]
 
 
-class IndicadorRelViewSet(viewsets.ModelViewSet):
+class IndicadorRelViewSet(MetricasMixin, viewsets.ModelViewSet):
     queryset = IndicadorRel.objects.all()
     serializer_class = IndicadorRelSerializer
     permission_classes = [AllowAny]
 
 
-class BSCViewSet(viewsets.ModelViewSet):
-    queryset = BSC.objects.all().prefetch_related("categorias").order_by("nombre")
+class BSCViewSet(MetricasMixin, CacheRespuestaMixin, viewsets.ModelViewSet):
+    cache_modelos = ("categoria", "bsc")
+    queryset = BSC.objects.all().prefetch_related("categorias__bscs").order_by("nombre")
     serializer_class = BSCSerializer
     permission_classes = [AllowAny]
 
-class PersonaViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=["get"])
+    def dashboard(self, request, pk=None):
+        """Categorías del BSC, sus indicadores y el cumplimiento R vs O."""
+        def vista(request, pk):
+            return Response(dashboard_bsc(get_object_or_404(BSC, pk=pk)))
+
+        return self.respuesta_cacheada(request, vista, pk=pk, modelos=MODELOS)
+
+class ResumenViewSet(MetricasMixin, CacheRespuestaMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Resúmenes materializados. Filtros: ``?alcance=``, ``?alcance_id=`` y
+    ``?periodo=`` (cada combinación completa es una búsqueda por índice).
+    """
+    queryset = Resumen.objects.all()
+    serializer_class = ResumenSerializer
+    permission_classes = [AllowAny]
+    pagination_class = IdCursorPagination
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        params = self.request.query_params
+        if params.get("alcance"):
+            qs = qs.filter(alcance=params["alcance"].upper())
+        if params.get("alcance_id"):
+            qs = qs.filter(alcance_id=params["alcance_id"])
+        if params.get("periodo"):
+            qs = qs.filter(periodo=params["periodo"].upper())
+        return qs
+
+class PersonaViewSet(MetricasMixin, viewsets.ModelViewSet):
     queryset = Persona.objects.select_related("user", "codigo_registro").all().order_by("-creado_en")
     serializer_class = PersonaSerializer
     permission_classes = [IsAuthenticated]
 
-class CodigoRegistroViewSet(viewsets.ModelViewSet):
+    @action(
+        detail=False, methods=["post"], url_path="bulk",
+        parser_classes=[JSONParser, MultiPartParser, FormParser],
+    )
+    def bulk(self, request):
+        """
+        Pre-registro masivo: lista JSON ``[{"nombres", "apellidos",
+        "email"}, …]`` o un CSV / XLSX en el campo ``archivo``. Crea las
+        personas nuevas y (re)genera los códigos de registro; con
+        ``?formato=csv`` responde con el CSV de códigos.
+        """
+        archivo = request.FILES.get("archivo")
+        if archivo is not None:
+            filas = leer_filas(archivo, archivo.name)
+        elif isinstance(request.data, list) and all(isinstance(f, dict) for f in request.data):
+            filas = request.data
+        else:
+            return Response(
+                {"detail": "Se esperaba una lista de personas o un archivo"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        resumen = preregistrar(filas)
+        if request.query_params.get("formato", "").lower() == "csv":
+            response = HttpResponse(content_type="text/csv; charset=utf-8", status=status.HTTP_201_CREATED)
+            response["Content-Disposition"] = 'attachment; filename="codigos_registro.csv"'
+            escribir_csv(resumen["codigos"], response)
+            return response
+        return Response(resumen, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=["post"], url_path="bulk-delete")
+    def bulk_delete(self, request):
+        """
+        Borra ``{"ids": [1, 2, …]}`` con sus usuarios y perfiles (ver
+        ``PersonaQuerySet.delete``). Los ids que no existen se ignoran.
+        """
+        ids = request.data.get("ids") if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not all(
+            isinstance(pk, int) and not isinstance(pk, bool) for pk in ids
+        ):
+            return Response(
+                {"detail": "Se esperaba {\"ids\": [...]} con ids de personas"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        _, por_modelo = Persona.objects.filter(pk__in=ids).delete()
+        return Response({
+            "eliminadas": por_modelo.get(Persona._meta.label, 0),
+            "usuarios": por_modelo.get(User._meta.label, 0),
+        })
+
+class CodigoRegistroViewSet(MetricasMixin, viewsets.ModelViewSet):
     queryset = CodigoRegistro.objects.select_related("persona").all()
     serializer_class = CodigoRegistroSerializer
     permission_classes = [IsAuthenticated]
@@ -73,7 +358,7 @@ class CodigoRegistroViewSet(viewsets.ModelViewSet):
         # 2. Proceder con la creación normal
         return super().create(request, *args, **kwargs)
 
-class RegistroUsuarioView(APIView):
+class RegistroUsuarioView(MetricasMixin, APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
@@ -0,0 +1,151 @@
+"""
+Vistas async de solo lectura para ASGI (``backend/asgi.py``).
+
+Los endpoints de lectura más pesados tienen una versión async que ejecuta
+sus consultas independientes a la vez y compone una sola respuesta:
+
+- ``/api/async/bsc/<id>/dashboard/``: BSC, categorías, enlaces,
+  indicadores y resúmenes (ver ``dashboard.consultas_dashboard``).
+- ``/api/async/indicadores/tree/``: indicadores, relaciones y enlaces a
+  categorías (ver ``arbol.consultas_arbol``).
+
+La interfaz async del ORM (``aget``, ``async for``) ejecuta todas las
+consultas en el mismo hilo de ``sync_to_async``, una tras otra. Para que
+vayan en paralelo, cada queryset se evalúa con
+``sync_to_async(thread_sensitive=False)`` en su propio hilo, con su propia
+conexión: un request usa hasta una conexión por consulta (con
+``DB_POOL``, ``DB_POOL_MAX_SIZE`` tiene que alcanzar para eso).
+
+Mientras espera a la base de datos el worker sigue atendiendo otros
+requests. Comparten la caché de respuestas, los ETag y las métricas con
+las vistas sync.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache as django_cache
+from django.db import close_old_connections
+from django.http import HttpResponseNotModified, JsonResponse
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import NotFound, ValidationError
+
+from . import cache
+from . import arbol
+from .dashboard import componer, consultas_dashboard
+from .metricas import medicion_actual
+from .models import BSC
+
+
+def _en_hilo(funcion):
+    return sync_to_async(funcion, thread_sensitive=False)
+
+
+@_en_hilo
+def _evaluar(queryset):
+    try:
+        return list(queryset)
+    finally:
+        # Como al terminar un request: respeta CONN_MAX_AGE en este hilo
+        # (y con pool devuelve la conexión)
+        close_old_connections()
+
+
+@_en_hilo
+def _clave_respuesta(nombre, request, modelos):
+    # Lee las versiones de la BD (ver cache.py)
+    try:
+        return cache.clave_respuesta(nombre, request, modelos)
+    finally:
+        close_old_connections()
+
+
+async def en_paralelo(*querysets):
+    """Listas con los resultados de ``querysets``, consultados a la vez."""
+    return await asyncio.gather(*(_evaluar(qs) for qs in querysets))
+
+
+def _json(data, status=200):
+    return JsonResponse(
+        data, status=status, safe=False,
+        json_dumps_params={"ensure_ascii": False, "separators": (",", ":")},
+    )
+
+
+def _no_encontrado():
+    return _json({"detail": str(NotFound.default_detail)}, status=404)
+
+
+def _nombrar(ruta):
+    medicion = medicion_actual()
+    if medicion is not None:
+        medicion.ruta = ruta
+
+
+async def _respuesta_cacheada(request, nombre, generar, modelos=cache.MODELOS):
+    """
+    Como ``CacheRespuestaMixin.respuesta_cacheada``: ``generar`` es una
+    corrutina que devuelve los datos, o ``None`` si el recurso no existe.
+    """
+    timeout = settings.API_CACHE_TIMEOUT
+    if not timeout:
+        data = await generar()
+        return _no_encontrado() if data is None else _json(data)
+
+    etag, clave = await _clave_respuesta(nombre, request, modelos)
+    if cache.no_modificado(request, etag):
+        return HttpResponseNotModified(headers={"ETag": etag})
+
+    entrada = await django_cache.aget(clave)
+    if entrada is None:
+        data = await generar()
+        if data is None:
+            return _no_encontrado()
+        entrada = await _en_hilo(cache.entrada_respuesta)(data, modelos)
+        await django_cache.aset(clave, entrada, timeout)
+
+    if cache.no_modificado(request, etag, entrada["modificado"]):
+        return HttpResponseNotModified(headers={"ETag": etag})
+
+    response = _json(entrada["data"])
+    for encabezado, valor in cache.encabezados(etag, entrada["modificado"]).items():
+        response[encabezado] = valor
+    return response
+
+
+@require_safe
+async def bsc_dashboard(request, pk):
+    """Igual que ``/api/bsc/<id>/dashboard/``."""
+    _nombrar("async.bsc_dashboard")
+
+    async def generar():
+        consultas = consultas_dashboard(pk)
+        bscs, *resultados = await en_paralelo(
+            BSC.objects.filter(pk=pk).only("id", "nombre"),
+            consultas["categorias"], consultas["enlaces"],
+            consultas["indicadores"], consultas["resumenes"],
+        )
+        if not bscs:
+            return None
+        # Armar la respuesta (y evaluar si faltan resúmenes) usa CPU: fuera
+        # del event loop
+        return await _en_hilo(componer)(bscs[0], *resultados)
+
+    return await _respuesta_cacheada(request, "async.bsc_dashboard", generar)
+
+
+@require_safe
+async def indicadores_tree(request):
+    """Igual que ``/api/indicadores/tree/`` (mismos parámetros)."""
+    _nombrar("async.indicadores_tree")
+    try:
+        opciones = arbol.leer_parametros(request.GET)
+    except ValidationError as e:
+        return _json(e.detail, status=400)
+
+    async def generar():
+        consultas = arbol.consultas_arbol(opciones.pop("categoria"), opciones["raiz"])
+        resultados = await en_paralelo(*(consultas[k] for k in arbol.CONSULTAS))
+        return await _en_hilo(arbol.componer)(*resultados, **opciones)
+
+    return await _respuesta_cacheada(request, "async.indicadores_tree", generar)
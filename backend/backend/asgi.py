@@ -3,6 +3,15 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Sirve las vistas async de ``api/vistas_async.py`` (``/api/async/...``),
+que consultan en paralelo sin ocupar el worker mientras esperan a la BD:
+
+    uvicorn backend.asgi:application --workers 4
+
+Las vistas DRF (sync) también funcionan aquí, pero Django las ejecuta de a
+una por proceso; para escrituras conviene seguir con ``backend/wsgi.py``
+(gunicorn) y enrutar ``/api/async/`` a este proceso.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -14,3 +23,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.DB_WARMUP:
+    # Con pool, lo abre para todos los hilos; sin pool solo prueba la BD
+    from api.conexiones import calentar  # noqa: E402
+
+    calentar()
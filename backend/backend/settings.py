@@ -1,4 +1,6 @@
 import os
+import sys
+from importlib.util import find_spec
 from pathlib import Path
 from datetime import timedelta
 import dj_database_url
@@ -31,13 +33,14 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     "rest_framework",
+    "rest_framework_simplejwt.token_blacklist",
     "corsheaders",
     "api",
 ]
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.autenticacion.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
@@ -49,8 +52,9 @@ AUTHENTICATION_BACKENDS = [
 ]
 
 MIDDLEWARE = [
+    "api.metricas.MetricasMiddleware",
     'django.middleware.security.SecurityMiddleware',
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "api.middleware.WhiteNoiseAsyncMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.common.CommonMiddleware',
@@ -87,16 +91,160 @@ SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
 
+# Segundos que CachedJWTAuthentication guarda el usuario de cada token
+# (0 lo busca en la BD en cada request, como JWTAuthentication). Los
+# refresh tokens rotados quedan en token_blacklist; `manage.py
+# flushexpiredtokens` borra los vencidos. simplejwt no indexa expires_at:
+# la migración api/0007 crea a propósito ese índice (RunSQL sobre la tabla
+# de token_blacklist) para que el flush no recorra la tabla entera.
+AUTH_CACHE_TIMEOUT = int(os.environ.get("AUTH_CACHE_TIMEOUT", "60"))
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Conexiones (variables de entorno):
+# - DB_CONN_MAX_AGE: segundos que se reutiliza la conexión de cada hilo entre
+#   requests (por defecto 60; 0 = una conexión nueva por request; "None" =
+#   sin límite).
+# - DB_CONN_HEALTH_CHECKS: comprueba la conexión reutilizada al inicio de
+#   cada request y la reabre si se cayó (por defecto True).
+# - DB_POOL: "True" usa el pool de psycopg 3 (solo PostgreSQL; requiere
+#   psycopg[pool]). Con pool, CONN_MAX_AGE se fuerza a 0: cada request
+#   toma una conexión del pool y la devuelve al terminar.
+#   DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE / DB_POOL_TIMEOUT (segundos que se
+#   espera una conexión libre) ajustan su tamaño.
+# - DB_WARMUP: abre las conexiones al arrancar (ver backend/wsgi.py y
+#   api/conexiones.py) para que el primer request no pague la conexión.
+# `manage.py bench --escenarios conexion_por_request,conexion_sin_reutilizar`
+# mide el costo de conexión por request con la configuración activa.
+
+def _conn_max_age(valor):
+    return None if valor.lower() == "none" else int(valor)
+
+
+DB_POOL = os.environ.get("DB_POOL", "False") == "True"
+DB_WARMUP = os.environ.get("DB_WARMUP", "True") == "True"
+
 DATABASES = {
     "default": dj_database_url.parse(
-        os.environ.get("DATABASE_URL")
+        os.environ.get("DATABASE_URL"),
+        conn_max_age=0 if DB_POOL else _conn_max_age(os.environ.get("DB_CONN_MAX_AGE", "60")),
+        conn_health_checks=os.environ.get("DB_CONN_HEALTH_CHECKS", "True") == "True",
     )
 }
 
+if DB_POOL and DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    DATABASES["default"].setdefault("OPTIONS", {})["pool"] = {
+        "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+        "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+        "timeout": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+    }
+
+
+# Cache
+# CACHE_BACKEND: "file" (por defecto), "redis" o "locmem" (por defecto en
+# `manage.py test`). Las versiones de la caché de respuestas y de la
+# jerarquía están en la BD (tabla Secuencia), así que valen con cualquier
+# backend. La caché de usuarios del JWT se comparte entre procesos solo con
+# "file" o "redis": con "locmem" y varios workers, un usuario desactivado
+# en uno sigue autenticando en los demás hasta AUTH_CACHE_TIMEOUT. Por eso
+# con "locmem" la caché de usuarios queda apagada salvo en tests o con
+# CACHE_LOCMEM_PERMITIDO=True (un solo proceso), y el system check
+# api.W002 lo advierte.
+TESTING = sys.argv[1:2] == ["test"]
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "locmem" if TESTING else "file")
+CACHE_LOCMEM_PERMITIDO = TESTING or os.environ.get("CACHE_LOCMEM_PERMITIDO", "False") == "True"
+
+if CACHE_BACKEND == "redis":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ.get("REDIS_URL", "redis://127.0.0.1:6379/1"),
+        }
+    }
+elif CACHE_BACKEND == "file":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get("CACHE_LOCATION", str(BASE_DIR / ".cache")),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Segundos que se guarda una respuesta de la API (0 desactiva la caché)
+API_CACHE_TIMEOUT = int(os.environ.get("API_CACHE_TIMEOUT", "300"))
+if CACHE_BACKEND == "locmem" and not CACHE_LOCMEM_PERMITIDO:
+    AUTH_CACHE_TIMEOUT = 0
+
+# Rollup diferido: Indicador.save solo guarda la fila y encola el recálculo
+# de ancestros, serie y resúmenes, que procesa `manage.py run_rollup_worker`.
+ROLLUP_DIFERIDO = os.environ.get("ROLLUP_DIFERIDO", "False") == "True"
+
+# Métricas por request (Server-Timing y /metrics). /metrics exige
+# "Authorization: Bearer <METRICAS_TOKEN>" o una sesión de staff; sin
+# METRICAS_TOKEN solo responde a staff. Los requests que tardan más de
+# METRICAS_LENTO_MS se registran con su SQL en el log "api.metricas".
+METRICAS = os.environ.get("METRICAS", "True") == "True"
+METRICAS_TOKEN = os.environ.get("METRICAS_TOKEN", "")
+METRICAS_LENTO_MS = float(os.environ.get("METRICAS_LENTO_MS", "500"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "api": {
+            "handlers": ["console"],
+            "level": os.environ.get("API_LOG_LEVEL", "INFO"),
+        },
+    },
+}
+
+
+# Hashers de contraseñas (ver api/hashers.py)
+# - PASSWORD_HASHER: perfil de producción, "argon2" (por defecto si está
+#   instalado argon2-cffi), "bcrypt" (requiere bcrypt) o "pbkdf2". Los demás
+#   quedan en la lista para verificar hashes existentes; al iniciar sesión
+#   se rehashean con el perfil activo.
+# - ARGON2_TIME_COST / ARGON2_MEMORY_COST (KiB) / ARGON2_PARALLELISM: por
+#   defecto 2 / 19456 / 1 (mínimo recomendado por OWASP, ~20 MB por hash
+#   y un solo hilo por worker web).
+# - BCRYPT_ROUNDS: por defecto 12.
+# El hasher rápido (MD5) solo se usa en `manage.py test` y en
+# `manage.py bench --hasher-rapido`; fuera de ahí falla el system check.
+HASHERS = {
+    "argon2": "api.hashers.Argon2PasswordHasher",
+    "bcrypt": "api.hashers.BCryptSHA256PasswordHasher",
+    "pbkdf2": "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+}
+HASHER_RAPIDO = "api.hashers.MD5RapidoPasswordHasher"
+
+PASSWORD_HASHER = os.environ.get("PASSWORD_HASHER") or (
+    "argon2" if find_spec("argon2") else "pbkdf2"
+)
+if PASSWORD_HASHER not in HASHERS:
+    raise ValueError(f"PASSWORD_HASHER debe ser uno de: {', '.join(HASHERS)}")
+PASSWORD_HASHERS = [HASHERS[PASSWORD_HASHER]] + [
+    hasher for perfil, hasher in HASHERS.items() if perfil != PASSWORD_HASHER
+] + ["django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher"]
+HASHER_RAPIDO_PERMITIDO = TESTING
+if TESTING:
+    PASSWORD_HASHERS = [HASHER_RAPIDO, *PASSWORD_HASHERS]
+
+ARGON2_TIME_COST = int(os.environ.get("ARGON2_TIME_COST", "2"))
+ARGON2_MEMORY_COST = int(os.environ.get("ARGON2_MEMORY_COST", "19456"))
+ARGON2_PARALLELISM = int(os.environ.get("ARGON2_PARALLELISM", "1"))
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from api.metricas import vista_metricas
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", vista_metricas),
     path("", include("api.urls")),
 ]
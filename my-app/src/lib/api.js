@@ -61,11 +61,30 @@ export const deletePersona = async (id) => {
   return res.data;
 };
 
+// Borra varias personas (y sus usuarios) en una sola llamada
+export const deletePersonasBulk = async (ids) => {
+  const res = await api.post("/api/personas/bulk-delete/", { ids });
+  return res.data;
+};
+
 export const updatePersona = async (id, payload) => {
   const res = await api.patch(`/api/personas/${id}/`, payload);
   return res.data;
 };
 
+// Pre-registro masivo: lista de { nombres, apellidos, email } o un File
+// CSV / XLSX. Devuelve el resumen con los códigos generados.
+export const createPersonasBulk = async (personasOArchivo) => {
+  if (personasOArchivo instanceof File) {
+    const form = new FormData();
+    form.append("archivo", personasOArchivo);
+    const res = await api.post("/api/personas/bulk/", form);
+    return res.data;
+  }
+  const res = await api.post("/api/personas/bulk/", personasOArchivo);
+  return res.data;
+};
+
 // ------- CÓDIGOS DE REGISTRO -------
 
 export const getCodigosRegistro = async () => {
@@ -94,6 +113,26 @@ export const getIndicadores = async () => {
   return res.data;
 };
 
+// Página de indicadores (cursor por id) con solo los campos pedidos.
+// Para la siguiente página se pasa `cursor: data.next`.
+export const getIndicadoresPagina = async ({ cursor, pageSize = 100, fields } = {}) => {
+  const res = cursor
+    ? await api.get(cursor)
+    : await api.get("/api/indicadores/", {
+        params: { page_size: pageSize, fields: fields?.join(",") },
+      });
+  return res.data;
+};
+
+// Jerarquía armada en el servidor: `formato` "anidado" (nodos con `hijos`
+// anidados) o "adyacencia" ({ raices, nodos } con `hijos` como ids)
+export const getIndicadoresTree = async ({ root, depth, categoria, formato } = {}) => {
+  const res = await api.get("/api/indicadores/tree/", {
+    params: { root, depth, categoria, formato },
+  });
+  return res.data;
+};
+
 export const getIndicador = async (id) => {
   const res = await api.get(`/api/indicadores/${id}/`);
   return res.data;
@@ -183,6 +222,12 @@ export const getBSCWithIndicadores = async (bscId) => {
   return res.data;
 };
 
+// Tablero calculado en el servidor: categorías, indicadores y cumplimiento
+export const getBSCDashboard = async (bscId) => {
+  const res = await api.get(`/api/bsc/${bscId}/dashboard/`);
+  return res.data;
+};
+
 export const getIndicadoresByBSC = async (categorias) => {
   const res = await api.get("/api/indicadores/");
   return res.data.filter(ind => 